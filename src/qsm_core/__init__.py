@@ -0,0 +1,105 @@
+# This file is part of QSM-blender-addons.
+#
+# QSM-blender-addons is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# QSM-blender-addons is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with QSM-blender-addons.  If not, see <http://www.gnu.org/licenses/>.
+# Blender-independent core of the QSM and leaf model importers. Parsing
+# of the input formats, cylinder table operations and the generation of
+# cylinder, curve and leaf geometry are implemented with NumPy arrays,
+# and shared by the addons for the different Blender versions, which
+# only create the Blender data from the arrays.
+
+from .profiling import DEBUG_FRAMES, ImportProfiler, DebugHooks
+from .readers import (COMPRESSION_MAGIC,
+                      detect_compression,
+                      check_file_support,
+                      open_binary_stream,
+                      open_text_file,
+                      READ_CHUNK_LINES,
+                      read_cylinder_file,
+                      join_cylinder_chunks,
+                      read_appended_cylinders,
+                      cylinders_from_lines,
+                      QSMB_MAGIC,
+                      QSMB_VERSION,
+                      QSMB_HEADER_SIZE,
+                      QSMB_FLAG_TREE,
+                      QSMB_FLAG_PARENT,
+                      QSMB_FLAG_EXTENSION,
+                      QSMB_FLAG_BRANCH_ORDER,
+                      QSMB_FLAG_POSITION,
+                      QSMB_OPTIONAL_COLUMNS,
+                      binary_layout,
+                      is_binary_qsm_file,
+                      write_cylinder_binary,
+                      read_cylinder_binary,
+                      mat_file_version,
+                      open_mat_file,
+                      read_treeqsm_mat,
+                      read_qsm_file)
+from .topology import (take_cylinders,
+                       concatenate_cylinders,
+                       partition_trees,
+                       take_ranges,
+                       branch_bounds,
+                       cylinder_materials,
+                       HASH_COLUMNS,
+                       branch_hashes,
+                       remap_cylinders)
+from .cylinders import (cylinder_template,
+                        axis_frames,
+                        build_cylinder_geometry,
+                        splice_cylinder_geometry)
+from .curves import (bezier_cylinder_points,
+                     bezier_branch_points,
+                     bezier_resolution)
+from .leaves import (UV_SHAPES,
+                     read_ext_obj,
+                     read_base_vertices,
+                     take_leaves,
+                     decimate_leaves,
+                     leaf_geometry,
+                     leaf_colors,
+                     growth_anim_limits,
+                     growth_shape_keys,
+                     normalize_uv,
+                     leaf_uv_coordinates)
+from .region import (GRID_INDEX_MAGIC,
+                     cylinder_spheres,
+                     leaf_spheres,
+                     box_region,
+                     sphere_region,
+                     frustum_region,
+                     region_mask,
+                     build_grid_index,
+                     query_grid_index,
+                     grid_index_path,
+                     is_grid_index,
+                     read_grid_index,
+                     write_grid_index,
+                     select_spheres,
+                     select_cylinders,
+                     select_leaves,
+                     cell_chunks,
+                     morton_codes,
+                     morton_order)
+from .lod import (tree_distances,
+                  lod_factors,
+                  lod_vertex_counts,
+                  lod_select)
+from .cache import (table_nbytes,
+                    shallow_copy,
+                    TableCache,
+                    geometry_key,
+                    content_key,
+                    source_key,
+                    GeometryCache)
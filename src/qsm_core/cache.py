@@ -0,0 +1,349 @@
+# This file is part of QSM-blender-addons.
+#
+# QSM-blender-addons is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# QSM-blender-addons is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with QSM-blender-addons.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import shutil
+import hashlib
+from collections import OrderedDict
+import numpy as np
+
+
+# Total size of the arrays of a table, or of the tables in a dict, list
+# or tuple, in bytes.
+def table_nbytes(value):
+
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    elif isinstance(value, dict):
+        return sum(table_nbytes(v) for v in value.values())
+    elif isinstance(value, (list, tuple)):
+        return sum(table_nbytes(v) for v in value)
+
+    return 0
+
+
+# Copy of the dicts, lists and tuples of a table, sharing the arrays, so
+# that columns can be added or replaced without changing the original.
+def shallow_copy(value):
+
+    if isinstance(value, dict):
+        return {key: shallow_copy(v) for key, v in value.items()}
+    elif isinstance(value, list):
+        return [shallow_copy(v) for v in value]
+    elif isinstance(value, tuple):
+        return tuple(shallow_copy(v) for v in value)
+
+    return value
+
+
+# Least recently used cache of the tables read from files, limited by
+# the total size of their arrays. A table is stored by the reader
+# function, the file path and the reader arguments, and is read again
+# if the modification time or size of the file has changed. Tables
+# larger than the capacity are not cached.
+class TableCache:
+
+    def __init__(self, capacity=512 * 2**20):
+
+        # File signature, table and size of each key, from the least
+        # to the most recently used.
+        self.tables = OrderedDict()
+
+        # Maximum total size of the tables in bytes.
+        self.capacity = capacity
+
+        # Total size of the tables in bytes.
+        self.nbytes = 0
+
+        # Number of reads returned from the cache and from files.
+        self.hits = 0
+        self.misses = 0
+
+    # Read a table with the reader function, or return the cached table
+    # if the file has not changed. The columns of the returned table
+    # can be replaced, but its arrays must not be modified in place.
+    def read(self, function, file_path, *args):
+
+        file_path = os.path.abspath(file_path)
+        key = (function.__module__, function.__name__, file_path, args)
+
+        stat = os.stat(file_path)
+        signature = (stat.st_mtime_ns, stat.st_size)
+
+        entry = self.tables.get(key)
+
+        if entry is not None and entry[0] == signature:
+            self.tables.move_to_end(key)
+            self.hits += 1
+            return shallow_copy(entry[1])
+
+        self.discard(key)
+
+        table = function(file_path, *args)
+        self.misses += 1
+
+        nbytes = table_nbytes(table)
+
+        if nbytes <= self.capacity:
+            self.tables[key] = (signature, table, nbytes)
+            self.nbytes += nbytes
+            self.evict()
+
+        return shallow_copy(table)
+
+    # Remove the least recently used tables until the total size is
+    # within the capacity.
+    def evict(self):
+
+        while self.nbytes > self.capacity and self.tables:
+            _, (_, _, nbytes) = self.tables.popitem(last=False)
+            self.nbytes -= nbytes
+
+    # Remove the table of a key, if cached.
+    def discard(self, key):
+
+        entry = self.tables.pop(key, None)
+
+        if entry is not None:
+            self.nbytes -= entry[2]
+
+    # Remove all tables.
+    def clear(self):
+
+        self.tables.clear()
+        self.nbytes = 0
+
+
+# Update a hash with the contents of the arrays and other values of a
+# table, including the array types and shapes, and the keys of dicts.
+def _hash_value(h, value):
+
+    if isinstance(value, np.ndarray):
+        h.update(b'a' + str(value.dtype).encode() + str(value.shape).encode())
+        h.update(np.ascontiguousarray(value).data)
+    elif isinstance(value, dict):
+        h.update(b'd%d' % len(value))
+        for key in sorted(value):
+            h.update(repr(key).encode())
+            _hash_value(h, value[key])
+    elif isinstance(value, (list, tuple)):
+        h.update(b'l%d' % len(value))
+        for v in value:
+            _hash_value(h, v)
+    else:
+        h.update(b'v' + repr(value).encode())
+
+
+# Key of the geometry generated by a function from the given arguments,
+# as a hexadecimal digest of the function name and the contents of the
+# arguments. The arguments should include only the table columns used
+# by the function, so that other columns do not change the key.
+def geometry_key(function, *args):
+
+    h = hashlib.blake2b(digest_size=16)
+    h.update((function.__module__ + '.' + function.__name__).encode())
+
+    for value in args:
+        _hash_value(h, value)
+
+    return h.hexdigest()
+
+
+# Key of an import, as a hexadecimal digest of the contents of the
+# input files and the given values, such as the import settings. The
+# paths of the files do not change the key.
+def content_key(file_paths, *values):
+
+    h = hashlib.blake2b(digest_size=16)
+
+    for file_path in file_paths:
+        h.update(b'f%d' % os.path.getsize(file_path))
+
+        with open(file_path, 'rb') as f:
+            for block in iter(lambda: f.read(2**20), b''):
+                h.update(block)
+
+    for value in values:
+        _hash_value(h, value)
+
+    return h.hexdigest()
+
+
+# Key of the geometry generated by a function from the tables read from
+# files, as a hexadecimal digest of the function name, the path,
+# modification time and size of each file, and the given values, such
+# as the import settings. Unlike geometry_key, the key is known before
+# the files are read, but the values must include everything that
+# changes the tables given to the function.
+def source_key(function, file_paths, *values):
+
+    h = hashlib.blake2b(digest_size=16)
+    h.update((function.__module__ + '.' + function.__name__).encode())
+
+    for file_path in file_paths:
+        stat = os.stat(file_path)
+        _hash_value(h, (os.path.abspath(file_path), stat.st_mtime_ns,
+                        stat.st_size))
+
+    for value in values:
+        _hash_value(h, value)
+
+    return h.hexdigest()
+
+
+# Persistent cache of generated geometry on disk. The arrays of each
+# geometry dict are stored as .npy files in a directory named by the
+# geometry key, and are memory-mapped when loaded. The least recently
+# used entries are removed when the total size exceeds the capacity.
+class GeometryCache:
+
+    def __init__(self, directory, capacity=4 * 2**30):
+
+        # Directory of the cache entries.
+        self.directory = directory
+
+        # Maximum total size of the entries in bytes.
+        self.capacity = capacity
+
+    # Geometry generated by the function from the arguments, loaded
+    # from the cache or generated and stored. The key is computed from
+    # the arguments, unless given. The arrays of loaded geometry are
+    # read-only.
+    def build(self, function, *args, key=None):
+
+        if key is None:
+            key = geometry_key(function, *args)
+
+        geom = self.load(key)
+
+        if geom is None:
+            geom = function(*args)
+            self.store(key, geom)
+
+        return geom
+
+    # Load the geometry of a key, or return None if not cached.
+    def load(self, key):
+
+        path = os.path.join(self.directory, key)
+
+        if not os.path.isdir(path):
+            return None
+
+        geom = {}
+
+        try:
+            for name in os.listdir(path):
+                if not name.endswith('.npy'):
+                    continue
+
+                file_path = os.path.join(path, name)
+
+                # Empty arrays can not be memory-mapped.
+                try:
+                    geom[name[:-4]] = np.load(file_path, mmap_mode='r')
+                except ValueError:
+                    geom[name[:-4]] = np.load(file_path)
+
+            # Mark the entry as recently used.
+            os.utime(path)
+
+        except OSError as e:
+            print('Geometry cache entry not read:', e)
+            return None
+
+        return geom
+
+    # Store the arrays of a geometry dict under a key. The entry is
+    # written to a temporary directory and renamed, so that entries
+    # are complete even if several processes write the same key.
+    def store(self, key, geom):
+
+        path = os.path.join(self.directory, key)
+
+        if os.path.isdir(path):
+            return
+
+        tmp = path + '.%d.tmp' % os.getpid()
+
+        try:
+            os.makedirs(tmp, exist_ok=True)
+
+            for name, value in geom.items():
+                np.save(os.path.join(tmp, name + '.npy'), value)
+
+            os.rename(tmp, path)
+
+        except OSError as e:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+            # Entry written by another process.
+            if os.path.isdir(path):
+                return
+
+            print('Geometry cache entry not written:', e)
+            return
+
+        self.prune()
+
+    # Total size in bytes and last use time of each entry, from the
+    # least to the most recently used.
+    def entries(self):
+
+        if not os.path.isdir(self.directory):
+            return []
+
+        entries = []
+
+        for key in os.listdir(self.directory):
+
+            path = os.path.join(self.directory, key)
+
+            if key.endswith('.tmp') or not os.path.isdir(path):
+                continue
+
+            try:
+                nbytes = sum(os.path.getsize(os.path.join(path, name))
+                             for name in os.listdir(path))
+                entries.append((os.path.getmtime(path), key, nbytes))
+            except OSError:
+                continue
+
+        entries.sort()
+
+        return [(key, nbytes) for _, key, nbytes in entries]
+
+    # Remove the least recently used entries until the total size is
+    # within the capacity.
+    def prune(self):
+
+        entries = self.entries()
+        nbytes = sum(n for _, n in entries)
+
+        for key, n in entries:
+
+            if nbytes <= self.capacity:
+                break
+
+            shutil.rmtree(os.path.join(self.directory, key),
+                          ignore_errors=True)
+            nbytes -= n
+
+    # Remove all entries.
+    def clear(self):
+
+        for key, _ in self.entries():
+            shutil.rmtree(os.path.join(self.directory, key),
+                          ignore_errors=True)
@@ -0,0 +1,142 @@
+# This file is part of QSM-blender-addons.
+#
+# QSM-blender-addons is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# QSM-blender-addons is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with QSM-blender-addons.  If not, see <http://www.gnu.org/licenses/>.
+
+import numpy as np
+
+
+# Control points of cylinder-level Bezier splines, two for each
+# cylinder at the bottom and the top of the cylinder axis. Returns the
+# point and handle locations as arrays of shape (N, 2, 3), and the
+# radii as an array of shape (N, 2), in single precision.
+def bezier_cylinder_points(SP, AX, H, R):
+
+    # Length of right and left control handles.
+    len_r = 0.45
+    len_l = 0.45
+
+    # Cylinder axes scaled to full length.
+    d = np.asarray(AX) * np.asarray(H)[:, None]
+
+    # Position on axis (0 = bottom, 1 = top).
+    hf = np.array([0.0, 1.0])
+
+    co = np.asarray(SP)[:, None, :] + hf[None, :, None] * d[:, None, :]
+
+    points = {'co': co,
+              'handle_left': co - len_l * d[:, None, :],
+              'handle_right': co + len_r * d[:, None, :],
+              'radius': np.repeat(np.asarray(R)[:, None], 2, axis=1)}
+
+    return {key: value.astype(np.float32) for key, value in points.items()}
+
+
+# Control points of a branch-level Bezier spline, from the parameters
+# of the cylinders of the branch. The spline has a point in the middle
+# of each cylinder, and at the base of the first and the tip of the
+# last cylinder, where the radius tapers to 10 %. Returns the point
+# and handle locations as arrays of shape (N + 2, 3), and the radii.
+def bezier_branch_points(SP, AX, H, R):
+
+    SP = np.asarray(SP, dtype=float).reshape(-1, 3)
+    AX = np.asarray(AX, dtype=float).reshape(-1, 3)
+    H = np.asarray(H, dtype=float)
+    R = np.asarray(R, dtype=float)
+
+    # Number of cylinders.
+    NCyl = len(R)
+
+    # Number of curve points = cylinder count + start point + end point.
+    NPoint = NCyl + 2
+
+    # Index of the cylinder of each curve point.
+    j = np.concatenate(([0], np.arange(NCyl), [NCyl - 1]))
+
+    # Position along cylinder axis: bottom of the first cylinder,
+    # centers of the cylinders and the end of the last cylinder.
+    hf = np.full(NPoint, 0.5)
+    hf[0] = 0
+    hf[-1] = 1
+
+    # Radius scaler, tapering to 10 % at the tip.
+    rf = np.ones(NPoint)
+    rf[-1] = 0.1
+
+    # Handle lengths. Shorter handles on the first and last cylinder,
+    # as there are more than one curve point "on" them.
+    len_l = np.full(NPoint, 0.45)
+    len_r = np.full(NPoint, 0.45)
+    len_l[[0, 1, -1]] = 0.25
+    len_r[[0, -2, -1]] = 0.25
+
+    # Cylinder axes scaled to full length.
+    d = AX[j] * H[j, None]
+
+    co = SP[j] + hf[:, None] * d
+
+    points = {'co': co,
+              'handle_left': co - len_l[:, None] * d,
+              'handle_right': co + len_r[:, None] * d,
+              'radius': R[j] * rf}
+
+    return {key: value.astype(np.float32) for key, value in points.items()}
+
+
+# Resolution of a Bezier spline from its control points, so that the
+# surface of the bevelled tube deviates at most by the given tolerance
+# from the evaluated polyline. Each segment between control points is
+# approximated as a circular arc, with the turning angle between the
+# tangents at its ends. With n subdivisions, the outer surface of the
+# tube of radius r around an arc of radius rho deviates from the chords
+# by (rho + r) * (1 - cos(angle / (2 * n))). The resolution is the
+# number of subdivisions of the most demanding segment, within
+# [1, nmax].
+def bezier_resolution(points, tolerance, nmax=32):
+
+    co = np.asarray(points['co'], dtype=float).reshape(-1, 3)
+    hl = np.asarray(points['handle_left'], dtype=float).reshape(-1, 3)
+    hr = np.asarray(points['handle_right'], dtype=float).reshape(-1, 3)
+    R = np.asarray(points['radius'], dtype=float).ravel()
+
+    # Single point or non-positive tolerance.
+    if len(co) < 2 or tolerance <= 0:
+        return 1
+
+    # Unit tangents of the control points.
+    T = hr - hl
+    n = np.linalg.norm(T, axis=1)
+    n[n == 0] = 1
+    T /= n[:, None]
+
+    # Turning angle and chord length of each segment.
+    c = np.clip(np.sum(T[:-1] * T[1:], axis=1), -1.0, 1.0)
+    angle = np.arccos(c)
+    L = np.linalg.norm(co[1:] - co[:-1], axis=1)
+
+    # Only segments that turn need subdivisions.
+    turn = angle > 1e-6
+    if not np.any(turn):
+        return 1
+
+    angle = angle[turn]
+
+    # Radius of the outer surface of the tube around the arc.
+    rho = L[turn] / angle + np.maximum(R[:-1], R[1:])[turn]
+
+    # Largest arc angle of a single subdivision within the tolerance.
+    step = 2 * np.arccos(np.clip(1 - tolerance / rho, -1.0, 1.0))
+
+    res = int(np.ceil(np.max(angle / step)))
+
+    return min(max(res, 1), nmax)
@@ -0,0 +1,287 @@
+# This file is part of QSM-blender-addons.
+#
+# QSM-blender-addons is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# QSM-blender-addons is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with QSM-blender-addons.  If not, see <http://www.gnu.org/licenses/>.
+
+import functools
+import numpy as np
+
+
+# Generate a closed unit cylinder with the given number of vertices in
+# its rings, as a template for the cylinder geometry. The cylinder has
+# unit radius, the base at the origin and the top at z = 1. Envelope
+# faces are smooth shaded and the n-gon caps flat. Templates are
+# cached for the session and their arrays are read-only.
+@functools.lru_cache(maxsize=None)
+def cylinder_template(nvert):
+
+    # Angles of ring vertices.
+    angle = 2 * np.pi * np.arange(nvert) / nvert
+
+    # Vertices of the bottom ring followed by the top ring.
+    co = np.zeros((2 * nvert, 3), dtype=np.float32)
+    co[:, 0] = np.tile(np.cos(angle), 2)
+    co[:, 1] = np.tile(np.sin(angle), 2)
+    co[nvert:, 2] = 1.0
+
+    # Envelope quads, with outward normals.
+    i = np.arange(nvert)
+    j = (i + 1) % nvert
+    quads = np.stack((i, j, j + nvert, i + nvert), axis=1).ravel()
+
+    # Bottom cap facing down and top cap facing up.
+    bottom = i[::-1]
+    top = i + nvert
+
+    # Vertex indices of loops.
+    loop_vert = np.concatenate((quads, bottom, top)).astype(np.int32)
+
+    # Loop counts and first loops of polygons.
+    poly_size = np.append(np.full(nvert, 4), [nvert, nvert]).astype(np.int32)
+    poly_start = np.zeros(nvert + 2, dtype=np.int32)
+    np.cumsum(poly_size[:-1], out=poly_start[1:])
+
+    # Set the shading of the envelope faces as smooth.
+    poly_smooth = poly_size == 4
+    poly_smooth[nvert:] = False
+
+    template = {'co': co,
+                'loop_vert': loop_vert,
+                'poly_start': poly_start,
+                'poly_size': poly_size,
+                'poly_smooth': poly_smooth}
+
+    # Shared between imports, so prevent modification.
+    for value in template.values():
+        value.flags.writeable = False
+
+    return template
+
+
+# Compute rotation matrices that rotate the z-axis onto the given
+# cylinder axes. The other two axes are chosen with the branchless
+# construction of Duff et al. (2017), which is continuous for all
+# directions, including axes parallel to the coordinate axes.
+def axis_frames(axis):
+
+    # Unit axes, with zero axes pointing up.
+    axis = np.asarray(axis, dtype=float).reshape(-1, 3)
+    norm = np.linalg.norm(axis, axis=1)
+    z = np.zeros_like(axis)
+    z[:, 2] = 1.0
+    valid = norm > 0
+    z[valid] = axis[valid] / norm[valid, None]
+
+    x, y, w = z[:, 0], z[:, 1], z[:, 2]
+
+    # Orthonormal basis vectors perpendicular to the axis.
+    sign = np.where(w >= 0, 1.0, -1.0)
+    a = -1.0 / (sign + w)
+    b = x * y * a
+
+    e1 = np.stack((1.0 + sign * x * x * a, sign * b, -sign * x), axis=1)
+    e2 = np.stack((b, sign + y * y * a, -y), axis=1)
+
+    # Basis vectors as the columns of the rotation matrices.
+    return np.stack((e1, e2, z), axis=2)
+
+
+# Compute the global vertex, loop and polygon arrays of all the
+# cylinders of a cylinder table, by transforming the template
+# cylinders. The ring vertex count of each cylinder is interpolated
+# between vmin and vmax with the radius range of its tree, given as
+# the index of the first cylinder of each tree. The maximum vertex
+# count can be lowered for each tree with treeVmax, and the radius range
+# given as a (rmin, rmax) row for each tree with treeRadius, when the
+# table has only part of the cylinders of the trees.
+def build_cylinder_geometry(cyl, vmin, vmax, treeStart=(0,), treeVmax=None,
+                            treeRadius=None):
+
+    # Cylinder parameters.
+    SP = cyl['start']
+    AX = cyl['axis']
+    H = cyl['length']
+    R = cyl['radius']
+
+    # Number of cylinders.
+    NCyl = len(R)
+
+    # Template cylinder for each vertex count.
+    templates = [cylinder_template(nvert) for nvert in range(vmin, vmax + 1)]
+
+    # Minimum and maximum radius of the tree of each cylinder.
+    treeStart = np.asarray(treeStart)
+    treeSize = np.diff(np.append(treeStart, NCyl))
+    if treeRadius is None:
+        rmin = np.repeat(np.minimum.reduceat(R, treeStart), treeSize)
+        rmax = np.repeat(np.maximum.reduceat(R, treeStart), treeSize)
+    else:
+        treeRadius = np.asarray(treeRadius, dtype=float).reshape(-1, 2)
+        rmin = np.repeat(treeRadius[:, 0], treeSize)
+        rmax = np.repeat(treeRadius[:, 1], treeSize)
+
+    # Radius range, with single-radius trees using the minimum
+    # vertex count.
+    rrange = rmax - rmin
+    rrange[rrange <= 0] = np.inf
+
+    # Maximum vertex count of the tree of each cylinder.
+    if treeVmax is None:
+        cylVmax = vmax
+    else:
+        cylVmax = np.repeat(np.clip(treeVmax, vmin, vmax), treeSize)
+
+    # Select number of vertices based on linear interpolation of
+    # radius, and convert the result to an integer by rounding.
+    nvert = vmin + (cylVmax - vmin) * (R - rmin) / rrange
+
+    # Index of template based on vertex count.
+    iObj = np.round(nvert).astype(int) - vmin
+
+    # Vertex, loop and polygon counts of each template.
+    tv = np.array([len(t['co']) for t in templates])
+    tl = np.array([len(t['loop_vert']) for t in templates])
+    tp = np.array([len(t['poly_start']) for t in templates])
+
+    # Index of the first vertex, loop and polygon of each cylinder,
+    # with the total count as the last element.
+    vert_start = np.zeros(NCyl + 1, dtype=int)
+    loop_start = np.zeros(NCyl + 1, dtype=int)
+    poly_first = np.zeros(NCyl + 1, dtype=int)
+    np.cumsum(tv[iObj], out=vert_start[1:])
+    np.cumsum(tl[iObj], out=loop_start[1:])
+    np.cumsum(tp[iObj], out=poly_first[1:])
+
+    # Global arrays.
+    co = np.empty((vert_start[-1], 3), dtype=np.float32)
+    loop_vert = np.empty(loop_start[-1], dtype=np.int32)
+    poly_start = np.empty(poly_first[-1], dtype=np.int32)
+    poly_size = np.empty(poly_first[-1], dtype=np.int32)
+    poly_smooth = np.empty(poly_first[-1], dtype=bool)
+
+    # Rotation matrices of all cylinders.
+    rot = axis_frames(AX)
+
+    # Scaling to match cylinder radius and length.
+    scale = np.stack((R, R, H), axis=1)
+
+    # Transform the cylinders of each template at once.
+    for iTemplate, t in enumerate(templates):
+
+        # Cylinders using the template.
+        I = np.flatnonzero(iObj == iTemplate)
+
+        if len(I) == 0:
+            continue
+
+        # Global indices of the vertices, loops and polygons of the
+        # cylinders, one row per cylinder.
+        IVert = vert_start[I, None] + np.arange(len(t['co']))
+        ILoop = loop_start[I, None] + np.arange(len(t['loop_vert']))
+        IPoly = poly_first[I, None] + np.arange(len(t['poly_start']))
+
+        # Scale, rotate and translate to the starting point.
+        co[IVert] = np.einsum('cij,cvj->cvi',
+                              rot[I],
+                              t['co'] * scale[I, None, :]) \
+            + SP[I, None, :]
+
+        # Offset template topology to global indices.
+        loop_vert[ILoop] = t['loop_vert'] + vert_start[I, None]
+        poly_start[IPoly] = t['poly_start'] + loop_start[I, None]
+        poly_size[IPoly] = t['poly_size']
+        poly_smooth[IPoly] = t['poly_smooth']
+
+    # Index of the cylinder of each vertex, loop and polygon.
+    vert_cyl = np.repeat(np.arange(NCyl), np.diff(vert_start))
+    loop_cyl = np.repeat(np.arange(NCyl), np.diff(loop_start))
+    poly_cyl = np.repeat(np.arange(NCyl), np.diff(poly_first))
+
+    return {'co': co,
+            'loop_vert': loop_vert,
+            'poly_start': poly_start,
+            'poly_size': poly_size,
+            'poly_smooth': poly_smooth,
+            'vert_start': vert_start,
+            'loop_start': loop_start,
+            'poly_first': poly_first,
+            'vert_cyl': vert_cyl,
+            'loop_cyl': loop_cyl,
+            'poly_cyl': poly_cyl}
+
+
+# Remove cylinders from existing mesh geometry and append new cylinder
+# geometry. The mesh is given with the vertex, loop and polygon arrays
+# of build_cylinder_geometry, and 'vert_cyl' as the index of the
+# cylinder of each vertex in a new cylinder table, or -1 for removed
+# cylinders. The new geometry is built from the rows of the table given
+# by index. Returns the combined geometry in the format of
+# build_cylinder_geometry, with the kept cylinders first in their
+# original order, and the table index of each cylinder as 'index'.
+def splice_cylinder_geometry(mesh, geom, index):
+
+    keepVert = mesh['vert_cyl'] >= 0
+
+    # Kept loops and polygons. A polygon belongs to a single cylinder,
+    # so it is kept with its first vertex.
+    vert_keep = np.flatnonzero(keepVert)
+    loop_keep = np.flatnonzero(keepVert[mesh['loop_vert']])
+    poly_keep = np.flatnonzero(
+        keepVert[mesh['loop_vert'][mesh['poly_start']]]
+    )
+
+    # New index of each kept vertex.
+    vert_index = np.cumsum(keepVert) - 1
+
+    # Kept topology with the loops of each polygon consecutive.
+    poly_size = mesh['poly_size'][poly_keep]
+    poly_start = np.zeros(len(poly_size), dtype=np.int32)
+    np.cumsum(poly_size[:-1], out=poly_start[1:])
+
+    co = np.concatenate((mesh['co'][vert_keep], geom['co']))
+    loop_vert = np.concatenate((vert_index[mesh['loop_vert'][loop_keep]],
+                                geom['loop_vert'] + len(vert_keep)))
+    poly_start = np.concatenate((poly_start,
+                                 geom['poly_start'] + len(loop_keep)))
+    poly_size = np.concatenate((poly_size, geom['poly_size']))
+    poly_smooth = np.concatenate((mesh['poly_smooth'][poly_keep],
+                                  geom['poly_smooth']))
+
+    # Table index of the cylinder of each vertex.
+    vert_id = np.concatenate((mesh['vert_cyl'][vert_keep],
+                              np.asarray(index, dtype=int)[geom['vert_cyl']]))
+
+    # Cylinders in the order of their vertices, which are consecutive.
+    fFirst = np.ones(len(vert_id), dtype=bool)
+    fFirst[1:] = vert_id[1:] != vert_id[:-1]
+
+    vert_cyl = np.cumsum(fFirst) - 1
+    loop_cyl = vert_cyl[loop_vert]
+    poly_cyl = loop_cyl[poly_start]
+
+    # Index of the first vertex, loop and polygon of each cylinder,
+    # with the total count as the last element.
+    first = np.arange(np.count_nonzero(fFirst) + 1)
+
+    return {'co': co,
+            'loop_vert': loop_vert.astype(np.int32),
+            'poly_start': poly_start.astype(np.int32),
+            'poly_size': poly_size.astype(np.int32),
+            'poly_smooth': poly_smooth,
+            'vert_start': np.searchsorted(vert_cyl, first),
+            'loop_start': np.searchsorted(loop_cyl, first),
+            'poly_first': np.searchsorted(poly_cyl, first),
+            'vert_cyl': vert_cyl,
+            'loop_cyl': loop_cyl,
+            'poly_cyl': poly_cyl,
+            'index': vert_id[fFirst]}
@@ -0,0 +1,355 @@
+# This file is part of QSM-blender-addons.
+#
+# QSM-blender-addons is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# QSM-blender-addons is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with QSM-blender-addons.  If not, see <http://www.gnu.org/licenses/>.
+import random
+import numpy as np
+
+from .readers import open_text_file
+
+
+# UV vertex locations of the built-in leaf shapes.
+UV_SHAPES = {'isosceles_triangle': [(1, 0), (0.5, 1), (0, 0)],
+             'square': [(1, 0), (1, 1), (0, 1), (0, 0)]}
+
+
+# Read an Extended OBJ leaf model file. The base vertices and faces
+# are given before the first leaf, and later vertex and face lines are
+# ignored. Returns the base geometry, with the vertex coordinates and
+# a list of 0-based vertex index arrays of the faces, and the leaf
+# parameters as columnar arrays.
+def read_ext_obj(file_path):
+
+    # Base vertices.
+    base_vert = []
+    # Base faces.
+    base_face = []
+    # Parameters of each leaf.
+    rows = []
+    # Flag for each leaf: colour values present.
+    fColor = []
+
+    # Flag: vertex addition completed.
+    fVertDone = False
+    # Flag: face addition completed.
+    fFaceDone = False
+
+    with open_text_file(file_path) as lines:
+
+        # Iterate over rows in input file.
+        for line in lines:
+
+            # Split row into parameters.
+            params = line.split(' ', 1)
+
+            # Ignore rows with too few parameters.
+            if len(params) < 2:
+                continue
+
+            # Base vertex.
+            if params[0] == 'v':
+
+                # If vertex adding has been closed,
+                # ignore further vertex lines.
+                if fVertDone:
+                    continue
+
+                # Should have three coordinates.
+                co = params[1].split()
+                if len(co) != 3:
+                    continue
+
+                base_vert.append([float(x) for x in co])
+
+            # Base face.
+            elif params[0] == 'f':
+
+                # If face adding has been closed,
+                # ignore further face lines.
+                if fFaceDone:
+                    continue
+
+                # Close vertex adding.
+                fVertDone = True
+
+                # Faces have to have at least three vertices.
+                ind = params[1].split()
+                if len(ind) < 3:
+                    continue
+
+                base_face.append(np.array([int(x) - 1 for x in ind]))
+
+            # Leaf transformation parameters.
+            elif params[0] == 'L':
+
+                # Close vertex and face adding.
+                fVertDone = True
+                fFaceDone = True
+
+                # If no geometry, unable to create leaves.
+                if not base_vert or not base_face:
+                    raise ValueError('Input file missing vertices or faces.')
+
+                # Transformation configuration.
+                config = params[1].split()
+
+                # Line should have at least 15 parameters.
+                if len(config) < 15:
+                    print('L line has too few parameters:', len(config))
+                    continue
+
+                # Colour values are optional, missing colours are black.
+                if len(config) < 18:
+                    rows.append([float(x) for x in config[:15]] + [0.0] * 3)
+                    fColor.append(False)
+                else:
+                    rows.append([float(x) for x in config[:18]])
+                    fColor.append(True)
+
+    base = {'vert': np.array(base_vert, dtype=float).reshape(-1, 3),
+            'face': base_face}
+
+    # Convert to a single table for column slicing.
+    table = np.array(rows, dtype=float).reshape(-1, 18)
+
+    leaves = {'twig_start': table[:, 0:3],
+              'start': table[:, 3:6],
+              'direction': table[:, 6:9],
+              'normal': table[:, 9:12],
+              'scale': table[:, 12:15],
+              'color': table[:, 15:18],
+              'has_color': np.array(fColor, dtype=bool)}
+
+    return base, leaves
+
+
+# Read the base vertex coordinates of an OBJ or Extended OBJ file,
+# i.e., the vertices before the first face or leaf.
+def read_base_vertices(file_path):
+
+    vert = []
+
+    with open_text_file(file_path) as lines:
+
+        for line in lines:
+
+            params = line.split(' ', 1)
+
+            if len(params) < 2:
+                continue
+
+            if params[0] == 'v':
+
+                co = params[1].split()
+                if len(co) != 3:
+                    continue
+
+                vert.append([float(x) for x in co])
+
+            elif params[0] == 'f' or params[0] == 'L':
+                break
+
+    return np.array(vert, dtype=float).reshape(-1, 3)
+
+
+# Select leaves from a leaf table with an index array or a slice.
+def take_leaves(leaves, index):
+    return {key: value[index] for key, value in leaves.items()}
+
+
+# Keep about one in NRatio leaves of each stratum, either the leaves of
+# a twig or the leaves starting in a cubic voxel of the given size if it
+# is positive. The kept leaves of a stratum are drawn with the given
+# seed, and they are scaled up in the leaf plane so that the total leaf
+# area of the stratum is preserved. Strata with fewer than NRatio leaves
+# keep one leaf. Returns the decimated leaf table.
+def decimate_leaves(leaves, NRatio, seed=0, cell=0.0):
+
+    NLeaf = len(leaves['start'])
+
+    if NRatio <= 1 or NLeaf == 0:
+        return leaves
+
+    # Stratum of each leaf.
+    if cell > 0:
+        key = np.floor(leaves['start'] / cell).astype(np.int64)
+    else:
+        key = leaves['twig_start']
+
+    _, stratum = np.unique(key, axis=0, return_inverse=True)
+    stratum = stratum.ravel()
+
+    # Leaves in random order within each stratum.
+    perm = np.random.RandomState(seed).permutation(NLeaf)
+    order = perm[np.argsort(stratum[perm], kind='stable')]
+
+    # Rank of each leaf within its stratum in the random order.
+    count = np.bincount(stratum)
+    first = np.concatenate(([0], np.cumsum(count)[:-1]))
+    rank = np.arange(NLeaf) - first[stratum[order]]
+
+    # Keep every NRatio-th leaf, in the original order.
+    keep = np.sort(order[rank % NRatio == 0])
+
+    # Area scale of each stratum.
+    kept = np.bincount(stratum[keep], minlength=len(count))
+    area = count / np.maximum(kept, 1).astype(float)
+
+    sub = take_leaves(leaves, keep)
+
+    # Scale the leaf plane dimensions, the normal dimension is kept.
+    sub['scale'] = sub['scale'].copy()
+    sub['scale'][:, :2] *= np.sqrt(area[stratum[keep]])[:, None]
+
+    return sub
+
+
+# Compute the vertex, loop and polygon arrays of all leaves, by
+# transforming copies of the base geometry. Each leaf is scaled, rotated
+# to the frame given by its direction and normal, and translated to
+# its starting point.
+def leaf_geometry(base, leaves):
+
+    # Number of base vertices and leaves.
+    NVert = len(base['vert'])
+    NLeaf = len(leaves['start'])
+
+    direction = leaves['direction']
+    normal = leaves['normal']
+
+    # Coordinate change matrices, with the basis vectors as rows.
+    E = np.stack((np.cross(normal, direction), direction, normal), axis=1)
+
+    # Scale, rotate and translate.
+    co = np.einsum('lvj,lji->lvi',
+                   base['vert'][None, :, :] * leaves['scale'][:, None, :],
+                   E) + leaves['start'][:, None, :]
+
+    # Vertex indices of the loops and loop counts of the base faces.
+    base_loop = np.concatenate(base['face']).astype(np.int32)
+    base_size = np.array([len(f) for f in base['face']], dtype=np.int32)
+
+    # Offset the base topology to each leaf.
+    loop_vert = (base_loop[None, :] +
+                 NVert * np.arange(NLeaf, dtype=np.int32)[:, None]).ravel()
+    poly_size = np.tile(base_size, NLeaf)
+    poly_start = np.zeros(len(poly_size), dtype=np.int32)
+    np.cumsum(poly_size[:-1], out=poly_start[1:])
+
+    return {'co': co.reshape(-1, 3).astype(np.float32),
+            'loop_vert': loop_vert,
+            'poly_start': poly_start,
+            'poly_size': poly_size,
+            'vert_leaf': np.repeat(np.arange(NLeaf), NVert),
+            'loop_leaf': np.repeat(np.arange(NLeaf), len(base_loop))}
+
+
+# Colour of each leaf as RGB values, either read from the file or
+# drawn from a uniform distribution. Leaves without colour values in
+# the file are black.
+def leaf_colors(leaves, color_mode):
+
+    NLeaf = len(leaves['start'])
+
+    if color_mode == 'random':
+        return np.random.random_sample((NLeaf, 3))
+
+    return np.where(leaves['has_color'][:, None], leaves['color'], 0.0)
+
+
+# Compute relative start and end times for growth animations of the
+# given number of leaf groups, with random offsets. Returns a dict with
+# the times scaled onto the interval [0, 1] as the field 'times'.
+def growth_anim_limits(NGroup, intMin, intMax, seedInt):
+
+    # Generator with a fixed seed, for reproducibility.
+    rng = random.Random(seedInt)
+
+    # Minimum generated time.
+    minTime = 0
+    # Maximum generated time.
+    maxTime = 0
+
+    # List to store pairs of start and end times.
+    times = []
+
+    # Generate N pairs of times.
+    for iGroup in range(0, NGroup):
+
+        # Initial start times.
+        starttime = iGroup / NGroup
+
+        # If not the first group, add random offset to start time.
+        if iGroup > 0:
+            starttime += rng.uniform(intMin, intMax) / 100
+
+        # End time is always the default.
+        endtime = (iGroup + 1.0) / NGroup
+
+        # Update extreme values.
+        minTime = min(minTime, starttime, endtime)
+        maxTime = max(maxTime, starttime, endtime)
+
+        times.append([starttime, endtime])
+
+    # Compute full animation length from extreme values for scaling.
+    fullTime = maxTime - minTime
+
+    # Scale all values onto interval [0, 1].
+    times = [[(t - minTime) / fullTime for t in time] for time in times]
+
+    return {'times': times}
+
+
+# Vertex coordinates of the growth animation shape keys. Leaves are
+# divided evenly into the groups by their index in the file, given in
+# leafId if the leaves have been selected or reordered. In the shape
+# key of each group the vertices of its leaves are moved to the start
+# point of their twig. Yields the coordinates of one group at a time.
+def growth_shape_keys(co, vert_leaf, twig_start, NGroup, leafId=None):
+
+    # Group of the leaf of each vertex.
+    if leafId is None:
+        group = vert_leaf % NGroup
+    else:
+        group = np.asarray(leafId)[vert_leaf] % NGroup
+
+    for iGroup in range(NGroup):
+
+        key = co.copy()
+        I = group == iGroup
+        key[I] = twig_start[vert_leaf[I]]
+
+        yield key
+
+
+# Scale UV coordinates onto the unit square. Coordinates with a zero
+# range are only translated.
+def normalize_uv(uv):
+
+    uv = np.array(uv, dtype=float).reshape(-1, 2)
+
+    if len(uv) == 0:
+        return uv
+
+    uv_min = uv.min(axis=0)
+    uv_range = uv.max(axis=0) - uv_min
+    uv_range[uv_range == 0] = 1.0
+
+    return (uv - uv_min) / uv_range
+
+
+# UV coordinates of the mesh loops, overlapping all leaves. Each vertex
+# uses the UV vertex given by its index modulo the UV vertex count.
+def leaf_uv_coordinates(loop_vert, uv):
+    return uv[np.asarray(loop_vert) % len(uv)]
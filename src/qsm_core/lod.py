@@ -0,0 +1,84 @@
+# This file is part of QSM-blender-addons.
+#
+# QSM-blender-addons is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# QSM-blender-addons is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with QSM-blender-addons.  If not, see <http://www.gnu.org/licenses/>.
+
+import numpy as np
+
+from .region import cylinder_spheres
+
+
+# Distance of each tree from the eye, to the closest point of the
+# bounding box of its cylinders, given as the cylinder range of each
+# tree. The distance is zero if the eye is inside the box.
+def tree_distances(cyl, ranges, eye):
+
+    center, rad = cylinder_spheres(cyl)
+    eye = np.asarray(eye, dtype=float)
+
+    dist = np.zeros(len(ranges))
+
+    for iTree, (c0, c1) in enumerate(ranges):
+
+        if c1 <= c0:
+            continue
+
+        # Bounding box of the cylinders of the tree.
+        bmin = np.min(center[c0:c1] - rad[c0:c1, None], axis=0)
+        bmax = np.max(center[c0:c1] + rad[c0:c1, None], axis=0)
+
+        dist[iTree] = np.linalg.norm(eye - np.clip(eye, bmin, bmax))
+
+    return dist
+
+
+# Level of detail factor from distance, zero closer than the near
+# distance and one farther than the far distance, and linear between
+# them.
+def lod_factors(dist, dNear, dFar):
+
+    if dFar <= dNear:
+        return (np.asarray(dist) > dNear).astype(float)
+
+    return np.clip((np.asarray(dist) - dNear) / (dFar - dNear), 0.0, 1.0)
+
+
+# Maximum ring vertex count of each tree, from vmax at factor zero to
+# vmin at factor one.
+def lod_vertex_counts(factor, vmin, vmax):
+    return np.round(vmax + (vmin - vmax) * np.asarray(factor)).astype(int)
+
+
+# Select the cylinders of each tree with a radius at least the factor of
+# the tree times rCut. The cylinders of the stem are always kept.
+# Returns the indices of the selected cylinders, and the new cylinder
+# range of each tree.
+def lod_select(cyl, ranges, factor, rCut):
+
+    # Number of cylinders.
+    NCyl = len(cyl['radius'])
+
+    # Radius limit of the tree of each cylinder.
+    limit = np.zeros(NCyl)
+    for (c0, c1), f in zip(ranges, factor):
+        limit[c0:c1] = f * rCut
+
+    keep = (np.asarray(cyl['radius']) >= limit) | \
+        (np.asarray(cyl['branch']) == 1)
+
+    # New ranges from the counts of selected cylinders of each tree.
+    count = [np.count_nonzero(keep[c0:c1]) for c0, c1 in ranges]
+    bounds = np.concatenate(([0], np.cumsum(count))).astype(int)
+
+    return (np.flatnonzero(keep),
+            [(int(c0), int(c1)) for c0, c1 in zip(bounds[:-1], bounds[1:])])
@@ -0,0 +1,204 @@
+# This file is part of QSM-blender-addons.
+#
+# QSM-blender-addons is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# QSM-blender-addons is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with QSM-blender-addons.  If not, see <http://www.gnu.org/licenses/>.
+
+import io
+import time
+import cProfile
+import pstats
+import tracemalloc
+
+
+# Number of stack frames stored for each allocation in debug reports.
+DEBUG_FRAMES = 10
+
+
+# Records the wall time, CPU time and optionally the memory use of the
+# consecutive phases of an import. Starting a phase ends the previous
+# one, and the durations of phases with the same name are summed.
+# Memory is traced with the given number of stack frames, which should
+# be the frame count of the debug hooks if they are used as well, as
+# they share the tracing session.
+class ImportProfiler:
+
+    def __init__(self, fMemory=False, NFrame=1):
+
+        # Recorded values of each phase, in order of first start.
+        self.phases = {}
+
+        # Name and start values of the running phase.
+        self.current = None
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.memory = 0
+
+        # Flag: record memory with tracemalloc.
+        self.fMemory = fMemory
+
+        # Flag: tracing was started by the profiler.
+        self.fStartedTracing = False
+
+        if fMemory and not tracemalloc.is_tracing():
+            tracemalloc.start(NFrame)
+            self.fStartedTracing = True
+
+        # Start values of the whole import.
+        self.start_wall = time.perf_counter()
+        self.start_cpu = time.process_time()
+
+    # Start a new phase, ending the running one.
+    def phase(self, name):
+
+        self.end()
+
+        self.current = name
+        self.wall = time.perf_counter()
+        self.cpu = time.process_time()
+
+        if self.fMemory:
+            self.memory = tracemalloc.get_traced_memory()[0]
+
+    # End the running phase, if any.
+    def end(self):
+
+        if self.current is None:
+            return
+
+        record = self.phases.setdefault(self.current, {'wall': 0.0,
+                                                       'cpu': 0.0,
+                                                       'count': 0})
+
+        record['wall'] += time.perf_counter() - self.wall
+        record['cpu'] += time.process_time() - self.cpu
+        record['count'] += 1
+
+        # Change of traced memory in bytes, as a float because custom
+        # properties only hold 32-bit integers.
+        if self.fMemory:
+            record['memory'] = record.get('memory', 0.0) + \
+                float(tracemalloc.get_traced_memory()[0] - self.memory)
+
+        self.current = None
+
+    # Stop profiling, ending the running phase and the memory tracing
+    # started by the profiler. Can be called more than once.
+    def stop(self):
+
+        self.end()
+
+        if self.fStartedTracing:
+            tracemalloc.stop()
+            self.fStartedTracing = False
+
+    # Stop profiling and return the report as a dictionary.
+    def report(self):
+
+        self.stop()
+
+        return {'phases': self.phases,
+                'total': {'wall': time.perf_counter() - self.start_wall,
+                          'cpu': time.process_time() - self.start_cpu}}
+
+
+# Optional debugging of the expensive import functions. When enabled,
+# each function is run with cProfile and tracemalloc, and the most
+# expensive functions with their callers and the largest allocations
+# with their call stacks are written to a report file. When disabled,
+# functions are called directly.
+class DebugHooks:
+
+    def __init__(self, fEnabled=False, file_path='', NTop=25,
+                 NFrame=DEBUG_FRAMES):
+
+        # Flag: debugging enabled.
+        self.fEnabled = fEnabled
+
+        # Path to report file, or empty to display in the console.
+        self.file_path = file_path
+
+        # Number of functions and allocations to report.
+        self.NTop = NTop
+
+        # Number of stack frames stored for each allocation.
+        self.NFrame = NFrame
+
+        # Clear an existing report file.
+        if fEnabled and file_path:
+            open(file_path, 'w').close()
+
+    # Call a function with the given arguments, with profiling if
+    # debugging is enabled.
+    def run(self, name, function, *args):
+
+        if not self.fEnabled:
+            return function(*args)
+
+        # Start tracing allocations, if not already traced. Tracing
+        # started elsewhere can not be restarted without losing its
+        # memory counts, so its frame count is kept.
+        fStartedTracing = not tracemalloc.is_tracing()
+        if fStartedTracing:
+            tracemalloc.start(self.NFrame)
+        elif tracemalloc.get_traceback_limit() < self.NFrame:
+            print('Allocation call stacks limited to %d frame(s).' %
+                  tracemalloc.get_traceback_limit())
+
+        before = tracemalloc.take_snapshot()
+
+        calls = cProfile.Profile()
+        calls.enable()
+
+        try:
+            return function(*args)
+
+        finally:
+            calls.disable()
+
+            after = tracemalloc.take_snapshot()
+
+            if fStartedTracing:
+                tracemalloc.stop()
+
+            self.write_report(name, calls, after.compare_to(before,
+                                                            'traceback'))
+
+    # Write the report of a single function.
+    def write_report(self, name, calls, allocations):
+
+        out = io.StringIO()
+
+        out.write('=' * 79 + '\n')
+        out.write('Debug report: ' + name + '\n')
+        out.write('=' * 79 + '\n\n')
+
+        # Most expensive functions and their callers.
+        stats = pstats.Stats(calls, stream=out).sort_stats('cumulative')
+        stats.print_stats(self.NTop)
+        stats.print_callers(self.NTop)
+
+        # Largest allocations and their call stacks.
+        out.write('Top allocations:\n\n')
+
+        for stat in allocations[:self.NTop]:
+            out.write('%.1f KiB in %d blocks\n' % (stat.size_diff / 1024,
+                                                    stat.count_diff))
+            for line in stat.traceback.format():
+                out.write('    ' + line + '\n')
+            out.write('\n')
+
+        if self.file_path:
+            with open(self.file_path, 'a') as f:
+                f.write(out.getvalue())
+        else:
+            print(out.getvalue())
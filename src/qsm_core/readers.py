@@ -0,0 +1,646 @@
+# This file is part of QSM-blender-addons.
+#
+# QSM-blender-addons is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# QSM-blender-addons is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with QSM-blender-addons.  If not, see <http://www.gnu.org/licenses/>.
+
+import io
+import itertools
+import gzip
+import lzma
+import bz2
+import numpy as np
+
+from .topology import take_cylinders
+
+# Optional support for Zstandard compressed input files.
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Optional support for TreeQSM MAT-files.
+try:
+    import scipy.io
+except ImportError:
+    scipy = None
+
+# Optional support for MAT-files of version 7.3, which are HDF5 files.
+try:
+    import h5py
+except ImportError:
+    h5py = None
+
+
+# Magic bytes at the beginning of supported compressed files.
+COMPRESSION_MAGIC = [(b'\x1f\x8b', 'gzip'),
+                     (b'\xfd7zXZ\x00', 'xz'),
+                     (b'BZh', 'bz2'),
+                     (b'\x28\xb5\x2f\xfd', 'zstd')]
+
+
+# Detect the compression format of a file from its magic bytes.
+# Returns None for uncompressed files.
+def detect_compression(file_path):
+
+    with open(file_path, 'rb') as f:
+        head = f.read(6)
+
+    for magic, compression in COMPRESSION_MAGIC:
+        if head.startswith(magic):
+            return compression
+
+    return None
+
+
+# Check that the compression format and type of a file can be read.
+# Returns an error message, or None if the file can be read.
+def check_file_support(file_path):
+
+    if detect_compression(file_path) == 'zstd' and zstandard is None:
+        return 'Reading Zstandard compressed files requires the ' \
+               'zstandard module.'
+
+    version = mat_file_version(file_path)
+
+    if version == '7.3' and h5py is None:
+        return 'Reading MAT-files of version 7.3 requires the h5py module.'
+    elif version and scipy is None:
+        return 'Reading MAT-files requires the scipy module.'
+
+    return None
+
+
+# Open a possibly compressed file for reading as a binary stream.
+# Compressed files are decompressed while reading, without
+# temporary files.
+def open_binary_stream(file_path):
+
+    compression = detect_compression(file_path)
+
+    if compression == 'gzip':
+        return gzip.open(file_path, 'rb')
+    elif compression == 'xz':
+        return lzma.open(file_path, 'rb')
+    elif compression == 'bz2':
+        return bz2.open(file_path, 'rb')
+    elif compression == 'zstd':
+        reader = zstandard.ZstdDecompressor().stream_reader(
+            open(file_path, 'rb'),
+            closefd=True
+        )
+        return io.BufferedReader(reader)
+    else:
+        return open(file_path, 'rb')
+
+
+# Open a possibly compressed file for reading line by line.
+def open_text_file(file_path):
+    return io.TextIOWrapper(open_binary_stream(file_path))
+
+
+# Convert a table of cylinder rows with the same number of values into
+# columnar arrays. If fTreeId is set, the first column is the tree index.
+def cylinders_from_table(table, fTreeId=False):
+
+    # Separate tree index from the cylinder parameters.
+    if fTreeId:
+        tree = table[:, 0].astype(int)
+        table = table[:, 1:]
+
+    # Number of cylinders and values per cylinder.
+    NCyl, NCol = table.shape
+
+    # Colourmap values. A single value is replicated in all elements.
+    color = np.ones((NCyl, 4))
+    if NCol > 11:
+        color[:, :3] = table[:, 9:12]
+    elif NCol > 9:
+        color[:] = table[:, 9:10]
+
+    cyl = {'branch': table[:, 0].astype(int),
+           'start': table[:, 1:4],
+           'axis': table[:, 4:7],
+           'length': table[:, 7],
+           'radius': table[:, 8],
+           'color': color,
+           'has_color': np.full(NCyl, NCol > 9),
+           'extra': table[:, 12:]}
+
+    if fTreeId:
+        cyl['tree'] = tree
+
+    return cyl
+
+
+# Number of rows converted at a time when reading QSM TXT-files.
+READ_CHUNK_LINES = 2**16
+
+
+# Read the cylinder parameters of a QSM TXT-file into columnar arrays.
+# If fTreeId is set, the first column of each row is the tree index.
+# The file is streamed in chunks of rows, so that only the rows of one
+# chunk are held as text at a time.
+def read_cylinder_file(file_path, fTreeId=False):
+
+    chunks = []
+
+    with open_text_file(file_path) as f:
+        while True:
+            lines = list(itertools.islice(f, READ_CHUNK_LINES))
+
+            if not lines:
+                break
+
+            chunks.append(cylinders_from_lines(lines, fTreeId))
+
+    if not chunks:
+        return cylinders_from_lines([], fTreeId)
+
+    return join_cylinder_chunks(chunks)
+
+
+# Join cylinder tables read from consecutive chunks of a file. The
+# additional attributes are padded to the same length with NaN values.
+def join_cylinder_chunks(chunks):
+
+    if len(chunks) == 1:
+        return chunks[0]
+
+    NExtra = max(c['extra'].shape[1] for c in chunks)
+
+    cyl = {}
+
+    for key in chunks[0]:
+
+        if key == 'extra':
+            cyl[key] = np.concatenate([
+                np.pad(c['extra'], ((0, 0), (0, NExtra - c['extra'].shape[1])),
+                       constant_values=np.nan)
+                for c in chunks
+            ])
+        else:
+            cyl[key] = np.concatenate([c[key] for c in chunks])
+
+    return cyl
+
+
+# Read the cylinder rows appended to an uncompressed QSM TXT-file after
+# the given byte offset. Only complete rows, ending with a line break,
+# are read, so that a row being written is read on a later call.
+# Returns the cylinder table and the offset after the last complete row.
+# If a row can not be read, the rows before it are returned with the
+# offset of that row, and ValueError is raised when reading from it.
+def read_appended_cylinders(file_path, offset=0, fTreeId=False):
+
+    with open(file_path, 'rb') as f:
+        f.seek(offset)
+        data = f.read()
+
+    end = data.rfind(b'\n') + 1
+
+    try:
+        return (cylinders_from_lines(data[:end].decode().split('\n'),
+                                     fTreeId),
+                offset + end)
+    except ValueError:
+        pass
+
+    # Find the first row that can not be read.
+    lines = data[:end].split(b'\n')
+    size = 0
+
+    for iLine, line in enumerate(lines):
+        try:
+            cylinders_from_lines([line.decode()], fTreeId)
+        except ValueError as e:
+            if iLine == 0:
+                raise ValueError('Row at byte %d can not be read: %s' %
+                                 (offset, e))
+            break
+        size += len(line) + 1
+
+    return (cylinders_from_lines([line.decode() for line in lines[:iLine]],
+                                 fTreeId),
+            offset + size)
+
+
+# Convert the rows of a QSM TXT-file into columnar arrays. When all
+# rows have the same number of values, they are converted at once,
+# otherwise row by row.
+def cylinders_from_lines(lines, fTreeId=False):
+
+    # Convert all rows at once. Rows of different lengths can not be
+    # converted into a single table.
+    try:
+        table = np.array([line.split() for line in lines if line.strip()],
+                         dtype=float)
+    except ValueError:
+        table = None
+
+    if table is not None and table.ndim == 2 and \
+       table.shape[1] >= 9 + int(fTreeId):
+        return cylinders_from_table(table, fTreeId)
+
+    # Tree index of each row.
+    trees = []
+    # Cylinder parameters of each row.
+    rows = []
+    # Colourmap values of each row.
+    colors = []
+    # Flag for each row: colourmap value present.
+    fColor = []
+    # Additional attribute values after the colourmap values.
+    extra = []
+
+    # Iterate over rows in input file.
+    for line in lines:
+
+        # Split row into parameters.
+        params = line.split()
+
+        # Separate tree index from the cylinder parameters.
+        if fTreeId:
+            if len(params) < 10:
+                continue
+
+            trees.append(int(float(params[0])))
+            params = params[1:]
+
+        # Ignore rows with too few parameters.
+        if len(params) < 9:
+            continue
+
+        # Store cylinder parameters.
+        rows.append([float(x) for x in params[0:9]])
+
+        # Check if extra columns for colourmap exist. A single
+        # value is replicated in all elements.
+        if len(params) > 11:
+            colors.append((float(params[9]),
+                           float(params[10]),
+                           float(params[11]),
+                           1.0))
+            fColor.append(True)
+        elif len(params) > 9:
+            colors.append((float(params[9]),) * 4)
+            fColor.append(True)
+        else:
+            colors.append((1.0, 1.0, 1.0, 1.0))
+            fColor.append(False)
+
+        # Store any additional attributes.
+        extra.append([float(x) for x in params[12:]])
+
+    # Convert to a single table for column slicing.
+    table = np.array(rows, dtype=float).reshape(-1, 9)
+
+    # Pad additional attributes to the same length with NaN values.
+    NExtra = max([len(e) for e in extra], default=0)
+    extra_table = np.full((len(extra), NExtra), np.nan)
+    for i, e in enumerate(extra):
+        extra_table[i, :len(e)] = e
+
+    cyl = {'branch': table[:, 0].astype(int),
+           'start': table[:, 1:4],
+           'axis': table[:, 4:7],
+           'length': table[:, 7],
+           'radius': table[:, 8],
+           'color': np.array(colors, dtype=float).reshape(-1, 4),
+           'has_color': np.array(fColor, dtype=bool),
+           'extra': extra_table}
+
+    if fTreeId:
+        cyl['tree'] = np.array(trees, dtype=int)
+
+    return cyl
+
+
+# Identifier at the beginning of binary QSM files.
+QSMB_MAGIC = b'QSMB'
+
+# Version of the binary QSM format.
+QSMB_VERSION = 1
+
+# Size of the binary QSM header in bytes. The header contains the
+# identifier, version, cylinder count, additional attribute count and
+# flags, and is padded so that the column blocks are aligned.
+QSMB_HEADER_SIZE = 32
+
+# Header flag: file contains a tree index column.
+QSMB_FLAG_TREE = 1
+# Header flags: file contains the topology columns of TreeQSM MAT-files.
+QSMB_FLAG_PARENT = 2
+QSMB_FLAG_EXTENSION = 4
+QSMB_FLAG_BRANCH_ORDER = 8
+QSMB_FLAG_POSITION = 16
+
+# Optional integer columns, as tuples of header flag and name, in file
+# order after the other column blocks.
+QSMB_OPTIONAL_COLUMNS = [(QSMB_FLAG_TREE, 'tree'),
+                         (QSMB_FLAG_PARENT, 'parent'),
+                         (QSMB_FLAG_EXTENSION, 'extension'),
+                         (QSMB_FLAG_BRANCH_ORDER, 'branch_order'),
+                         (QSMB_FLAG_POSITION, 'position_in_branch')]
+
+
+# Layout of the column blocks of a binary QSM file, as tuples of
+# name, data type, shape and byte offset.
+def binary_layout(NCyl, NExtra, flags=0):
+
+    # Name, data type and number of elements per cylinder of each
+    # column block, in file order. Colour values are stored as RGBA,
+    # with NaN values marking cylinders without a colour.
+    columns = [('branch', '<i4', 1),
+               ('start',  '<f4', 3),
+               ('axis',   '<f4', 3),
+               ('length', '<f4', 1),
+               ('radius', '<f4', 1),
+               ('color',  '<f4', 4),
+               ('extra',  '<f4', NExtra)]
+
+    # Optional columns.
+    for flag, name in QSMB_OPTIONAL_COLUMNS:
+        if flags & flag:
+            columns.append((name, '<i4', 1))
+
+    layout = []
+
+    # Blocks follow each other directly after the header.
+    offset = QSMB_HEADER_SIZE
+
+    for name, dtype, width in columns:
+
+        if width == 1:
+            shape = (NCyl,)
+        else:
+            shape = (NCyl, width)
+
+        layout.append((name, dtype, shape, offset))
+
+        offset += NCyl * width * np.dtype(dtype).itemsize
+
+    return layout
+
+
+# Check if the given, possibly compressed, file is a binary QSM file.
+def is_binary_qsm_file(file_path):
+
+    with open_binary_stream(file_path) as f:
+        return f.read(len(QSMB_MAGIC)) == QSMB_MAGIC
+
+
+# Write cylinder parameters into a binary QSM file.
+def write_cylinder_binary(cyl, file_path):
+
+    # Number of cylinders and additional attributes.
+    NCyl = len(cyl['radius'])
+    NExtra = cyl['extra'].shape[1]
+
+    # Flags of optional columns.
+    flags = 0
+    for flag, name in QSMB_OPTIONAL_COLUMNS:
+        if name in cyl:
+            flags |= flag
+
+    # Colour values with missing colours marked with NaN values.
+    color = np.array(cyl['color'], dtype=float)
+    color[~cyl['has_color']] = np.nan
+
+    # Values to write, by column name.
+    values = dict(cyl)
+    values['color'] = color
+
+    with open(file_path, 'wb') as f:
+
+        # Header, padded to full size.
+        header = QSMB_MAGIC + np.array([QSMB_VERSION, NCyl, NExtra, flags],
+                                       dtype='<i4').tobytes()
+        f.write(header.ljust(QSMB_HEADER_SIZE, b'\0'))
+
+        # Column blocks.
+        for name, dtype, shape, offset in binary_layout(NCyl, NExtra, flags):
+            f.write(np.ascontiguousarray(values[name], dtype=dtype).tobytes())
+
+
+# Read the cylinder parameters of a binary QSM file. The column
+# blocks of uncompressed files are memory-mapped, so only the columns
+# that are accessed are read from the disk. Compressed files are
+# decompressed into memory.
+def read_cylinder_binary(file_path):
+
+    # Flag: file is compressed and can not be memory-mapped.
+    fCompressed = detect_compression(file_path) is not None
+
+    # Read header, and the full content of compressed files.
+    with open_binary_stream(file_path) as f:
+        if fCompressed:
+            content = f.read()
+            header = content[:QSMB_HEADER_SIZE]
+        else:
+            header = f.read(QSMB_HEADER_SIZE)
+
+    if len(header) < QSMB_HEADER_SIZE or \
+       header[:len(QSMB_MAGIC)] != QSMB_MAGIC:
+        raise ValueError('Not a binary QSM file.')
+
+    version, NCyl, NExtra, flags = [int(x) for x in np.frombuffer(
+        header, dtype='<i4', count=4, offset=len(QSMB_MAGIC)
+    )]
+
+    if version != QSMB_VERSION:
+        raise ValueError('Unsupported binary QSM version: %d' % version)
+
+    cyl = {}
+
+    # Map each column block.
+    for name, dtype, shape, offset in binary_layout(NCyl, NExtra, flags):
+
+        # Memory map can not be empty.
+        if np.prod(shape) == 0:
+            cyl[name] = np.zeros(shape, dtype=dtype)
+        elif fCompressed:
+            cyl[name] = np.frombuffer(content, dtype=dtype,
+                                      count=int(np.prod(shape)),
+                                      offset=offset).reshape(shape)
+        else:
+            cyl[name] = np.memmap(file_path, dtype=dtype, mode='r',
+                                  offset=offset, shape=shape)
+
+    # Cylinders with colour values, and the default colour for others.
+    cyl['has_color'] = ~np.isnan(cyl['color'][:, 0])
+
+    if not cyl['has_color'].all():
+        cyl['color'] = np.where(cyl['has_color'][:, None],
+                                cyl['color'], 1.0)
+
+    return cyl
+
+
+# Version of a MATLAB MAT-file from its header text, either '5.0' or
+# '7.3'. Returns None if the file is not a MAT-file. Compressed files
+# are detected from their decompressed header.
+def mat_file_version(file_path):
+
+    with open_binary_stream(file_path) as f:
+        header = f.read(128)
+
+    if not header.startswith(b'MATLAB'):
+        return None
+    elif header.startswith(b'MATLAB 7.3'):
+        return '7.3'
+    else:
+        return '5.0'
+
+
+# Open a possibly compressed MAT-file for reading as a seekable binary
+# stream. The MAT readers seek within the file, so compressed files are
+# decompressed into memory.
+def open_mat_file(file_path):
+
+    if detect_compression(file_path) is None:
+        return open(file_path, 'rb')
+
+    with open_binary_stream(file_path) as f:
+        return io.BytesIO(f.read())
+
+
+# Read the fields of the cylinder struct of a TreeQSM MAT-file of
+# version 7.3 into a dictionary.
+def read_mat73_cylinder_fields(file_path):
+
+    fields = {}
+
+    with open_mat_file(file_path) as stream, h5py.File(stream, 'r') as f:
+
+        # Cylinder struct is either saved directly or as a field of the
+        # QSM struct.
+        if 'cylinder' in f:
+            group = f['cylinder']
+        elif 'QSM' in f or 'qsm' in f:
+            qsm = f['QSM'] if 'QSM' in f else f['qsm']
+            group = qsm['cylinder']
+
+            # Struct arrays store references to the fields of each
+            # element, use the first model.
+            if isinstance(group, h5py.Dataset):
+                group = f[group[()].flat[0]]
+        else:
+            raise ValueError('No cylinder data in MAT-file.')
+
+        for name, item in group.items():
+
+            # Dereference the field of the first element.
+            if h5py.check_dtype(ref=item.dtype):
+                item = f[item[()].flat[0]]
+
+            # MATLAB arrays are stored in column-major order.
+            fields[name] = np.array(item).T
+
+    return fields
+
+
+# Read the fields of the cylinder struct of a TreeQSM MAT-file into a
+# dictionary.
+def read_mat_cylinder_fields(file_path):
+
+    with open_mat_file(file_path) as f:
+        mat = scipy.io.loadmat(f,
+                               squeeze_me=True,
+                               struct_as_record=False)
+
+    # Cylinder struct is either saved directly or as a field of the
+    # QSM struct.
+    if 'cylinder' in mat:
+        cylinder = mat['cylinder']
+    elif 'QSM' in mat or 'qsm' in mat:
+        qsm = mat['QSM'] if 'QSM' in mat else mat['qsm']
+
+        # Use the first model of a struct array.
+        if isinstance(qsm, np.ndarray):
+            qsm = qsm.flat[0]
+
+        cylinder = qsm.cylinder
+    else:
+        raise ValueError('No cylinder data in MAT-file.')
+
+    return {name: getattr(cylinder, name)
+            for name in cylinder._fieldnames}
+
+
+# Read the cylinder parameters and topology of a TreeQSM MAT-file into
+# columnar arrays. Cylinders are ordered by branch, and the parent and
+# extension indices are updated to match the order.
+def read_treeqsm_mat(file_path):
+
+    if mat_file_version(file_path) == '7.3':
+        fields = read_mat73_cylinder_fields(file_path)
+    else:
+        fields = read_mat_cylinder_fields(file_path)
+
+    # Cylinder geometry.
+    start = np.asarray(fields['start'], dtype=float).reshape(-1, 3)
+    axis = np.asarray(fields['axis'], dtype=float).reshape(-1, 3)
+    length = np.asarray(fields['length'], dtype=float).ravel()
+    radius = np.asarray(fields['radius'], dtype=float).ravel()
+
+    # Number of cylinders.
+    NCyl = len(radius)
+
+    cyl = {'start': start,
+           'axis': axis,
+           'length': length,
+           'radius': radius}
+
+    # Branch index of each cylinder, all in the stem if missing.
+    if 'branch' in fields:
+        cyl['branch'] = np.asarray(fields['branch']).astype(int).ravel()
+    else:
+        cyl['branch'] = np.ones(NCyl, dtype=int)
+
+    # Topology fields: 1-based cylinder indices of parents and
+    # extensions (0 if none), and branch order and position.
+    topology = [('parent', 'parent'),
+                ('extension', 'extension'),
+                ('branch_order', 'BranchOrder'),
+                ('position_in_branch', 'PositionInBranch')]
+
+    for key, name in topology:
+        if name in fields:
+            cyl[key] = np.asarray(fields[name]).astype(int).ravel()
+
+    # Order cylinders so that the cylinders of each branch are
+    # consecutive.
+    order = np.argsort(cyl['branch'], kind='stable')
+
+    if np.any(order != np.arange(NCyl)):
+        cyl = take_cylinders(cyl, order)
+
+    # No colour or additional attributes in MAT-files.
+    cyl['color'] = np.ones((NCyl, 4))
+    cyl['has_color'] = np.zeros(NCyl, dtype=bool)
+    cyl['extra'] = np.zeros((NCyl, 0))
+
+    return cyl
+
+
+# Read the cylinder parameters of a QSM file either in the TXT format,
+# the binary format or as a TreeQSM MAT-file. If fTreeId is set, the
+# first column of a TXT-file is read as the tree index.
+def read_qsm_file(file_path, fTreeId=False):
+
+    if mat_file_version(file_path):
+        return read_treeqsm_mat(file_path)
+    elif is_binary_qsm_file(file_path):
+        return read_cylinder_binary(file_path)
+    else:
+        return read_cylinder_file(file_path, fTreeId)
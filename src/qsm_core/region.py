@@ -0,0 +1,420 @@
+# This file is part of QSM-blender-addons.
+#
+# QSM-blender-addons is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# QSM-blender-addons is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with QSM-blender-addons.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import numpy as np
+
+
+# Identifier at the beginning of grid index files.
+GRID_INDEX_MAGIC = b'QSMI'
+
+
+# Bounding spheres of cylinders, with the centre in the middle of the
+# axis. Returns the centres and radii.
+def cylinder_spheres(cyl):
+
+    H = np.asarray(cyl['length'], dtype=float)
+    R = np.asarray(cyl['radius'], dtype=float)
+
+    center = np.asarray(cyl['start'], dtype=float) + \
+        0.5 * H[:, None] * np.asarray(cyl['axis'], dtype=float)
+
+    return center, np.sqrt((0.5 * H) ** 2 + R ** 2)
+
+
+# Bounding spheres of leaves, with the centre at the leaf origin.
+# Returns the centres and radii.
+def leaf_spheres(base, leaves):
+
+    # Largest distance of a base vertex from the origin.
+    extent = np.sqrt(np.max(np.sum(base['vert'] ** 2, axis=1)))
+
+    return (np.asarray(leaves['start'], dtype=float),
+            extent * np.max(np.abs(leaves['scale']), axis=1))
+
+
+# Axis-aligned box region between two corners.
+def box_region(bmin, bmax):
+
+    bounds = np.array([bmin, bmax], dtype=float)
+
+    return {'type': 'box',
+            'bounds': np.array([bounds.min(axis=0), bounds.max(axis=0)])}
+
+
+# Spherical region.
+def sphere_region(center, radius):
+
+    center = np.asarray(center, dtype=float)
+
+    return {'type': 'sphere',
+            'center': center,
+            'radius': float(radius),
+            'bounds': np.array([center - radius, center + radius])}
+
+
+# Region of a camera view frustum. The corners of the view frame are
+# given in order around the frame, and the view direction is from the
+# eye towards their centre. With an orthographic camera the side
+# planes are parallel to the view direction. The near and far planes
+# are at the given distances from the eye along the view direction.
+def frustum_region(eye, corners, clip_start, clip_end, fOrtho=False):
+
+    eye = np.asarray(eye, dtype=float)
+    corners = np.asarray(corners, dtype=float)
+
+    # Unit view direction.
+    direction = corners.mean(axis=0) - eye
+    direction /= np.linalg.norm(direction)
+
+    # Planes as rows (nx, ny, nz, d), with n . x + d >= 0 inside.
+    planes = []
+
+    for i in range(len(corners)):
+
+        c0 = corners[i]
+        c1 = corners[(i + 1) % len(corners)]
+
+        if fOrtho:
+            n = np.cross(direction, c1 - c0)
+        else:
+            n = np.cross(c0 - eye, c1 - eye)
+
+        n /= np.linalg.norm(n)
+
+        # Orient the normal towards the centre of the frame.
+        if np.dot(n, corners.mean(axis=0) - c0) < 0:
+            n = -n
+
+        planes.append(np.append(n, -np.dot(n, c0)))
+
+    # Near and far planes.
+    planes.append(np.append(direction,
+                            -np.dot(direction, eye) - clip_start))
+    planes.append(np.append(-direction,
+                            np.dot(direction, eye) + clip_end))
+
+    # Corners of the frustum on the near and far planes, for bounds.
+    dist = np.dot(corners - eye, direction)
+    points = []
+    for clip in (clip_start, clip_end):
+        if fOrtho:
+            points.append(corners + (clip - dist)[:, None] * direction)
+        else:
+            points.append(eye + (corners - eye) * (clip / dist)[:, None])
+
+    points = np.concatenate(points)
+
+    return {'type': 'frustum',
+            'planes': np.array(planes),
+            'bounds': np.array([points.min(axis=0), points.max(axis=0)])}
+
+
+# Flag for each bounding sphere: intersects the region.
+def region_mask(center, rad, region):
+
+    center = np.asarray(center, dtype=float).reshape(-1, 3)
+    rad = np.asarray(rad, dtype=float)
+
+    if region['type'] == 'box':
+
+        # Distance from the closest point of the box.
+        closest = np.clip(center, region['bounds'][0], region['bounds'][1])
+        return np.sum((center - closest) ** 2, axis=1) <= rad ** 2
+
+    elif region['type'] == 'sphere':
+
+        d = np.sqrt(np.sum((center - region['center']) ** 2, axis=1))
+        return d <= region['radius'] + rad
+
+    # Inside or intersecting all frustum planes.
+    planes = region['planes']
+    dist = np.dot(center, planes[:, :3].T) + planes[:, 3]
+
+    return np.all(dist >= -rad[:, None], axis=1)
+
+
+# Uniform grid index of bounding spheres. Each sphere is assigned to
+# the cell of its centre, and the indices of the spheres are sorted by
+# cell. The cell size is chosen to have about NPerCell spheres per
+# occupied cell on average, if they are spread over the bounding box.
+def build_grid_index(center, rad, NPerCell=64):
+
+    center = np.asarray(center, dtype=float).reshape(-1, 3)
+
+    # Number of spheres.
+    N = len(center)
+
+    if N == 0:
+        origin = np.zeros(3)
+        extent = np.ones(3)
+    else:
+        origin = center.min(axis=0)
+        extent = np.maximum(center.max(axis=0) - origin, 1e-9)
+
+    # Cell size and number of cells in each dimension.
+    NCell = max(N / float(NPerCell), 1)
+    cell = max(np.prod(extent) / NCell, max(extent) ** 3 / 1e6) ** (1 / 3.0)
+    dims = np.floor(extent / cell).astype(int) + 1
+
+    # Flat cell index of each sphere.
+    ijk = np.floor((center - origin) / cell).astype(int)
+    flat = np.ravel_multi_index(ijk.T, dims) if N else np.zeros(0, int)
+
+    order = np.argsort(flat, kind='stable')
+
+    # Index of the first sphere of each cell, with N as the last element.
+    start = np.searchsorted(flat[order], np.arange(np.prod(dims) + 1))
+
+    return {'origin': origin,
+            'cell': np.array([cell]),
+            'dims': dims,
+            'order': order,
+            'start': start,
+            'maxrad': np.array([np.max(rad) if N else 0.0])}
+
+
+# Indices of the spheres whose cell overlaps the given bounds,
+# expanded by the largest sphere radius. The indices are sorted.
+def query_grid_index(index, bounds):
+
+    origin = index['origin']
+    cell = index['cell'][0]
+    dims = index['dims']
+    maxrad = index['maxrad'][0]
+
+    # Range of cells overlapping the expanded bounds.
+    lo = np.floor((bounds[0] - maxrad - origin) / cell).astype(int)
+    hi = np.floor((bounds[1] + maxrad - origin) / cell).astype(int)
+    lo = np.maximum(lo, 0)
+    hi = np.minimum(hi, dims - 1)
+
+    if np.any(hi < lo):
+        return np.zeros(0, dtype=int)
+
+    # Flat indices of the overlapping cells.
+    grids = np.meshgrid(*[np.arange(a, b + 1) for a, b in zip(lo, hi)],
+                        indexing='ij')
+    cells = np.ravel_multi_index([g.ravel() for g in grids], dims)
+
+    # Concatenate the sphere ranges of the cells.
+    start = index['start'][cells]
+    count = index['start'][cells + 1] - start
+    offset = np.repeat(start - np.cumsum(count) + count, count)
+    candidates = index['order'][offset + np.arange(count.sum())]
+
+    return np.sort(candidates)
+
+
+# Path of the grid index file next to an input file.
+def grid_index_path(file_path):
+    return file_path + '.qsmi'
+
+
+# Whether the path is a grid index file, which is not an input file,
+# e.g., when matching input files with wildcards.
+def is_grid_index(file_path):
+    return file_path.endswith('.qsmi')
+
+
+# Read the grid index of an input file, if the index file exists and
+# was written for the current version of the input file with the same
+# key, which identifies how the file was read. Otherwise returns None.
+def read_grid_index(file_path, key=''):
+
+    index_path = grid_index_path(file_path)
+
+    if not os.path.isfile(index_path):
+        return None
+
+    stat = os.stat(file_path)
+
+    with open(index_path, 'rb') as f:
+
+        if f.read(len(GRID_INDEX_MAGIC)) != GRID_INDEX_MAGIC:
+            return None
+
+        data = np.load(f)
+        index = {name: data[name] for name in data.files}
+
+    if index.pop('source')[0] != stat.st_size or \
+       index.pop('mtime')[0] != stat.st_mtime or \
+       str(index.pop('key')) != key:
+        return None
+
+    return index
+
+
+# Write the grid index of an input file, with the size and modification
+# time of the input file to detect changes. The index is skipped if it
+# can not be written, e.g., in a read-only directory, and is then built
+# again on the next use. Returns whether the index was written.
+def write_grid_index(index, file_path, key=''):
+
+    stat = os.stat(file_path)
+    index_path = grid_index_path(file_path)
+
+    try:
+        with open(index_path, 'wb') as f:
+            f.write(GRID_INDEX_MAGIC)
+            np.savez(f,
+                     source=np.array([stat.st_size]),
+                     mtime=np.array([stat.st_mtime]),
+                     key=np.array(key),
+                     **index)
+    except OSError as e:
+        print('Grid index not written:', e)
+        # Remove a partly written index.
+        if os.path.isfile(index_path):
+            try:
+                os.remove(index_path)
+            except OSError:
+                pass
+        return False
+
+    return True
+
+
+# Indices of the bounding spheres in the region. If a grid index is
+# given, only the spheres in the overlapping cells are tested, and the
+# spheres function is called with their indices to compute them.
+def select_spheres(spheres, N, region, index=None):
+
+    if index is None:
+        candidates = np.arange(N)
+    else:
+        candidates = query_grid_index(index, region['bounds'])
+
+    center, rad = spheres(candidates)
+
+    return candidates[region_mask(center, rad, region)]
+
+
+# Indices of the cylinders in the region. If file_path is given, the
+# grid index of the file is used, and it is written next to the file
+# on the first use, so that later imports of the same file test only
+# the cylinders near the region. The key identifies how the file was
+# read, such as with or without a tree index column.
+def select_cylinders(cyl, region, file_path=None, key='cylinders'):
+
+    N = len(cyl['radius'])
+
+    def spheres(index):
+        return cylinder_spheres({name: np.asarray(cyl[name][index])
+                                 for name in ('start', 'axis',
+                                              'length', 'radius')})
+
+    index = None
+    if file_path:
+        index = read_grid_index(file_path, key)
+        if index is None or len(index['order']) != N:
+            index = build_grid_index(*spheres(slice(None)))
+            write_grid_index(index, file_path, key)
+
+    return select_spheres(spheres, N, region, index)
+
+
+# Indices of the leaves in the region, with an optional grid index of
+# the file as with the cylinders.
+def select_leaves(base, leaves, region, file_path=None, key='leaves'):
+
+    N = len(leaves['start'])
+
+    def spheres(index):
+        return leaf_spheres(base, {name: leaves[name][index]
+                                   for name in ('start', 'scale')})
+
+    index = None
+    if file_path:
+        index = read_grid_index(file_path, key)
+        if index is None or len(index['order']) != N:
+            index = build_grid_index(*spheres(slice(None)))
+            write_grid_index(index, file_path, key)
+
+    return select_spheres(spheres, N, region, index)
+
+
+# Order of points by the cubic grid cell of the given size, with the
+# points of each cell consecutive and in their original order. Returns
+# the order and the bounds of the runs of points in the same cell, with
+# the number of points as the last element.
+def cell_chunks(points, cell):
+
+    points = np.asarray(points, dtype=float).reshape(-1, 3)
+
+    if len(points) == 0:
+        return np.zeros(0, dtype=int), np.zeros(1, dtype=int)
+
+    # Cell of each point.
+    ijk = np.floor(points / cell).astype(np.int64)
+    _, key = np.unique(ijk, axis=0, return_inverse=True)
+    key = key.ravel()
+
+    order = np.argsort(key, kind='stable')
+
+    bounds = np.flatnonzero(np.diff(key[order])) + 1
+
+    return order, np.concatenate(([0], bounds, [len(points)]))
+
+
+# Spread the lowest 10 bits of integers so that there are two zero bits
+# between consecutive bits.
+def _spread_bits(x):
+
+    x = x.astype(np.uint32) & 0x3ff
+    x = (x | (x << 16)) & 0x30000ff
+    x = (x | (x << 8)) & 0x300f00f
+    x = (x | (x << 4)) & 0x30c30c3
+    x = (x | (x << 2)) & 0x9249249
+
+    return x
+
+
+# Morton (Z-order) codes of points, quantized to 10 bits per axis over
+# their bounding box. Points close to each other on the curve of the
+# codes are close in space.
+def morton_codes(points):
+
+    points = np.asarray(points, dtype=float).reshape(-1, 3)
+
+    if len(points) == 0:
+        return np.zeros(0, dtype=np.uint32)
+
+    pmin = points.min(axis=0)
+    extent = points.max(axis=0) - pmin
+    extent[extent <= 0] = 1.0
+
+    q = np.floor((points - pmin) / extent * 1023).astype(np.uint32)
+
+    return _spread_bits(q[:, 0]) | \
+        (_spread_bits(q[:, 1]) << 1) | \
+        (_spread_bits(q[:, 2]) << 2)
+
+
+# Reorder the items within each range along the Morton curve of their
+# points. The ranges are given by their bounds, and the order is an
+# array of item indices, which is modified and returned.
+def morton_order(points, order, bounds):
+
+    codes = morton_codes(points)
+
+    # Range of each position of the order.
+    label = np.repeat(np.arange(len(bounds) - 1), np.diff(bounds))
+
+    order[bounds[0]:bounds[-1]] = order[bounds[0]:bounds[-1]][
+        np.lexsort((codes[order[bounds[0]:bounds[-1]]], label))
+    ]
+
+    return order
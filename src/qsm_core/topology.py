@@ -0,0 +1,219 @@
+# This file is part of QSM-blender-addons.
+#
+# QSM-blender-addons is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# QSM-blender-addons is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with QSM-blender-addons.  If not, see <http://www.gnu.org/licenses/>.
+
+import hashlib
+import numpy as np
+
+
+# Select cylinders from a table with an index array or a slice. Parent
+# and extension indices are updated to the new order, and set to zero
+# if the referenced cylinder is not selected.
+def take_cylinders(cyl, index):
+
+    # Number of cylinders in the original table.
+    NCyl = len(cyl['radius'])
+
+    sub = {key: value[index] for key, value in cyl.items()}
+
+    if 'parent' in cyl or 'extension' in cyl:
+
+        # Original indices of the selected cylinders.
+        selected = np.arange(NCyl)[index]
+
+        # New 1-based index of each original cylinder, with zero
+        # for unselected cylinders.
+        new_index = np.zeros(NCyl + 1, dtype=int)
+        new_index[selected + 1] = np.arange(1, len(selected) + 1)
+
+        for key in ('parent', 'extension'):
+            if key in sub:
+                sub[key] = new_index[sub[key]]
+
+    return sub
+
+
+# Concatenate the cylinder tables of separate trees into a single
+# table, with the index of each table as the tree index.
+def concatenate_cylinders(tables):
+
+    # Number of cylinders in each table.
+    NCyl = [len(t['radius']) for t in tables]
+
+    # Index of the first cylinder of each table.
+    offsets = np.concatenate(([0], np.cumsum(NCyl)[:-1]))
+
+    # Columns present in all tables.
+    keys = set.intersection(*[set(t) for t in tables]) - {'tree'}
+
+    cyl = {}
+
+    for key in keys:
+
+        if key == 'extra':
+
+            # Pad additional attributes to the same length.
+            NExtra = max(t['extra'].shape[1] for t in tables)
+            cyl[key] = np.full((sum(NCyl), NExtra), np.nan)
+
+            for t, offset, n in zip(tables, offsets, NCyl):
+                cyl[key][offset:offset + n, :t['extra'].shape[1]] = t['extra']
+
+        elif key in ('parent', 'extension'):
+
+            # Offset non-zero indices.
+            cyl[key] = np.concatenate([
+                np.where(t[key] > 0, t[key] + offset, 0)
+                for t, offset in zip(tables, offsets)
+            ])
+
+        else:
+            cyl[key] = np.concatenate([np.asarray(t[key]) for t in tables])
+
+    cyl['tree'] = np.repeat(np.arange(len(tables)), NCyl)
+
+    return cyl
+
+
+# Order a cylinder table by the tree index column. Returns the ordered
+# table, and the tree index and cylinder range of each tree, which are
+# empty if the table has no cylinders.
+def partition_trees(cyl):
+
+    # Number of cylinders.
+    NCyl = len(cyl['radius'])
+
+    if NCyl == 0:
+        return cyl, []
+
+    # Stable order keeps the cylinders of each tree in file order.
+    order = np.argsort(cyl['tree'], kind='stable')
+
+    if np.any(order != np.arange(NCyl)):
+        cyl = take_cylinders(cyl, order)
+
+    # Ranges of cylinders of each tree.
+    bounds = np.flatnonzero(np.diff(cyl['tree'])) + 1
+    bounds = np.concatenate(([0], bounds, [NCyl]))
+
+    trees = [(int(cyl['tree'][c0]), int(c0), int(c1))
+             for c0, c1 in zip(bounds[:-1], bounds[1:])]
+
+    return cyl, trees
+
+
+# Select the cylinders of the given ranges [c0, c1) into a new table,
+# in the order of the ranges. Returns the table and the ranges in it.
+def take_ranges(cyl, ranges):
+
+    size = [c1 - c0 for c0, c1 in ranges]
+    start = np.concatenate(([0], np.cumsum(size))).astype(int)
+
+    index = np.concatenate([np.arange(c0, c1) for c0, c1 in ranges] +
+                           [np.zeros(0, dtype=int)])
+
+    return (take_cylinders(cyl, index),
+            [(int(c0), int(c1)) for c0, c1 in zip(start[:-1], start[1:])])
+
+
+# Ranges of cylinders [c0, c1) forming separate branches. A new branch
+# begins when the branch index differs from the previous row. Returns
+# the bounds of the ranges, with c1 as the last element.
+def branch_bounds(branch, c0=0, c1=None):
+
+    if c1 is None:
+        c1 = len(branch)
+
+    bounds = np.flatnonzero(np.diff(branch[c0:c1])) + 1
+
+    return np.concatenate(([0], bounds, [c1 - c0])) + c0
+
+
+# Materials used by the cylinders, and the index of the material of
+# each cylinder in the list, or -1 if no material. The stem material
+# is applied to the stem, or to all cylinders if the branch material
+# is not set. The branch material is applied to the other cylinders.
+# Materials can be any objects, with None for unset materials.
+def cylinder_materials(branch, matStem, matBranch):
+
+    materials = []
+    for mat in (matStem, matBranch):
+        if mat and mat not in materials:
+            materials.append(mat)
+
+    cylMat = np.full(len(branch), -1, dtype=np.int32)
+
+    if matStem:
+        if matBranch:
+            cylMat[branch == 1] = materials.index(matStem)
+        else:
+            cylMat[:] = materials.index(matStem)
+
+    if matBranch:
+        cylMat[branch != 1] = materials.index(matBranch)
+
+    return materials, cylMat
+
+
+# Columns that set the geometry and colour of the cylinders, hashed to
+# detect changed branches.
+HASH_COLUMNS = ('start', 'axis', 'length', 'radius', 'color', 'has_color')
+
+
+# Hash of the cylinders of each branch of a cylinder table, for finding
+# the branches that changed between two versions of a file. The hash
+# covers the geometry and colour of the cylinders in file order. Returns
+# a dict of the hex digest of each branch index.
+def branch_hashes(cyl):
+
+    # Cylinders of each branch in file order.
+    order = np.argsort(cyl['branch'], kind='stable')
+    branch = cyl['branch'][order]
+    bounds = branch_bounds(branch)
+
+    # Hashed values of each cylinder as a row of bytes.
+    rows = np.column_stack([
+        np.asarray(cyl[key], dtype=float).reshape(len(branch), -1)
+        for key in HASH_COLUMNS
+    ])[order]
+
+    return {int(branch[c0]):
+            hashlib.blake2b(rows[c0:c1].tobytes(), digest_size=16).hexdigest()
+            for c0, c1 in zip(bounds[:-1], bounds[1:])}
+
+
+# Map the cylinders of unchanged branches from an earlier version of a
+# cylinder table to the new table, given the branch index of each old
+# and new cylinder and the unchanged branch indices. The cylinders of a
+# branch are matched in order, so the branch should have the same
+# number of cylinders in both tables. Returns the new index of each old
+# cylinder, or -1 for the cylinders of other branches.
+def remap_cylinders(oldBranch, newBranch, kept):
+
+    oldBranch = np.asarray(oldBranch)
+    newBranch = np.asarray(newBranch)
+
+    # Cylinders of the kept branches, in branch and file order.
+    old = np.flatnonzero(np.isin(oldBranch, kept))
+    old = old[np.argsort(oldBranch[old], kind='stable')]
+    new = np.flatnonzero(np.isin(newBranch, kept))
+    new = new[np.argsort(newBranch[new], kind='stable')]
+
+    if len(old) != len(new):
+        raise ValueError('Kept branches have different cylinder counts.')
+
+    remap = np.full(len(oldBranch), -1, dtype=int)
+    remap[old] = new
+
+    return remap
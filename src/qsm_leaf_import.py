@@ -17,12 +17,74 @@ import bpy
 import sys
 import os
 import math
-import copy
-import bmesh
-from mathutils import Vector, Matrix
+import glob
+import time
 import datetime
+import json
+import cProfile
+import pstats
+import tempfile
+import importlib.util
 import numpy as np
-from random import uniform, seed
+from mathutils import Vector, Matrix
+
+# Blender-independent parsing and geometry functions, shared with the
+# addon for older Blender versions. The package is searched next to
+# this file, if it is not installed in the Blender modules directory.
+if importlib.util.find_spec('qsm_core') is None:
+    sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from qsm_core import (DEBUG_FRAMES,
+                      ImportProfiler,
+                      DebugHooks,
+                      detect_compression,
+                      check_file_support,
+                      is_binary_qsm_file,
+                      mat_file_version,
+                      read_qsm_file,
+                      read_appended_cylinders,
+                      write_cylinder_binary,
+                      take_cylinders,
+                      concatenate_cylinders,
+                      partition_trees,
+                      take_ranges,
+                      branch_bounds,
+                      cylinder_materials,
+                      branch_hashes,
+                      remap_cylinders,
+                      build_cylinder_geometry,
+                      splice_cylinder_geometry,
+                      bezier_cylinder_points,
+                      bezier_branch_points,
+                      bezier_resolution,
+                      UV_SHAPES,
+                      read_ext_obj,
+                      read_base_vertices,
+                      leaf_geometry,
+                      leaf_colors,
+                      growth_anim_limits,
+                      growth_shape_keys,
+                      normalize_uv,
+                      leaf_uv_coordinates,
+                      take_leaves,
+                      decimate_leaves,
+                      box_region,
+                      sphere_region,
+                      frustum_region,
+                      select_cylinders,
+                      select_leaves,
+                      is_grid_index,
+                      cylinder_spheres,
+                      cell_chunks,
+                      morton_order,
+                      tree_distances,
+                      lod_factors,
+                      lod_vertex_counts,
+                      lod_select,
+                      TableCache,
+                      content_key,
+                      source_key,
+                      GeometryCache)
 
 bl_info = {
     "name": "Tree model (QSM) and leaf model (L-QSM) importer",
@@ -71,6 +133,439 @@ def print_progress(NLine, iLine, d, last):
     return last
 
 
+# Run an import function with phase profiling, according to the
+# profiling settings. The report is stored as the custom property
+# 'ImportProfile' of the objects returned by the import function, and
+# optionally written to a JSON-file, with a cProfile report of the
+# function calls.
+def run_profiled(import_function, context, settings):
+
+    # With debug mode, memory is traced with the stack frames of the
+    # debug reports.
+    profiler = ImportProfiler(settings.profileMemory,
+                              DEBUG_FRAMES if settings.debugMode else 1)
+
+    # Flag: profile function calls. Only one cProfile profiler can be
+    # active at a time, so debug mode takes precedence.
+    fCalls = settings.profileCalls and not settings.debugMode
+
+    # Optional function call profiling.
+    if fCalls:
+        calls = cProfile.Profile()
+        calls.enable()
+
+    # Memory tracing is stopped also if the import fails.
+    try:
+        result, objects = import_function(context, profiler)
+    finally:
+        if fCalls:
+            calls.disable()
+        profiler.stop()
+
+    report = profiler.report()
+
+    for ob in objects:
+        ob['ImportProfile'] = report
+
+    # Display phase durations in the console.
+    for name, record in report['phases'].items():
+        print('%-12s %8.3f s wall %8.3f s cpu' %
+              (name, record['wall'], record['cpu']))
+
+    # Path to report file.
+    file_path = bpy.path.abspath(settings.profileFilePath)
+
+    if settings.profileFilePath:
+        with open(file_path, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if fCalls:
+
+        # Write function call statistics next to report file, or
+        # display the most expensive functions in the console.
+        if settings.profileFilePath:
+            calls.dump_stats(os.path.splitext(file_path)[0] + '.prof')
+        else:
+            stats = pstats.Stats(calls).sort_stats('cumulative')
+            stats.print_stats(20)
+
+    return result
+
+
+# Create a mesh from vertex coordinates, the vertex indices of the
+# loops, and the first loop and loop count of each polygon.
+def create_mesh(meshname, co, loop_vert, poly_start, poly_size):
+
+    # Create mesh and allocate elements.
+    me = bpy.data.meshes.new(meshname)
+    me.vertices.add(len(co))
+    me.loops.add(len(loop_vert))
+    me.polygons.add(len(poly_start))
+
+    # Set geometry.
+    me.vertices.foreach_set('co', np.ravel(co).astype(np.float32))
+    me.loops.foreach_set('vertex_index', loop_vert)
+    me.polygons.foreach_set('loop_start', poly_start)
+    me.polygons.foreach_set('loop_total', poly_size)
+
+    # Generate edges and update mesh data.
+    me.update(calc_edges=True)
+
+    return me
+
+
+# Store the hash of each branch of the cylinders of a mesh object, and
+# the branch of each cylinder in file order, for updating the object in
+# place when the input file changes.
+def store_branch_hashes(ob, cyl):
+
+    cyl = take_cylinders(cyl, np.argsort(cyl['id']))
+
+    ob["QsmBranchHash"] = {str(b): h for b, h in branch_hashes(cyl).items()}
+    ob["QsmCylinderBranch"] = cyl['branch'].astype(int).tolist()
+
+
+# Settings that do not change the imported data, excluded from the
+# import keys.
+QSM_KEY_EXCLUDE = {'rna_type', 'qsm_file_path', 'qsmWatchFile',
+                   'qsmReuseData'}
+LEAF_KEY_EXCLUDE = {'rna_type', 'leaf_model_file_path', 'leafWatchFile',
+                    'leafReuseData'}
+
+
+# Values of the import settings except the excluded ones, as a dict of
+# hashable values by the property name.
+def settings_values(settings, exclude):
+
+    values = {}
+
+    for prop in settings.bl_rna.properties:
+
+        if prop.identifier in exclude:
+            continue
+
+        value = getattr(settings, prop.identifier)
+
+        # Enum flags are sets, and vectors are property arrays.
+        if isinstance(value, set):
+            value = tuple(sorted(value))
+        elif hasattr(value, '__len__') and not isinstance(value, str):
+            value = tuple(value)
+
+        values[prop.identifier] = value
+
+    return values
+
+
+# Key of an import from the contents of the input files, the values of
+# the import settings except the excluded ones, and extra values.
+def import_key(file_paths, settings, exclude, *extra):
+    return content_key(file_paths, settings_values(settings, exclude),
+                       *extra)
+
+
+# Objects of an earlier import with the given key, stored in the custom
+# property prop with the index of the object in the import and the
+# number of objects. Returns the objects in import order, or None if
+# some of them no longer exist. Empties whose children have been
+# removed are not used.
+def find_instances(prop, key):
+
+    parts = {}
+    NPart = 0
+
+    for ob in bpy.data.objects:
+
+        info = ob.get(prop)
+
+        if info is None or info['key'] != key or ob.users == 0:
+            continue
+
+        if ob.type == 'EMPTY' and not ob.children:
+            continue
+
+        parts.setdefault(info['index'], ob)
+        NPart = info['count']
+
+    if NPart == 0 or len(parts) != NPart:
+        return None
+
+    return [parts[i] for i in range(NPart)]
+
+
+# Create linked duplicates of objects and their descendants, sharing
+# their mesh and curve data. The copies of the given objects are
+# parented to the given parent, and all copies are linked to the
+# collection. Returns the copies of the given objects.
+def duplicate_linked(objects, parent, collection):
+
+    # Copy of each object by the name of the original.
+    copies = {}
+
+    def duplicate(ob, parent):
+
+        new = ob.copy()
+        new.parent = parent
+        collection.objects.link(new)
+
+        copies[ob.name] = new
+
+        for child in ob.children:
+            duplicate(child, new)
+
+    for ob in objects:
+        duplicate(ob, parent)
+
+    # Copied curves refer to the copies of their baked meshes.
+    for new in copies.values():
+        if new.get("BakedMesh") in copies:
+            new["BakedMesh"] = copies[new["BakedMesh"]].name
+
+    return [copies[ob.name] for ob in objects]
+
+
+# Write a tree with its parent empty as a collection into a library
+# blend file in the directory, and replace it with an instance of the
+# collection linked from the library. Trees with an import key share
+# the library of identical trees, which is written only once. Other
+# trees are written to a new file, so that existing libraries linked by
+# other files are never overwritten. Returns the instance empty.
+def link_tree_library(context, TreeParent, directory):
+
+    name = TreeParent.name
+    info = TreeParent.get("QsmInstance")
+
+    if info is None:
+        base = os.path.join(directory, bpy.path.clean_name(name))
+        file_path = base + '.blend'
+
+        # First unused numbered file name.
+        i = 1
+        while os.path.exists(file_path):
+            file_path = base + '_' + str(i).zfill(3) + '.blend'
+            i += 1
+    else:
+        file_path = os.path.join(directory,
+                                 bpy.path.clean_name(info['name']) + '_' +
+                                 info['key'][:16] + '.blend')
+
+    # Placement of the tree, which is moved to the instance.
+    matrix = TreeParent.matrix_world.copy()
+    collections = list(TreeParent.users_collection) or [context.collection]
+
+    # Parent and its descendants.
+    objects = [TreeParent]
+    for ob in objects:
+        objects.extend(ob.children)
+
+    if info is None or not os.path.isfile(file_path):
+
+        collection = bpy.data.collections.new(name)
+        for ob in objects:
+            collection.objects.link(ob)
+
+        # The tree is stored at the origin of the library.
+        TreeParent.matrix_world = Matrix.Identity(4)
+
+        bpy.data.libraries.write(file_path, {collection},
+                                 path_remap='RELATIVE_ALL', compress=True)
+
+        bpy.data.collections.remove(collection)
+
+    remove_objects([TreeParent])
+
+    # Link the collection of the library.
+    with bpy.data.libraries.load(file_path, link=True,
+                                 relative=True) as (data_from, data_to):
+        data_to.collections = data_from.collections[:1]
+
+    # Empty instancing the collection at the placement of the tree.
+    instance = bpy.data.objects.new(name, None)
+    instance.instance_type = 'COLLECTION'
+    instance.instance_collection = data_to.collections[0]
+    instance.matrix_world = matrix
+    instance["QsmLibrary"] = file_path
+
+    for collection in collections:
+        collection.objects.link(instance)
+
+    return instance
+
+
+# Move trees into library files with the library settings, reporting
+# errors with the operator. Returns the operator result and the
+# instance empties.
+def move_to_libraries(operator, context, trees):
+
+    settings = context.scene.librarySettings
+
+    if not settings.libraryDir:
+        operator.report({'ERROR_INVALID_INPUT'},
+                        'Missing library directory.')
+        print('Cancelled.')
+        return {'CANCELLED'}, []
+
+    if settings.libraryDir.startswith('//') and not bpy.data.filepath:
+        operator.report({'ERROR_INVALID_INPUT'},
+                        'Save the blend file before using a relative '
+                        'library directory.')
+        print('Cancelled.')
+        return {'CANCELLED'}, []
+
+    directory = bpy.path.abspath(settings.libraryDir)
+    os.makedirs(directory, exist_ok=True)
+
+    instances = []
+
+    for TreeParent in trees:
+        print('Moving', TreeParent.name, 'to library.')
+        instances.append(link_tree_library(context, TreeParent, directory))
+
+    for ob in instances:
+        ob.select_set(True)
+
+    return {'FINISHED'}, instances
+
+
+# Bake the evaluated geometry of a curve object into a mesh object. The
+# mesh object is created next to the curve object on the first call, and
+# its mesh data is replaced on later calls. The curve object is hidden,
+# so that its bevel geometry is evaluated only when it is shown for
+# editing, while the viewport and renders use the baked mesh.
+def bake_curve_mesh(context, ob):
+
+    # Convert the evaluated curve into new mesh data.
+    depsgraph = context.evaluated_depsgraph_get()
+    me = bpy.data.meshes.new_from_object(ob.evaluated_get(depsgraph))
+    me.name = ob.data.name + "_mesh"
+
+    # Mesh object of earlier bakes.
+    mesh_ob = bpy.data.objects.get(ob.get("BakedMesh", ""))
+
+    if mesh_ob is None or mesh_ob.type != 'MESH':
+
+        # Create object with the same parent and collections.
+        mesh_ob = bpy.data.objects.new(ob.name + "_mesh", me)
+        mesh_ob.parent = ob.parent
+
+        for collection in ob.users_collection:
+            collection.objects.link(mesh_ob)
+
+        # Store the name of the mesh object on the curve object.
+        ob["BakedMesh"] = mesh_ob.name
+    else:
+
+        # Replace the old mesh data.
+        old = mesh_ob.data
+        mesh_ob.data = me
+
+        if old.users == 0:
+            bpy.data.meshes.remove(old)
+
+    mesh_ob.matrix_local = ob.matrix_local.copy()
+
+    # Hide the curve object.
+    ob.hide_viewport = True
+    ob.hide_render = True
+
+    return mesh_ob
+
+
+# Tables read from the input files in this session, shared by the
+# importers.
+table_cache = TableCache()
+
+
+# Read a table from a file with the reader function and arguments,
+# through the table cache if enabled in the cache settings.
+def read_cached(context, function, file_path, *args):
+
+    settings = context.scene.cacheSettings
+
+    if not settings.cacheEnabled:
+        return function(file_path, *args)
+
+    table_cache.capacity = settings.cacheSize * 2**20
+    table_cache.evict()
+
+    return table_cache.read(function, file_path, *args)
+
+
+# Persistent cache of generated geometry from the cache settings. The
+# default directory is in the temporary directory of the system, which
+# is kept between sessions unlike the Blender temporary directory.
+def geometry_cache(context):
+
+    settings = context.scene.cacheSettings
+
+    if settings.geometryCacheDir:
+        directory = bpy.path.abspath(settings.geometryCacheDir)
+    else:
+        directory = os.path.join(tempfile.gettempdir(), 'qsm_geometry_cache')
+
+    return GeometryCache(directory, settings.geometryCacheSize * 2**30)
+
+
+# Generate geometry with the function and arguments, through the
+# persistent geometry cache if enabled in the cache settings. The source
+# of the arguments can be given as the input files and the values that
+# set the arguments, to key the geometry without hashing the arguments.
+def build_cached(context, function, *args, source=None):
+
+    if not context.scene.cacheSettings.geometryCacheEnabled:
+        return function(*args)
+
+    key = None
+    if source is not None:
+        key = source_key(function, *source)
+
+    return geometry_cache(context).build(function, *args, key=key)
+
+
+# Region of interest of the imports from the region settings, or None
+# if everything is imported. Box and sphere regions are given by the
+# bounding box of an object, and frustum regions by a camera. Returns
+# the region and an error message, which is empty on success.
+def region_of_interest(context):
+
+    settings = context.scene.regionSettings
+
+    if settings.regionMode == 'none':
+        return None, ''
+
+    # Object defining the region.
+    ob = bpy.data.objects.get(settings.regionObject)
+
+    if not ob:
+        return None, 'Missing region object.'
+
+    if settings.regionMode == 'camera':
+
+        if ob.type != 'CAMERA':
+            return None, 'Region object has to be a camera.'
+
+        cam = ob.data
+
+        # View frame corners in world coordinates.
+        corners = [ob.matrix_world @ v
+                   for v in cam.view_frame(scene=context.scene)]
+
+        return frustum_region(ob.matrix_world.translation, corners,
+                              cam.clip_start, cam.clip_end,
+                              cam.type == 'ORTHO'), ''
+
+    # Bounding box corners of the object in world coordinates.
+    corners = np.array([ob.matrix_world @ Vector(c) for c in ob.bound_box])
+    bmin = corners.min(axis=0)
+    bmax = corners.max(axis=0)
+
+    if settings.regionMode == 'box':
+        return box_region(bmin, bmax), ''
+
+    return sphere_region(0.5 * (bmin + bmax),
+                         0.5 * np.linalg.norm(bmax - bmin)), ''
+
+
 class QSMPanel(bpy.types.Panel):
     """Creates a Panel in the scene context of the properties editor"""
 
@@ -99,6 +594,14 @@ class QSMPanel(bpy.types.Panel):
         row = layout.row()
         row.prop(settings, "qsm_file_path")
 
+        # Reload on file changes.
+        row = layout.row()
+        row.prop(settings, "qsmWatchFile")
+
+        # Reuse of identical imports.
+        row = layout.row()
+        row.prop(settings, "qsmReuseData")
+
         # Stem material select.
         row = layout.row()
         row.prop_search(settings, "qsmStemMaterial", data, "materials")
@@ -109,10 +612,36 @@ class QSMPanel(bpy.types.Panel):
 
         layout.separator()
 
+        # Tree index column.
+        row = layout.row()
+        row.prop(settings, "qsmTreeIdColumn")
+
         # Branch separation.
         row = layout.row()
         row.prop(settings, "qsmSeparation")
 
+        # Distance-based level of detail.
+        row = layout.row()
+        row.prop(settings, "qsmLod")
+
+        if settings.qsmLod:
+
+            # Camera selector.
+            row = layout.row()
+            row.prop_search(settings, "qsmLodCamera", scene, "objects")
+
+            # Distance range.
+            row = layout.row(align=True)
+            row.prop(settings, "qsmLodNear", text='Near')
+            row.prop(settings, "qsmLodFar", text='Far')
+
+            # Radius cutoff and far tree mode.
+            row = layout.row()
+            row.prop(settings, "qsmLodRadiusCutoff")
+
+            row = layout.row()
+            row.prop(settings, "qsmLodFarMode")
+
         # layout.separator()
 
         # UI elements for mesh objects.
@@ -135,6 +664,23 @@ class QSMPanel(bpy.types.Panel):
             row.prop(settings, "qsmVertexCountMin", text='Min')
             row.prop(settings, "qsmVertexCountMax", text='Max')
 
+            # Spatial chunks.
+            if not settings.qsmSeparation:
+                row = layout.row()
+                row.prop(settings, "qsmChunks")
+
+                if settings.qsmChunks:
+                    row = layout.row()
+                    row.prop(settings, "qsmChunkSize")
+
+            # Morton order.
+            row = layout.row()
+            row.prop(settings, "qsmMortonOrder")
+
+            # Branch hashes for updates.
+            row = layout.row()
+            row.prop(settings, "qsmUpdateHashes")
+
         # UI elements for bezier objects.
         elif settings.qsmImportMode == 'bezier_cylinder' or \
              settings.qsmImportMode == 'bezier_branch':
@@ -154,13 +700,49 @@ class QSMPanel(bpy.types.Panel):
                     "objects"
                 )
 
+            # Mesh baking of the curves.
+            row = layout.row()
+            row.prop(settings, "qsmBakeCurveMesh")
+
+            # Adaptive resolution of branch-level curves.
+            if settings.qsmImportMode == 'bezier_branch':
+                row = layout.row()
+                row.prop(settings, "qsmAdaptiveResolution")
+
+                if settings.qsmAdaptiveResolution:
+                    row = layout.row()
+                    row.prop(settings, "qsmResolutionTolerance")
+
         layout.separator()
 
-        # Colormap update button.
+        # Colormap and geometry update buttons.
         if settings.qsmImportMode == 'mesh_cylinder':
             row = layout.row()
             row.operator("qsm.update_colourmap")
 
+            row = layout.row()
+            row.operator("qsm.update_qsm")
+
+        # Curve baking button.
+        if settings.qsmImportMode != 'mesh_cylinder':
+            row = layout.row()
+            row.operator("qsm.bake_curve_mesh")
+
+        # Regenerate button.
+        row = layout.row()
+        row.operator("qsm.regenerate")
+
+        # Binary conversion button.
+        row = layout.row()
+        row.operator("qsm.convert_binary")
+
+        # Follow button, which stops following while a file is followed.
+        row = layout.row()
+        if bpy.app.timers.is_registered(follow_files):
+            row.operator("qsm.follow_file", text="Stop following")
+        else:
+            row.operator("qsm.follow_file")
+
         # Import buttons.
         row = layout.row()
         row.operator("qsm.qsm_import")
@@ -194,6 +776,14 @@ class LeafModelPanel(bpy.types.Panel):
         row = layout.row()
         row.prop(settings, "leaf_model_file_path")
 
+        # Reload on file changes.
+        row = layout.row()
+        row.prop(settings, "leafWatchFile")
+
+        # Reuse of identical imports.
+        row = layout.row()
+        row.prop(settings, "leafReuseData")
+
         # Bevel object selector.
         row = layout.row()
         row.prop_search(settings, "leafModelMaterial", data, "materials")
@@ -236,6 +826,37 @@ class LeafModelPanel(bpy.types.Panel):
                     row = layout.row()
                     row.prop(settings, "growthSeed")
 
+            # Boolean: leaf decimation.
+            row = layout.row()
+            row.prop(settings, "leafDecimation")
+
+            if settings.leafDecimation:
+
+                row = layout.row()
+                row.prop(settings, "leafDecimationMode", expand=True)
+
+                row = layout.row()
+                row.prop(settings, "leafDecimationRatio")
+
+                if settings.leafDecimationMode == 'voxel':
+                    row = layout.row()
+                    row.prop(settings, "leafDecimationCell")
+
+                row = layout.row()
+                row.prop(settings, "leafDecimationSeed")
+
+            # Boolean: spatial chunks.
+            row = layout.row()
+            row.prop(settings, "leafChunks")
+
+            if settings.leafChunks:
+                row = layout.row()
+                row.prop(settings, "leafChunkSize")
+
+            # Boolean: Morton order.
+            row = layout.row()
+            row.prop(settings, "leafMortonOrder")
+
         # Boolean: generate UVs.
         row = layout.row()
         row.prop(settings, "leafUvGeneration")
@@ -265,546 +886,502 @@ class LeafModelPanel(bpy.types.Panel):
         row.operator("leaf.import_leaves")
 
 
-class ImportLeafModel(bpy.types.Operator):
-    """Import leaves as planes"""
+class ImportProfilePanel(bpy.types.Panel):
+    """Creates a Panel in the scene context of the properties editor"""
 
-    bl_idname = "leaf.import_leaves"
-    bl_label = "Import"
+    bl_label = "Import profiling"
+    bl_idname = "SCENE_PT_qsm_profile"
+    bl_space_type = 'VIEW_3D'
+    bl_region_type = 'TOOLS' if bpy.app.version < (2, 80) else 'UI'
+    bl_category = 'QSM'
+    bl_context = "objectmode"
+    bl_options = {'DEFAULT_CLOSED'}
 
-    def growth_anim_limits(self, NGroup, intMin, intMax, seedInt):
-    # Compute relative start and end times for animations with 
-    # random offsets.
+    # Layout of the profiling panel.
+    def draw(self, context):
 
-        # Initialize seed, for reproductability.
-        seed(seedInt)
+        layout = self.layout
+        settings = context.scene.importProfileSettings
 
-        # Minimum generated time.
-        minTime = 0
-        # Maximum generated time.
-        maxTime = 0
+        # Boolean: record memory use.
+        row = layout.row()
+        row.prop(settings, "profileMemory")
 
-        # List to store tuples of start and end times.
-        times = []
+        # Boolean: profile function calls.
+        row = layout.row()
+        row.prop(settings, "profileCalls")
 
-        # Generate N pairs of times.
-        for iGroup in range(0, NGroup):
+        # Report file.
+        row = layout.row()
+        row.prop(settings, "profileFilePath")
 
-            # Initial start times.
-            starttime = iGroup/NGroup
+        layout.separator()
 
-            # If not the first group, compute random offset.
-            if iGroup > 0:
-                offset = uniform(intMin, intMax)
+        # Boolean: debug mode.
+        row = layout.row()
+        row.prop(settings, "debugMode")
 
-                # Add offset to start time.
-                starttime += offset/100
+        # Debug report file.
+        if settings.debugMode:
+            row = layout.row()
+            row.prop(settings, "debugFilePath")
 
-            # Start time is always the default.
-            endtime = (iGroup+1.0)/NGroup
 
-            # Update extreme values.
-            minTime = min(minTime, starttime, endtime)
-            maxTime = max(maxTime, starttime, endtime)
+class RegionPanel(bpy.types.Panel):
+    """Creates a Panel in the scene context of the properties editor"""
 
-            # Add new start-end time pair into list.
-            times.append([starttime, endtime])
+    bl_label = "Region of interest"
+    bl_idname = "SCENE_PT_qsm_region"
+    bl_space_type = 'VIEW_3D'
+    bl_region_type = 'TOOLS' if bpy.app.version < (2, 80) else 'UI'
+    bl_category = 'QSM'
+    bl_context = "objectmode"
+    bl_options = {'DEFAULT_CLOSED'}
 
-        # Compute full animation length from extreme values for scaling.
-        fullTime = maxTime - minTime
+    # Layout of the region panel.
+    def draw(self, context):
 
-        # Scale all values onto interval [0, 1].
-        for i, time in enumerate(times):
-            for j, t in enumerate(time):
-                times[i][j] = (t - minTime)/fullTime
+        layout = self.layout
+        scene = context.scene
+        settings = scene.regionSettings
 
-        # Return a dict with the generated times as a field.
-        return {'times': times}
+        # Region type as a button selector.
+        row = layout.row()
+        row.prop(settings, "regionMode", expand=True)
 
-    def import_obj(self, file_path):
+        if settings.regionMode != 'none':
 
-        # Use built-in OBJ-importer with fixed parameters.
-        bpy.ops.import_scene.obj(
-            filepath=file_path,
-            axis_forward='Y',
-            axis_up='Z',
-            filter_glob="*.obj;*.mtl",
-            use_edges=True,
-            use_smooth_groups=True,
-            use_split_objects=False,
-            use_split_groups=False,
-            use_groups_as_vgroups=False,
-            use_image_search=False,
-            split_mode='OFF',
-            global_clight_size=0
-        )
+            # Region object selector.
+            row = layout.row()
+            row.prop_search(settings, "regionObject", scene, "objects")
 
-        # Get imported objects, assumed to be selected.
-        return bpy.context.selected_objects[:]
+            # Boolean: use spatial index.
+            row = layout.row()
+            row.prop(settings, "regionIndex")
 
-    def import_ext_obj(self, file_path, fShapeKeyGeneration,
-                       fVertexColor, color_mode, animParam):
 
-        # Deselect all just to be safe.
-        bpy.ops.object.select_all(action='DESELECT')
+class CachePanel(bpy.types.Panel):
+    """Creates a Panel in the scene context of the properties editor"""
 
-        # Array of base vertices.
-        base_vert = []
-        # Array of base faces.
-        base_face = []
-
-        # Flag: vertex addition completed.
-        fVertDone = False
-        # Flag: face addition completed.
-        fFaceDone = False
-        # Flag: read vertex colors from file.
-        fFromFile = False
-        # Flag: randomize vertex colors.
-        fRandomColor = False
-        # Flag: print progress.
-        fPrintProgress = False
-
-        # Number of added base vertices.
-        NVert = 0
-        # Number of added face vertices.
-        NFace = 0
-        # Number of added leaves.
-        NLeaf = 0
-        # Number of missing color data.
-        NMissingColor = 0
-
-        # Resulting object.
-        ob = None
+    bl_label = "Input file cache"
+    bl_idname = "SCENE_PT_qsm_cache"
+    bl_space_type = 'VIEW_3D'
+    bl_region_type = 'TOOLS' if bpy.app.version < (2, 80) else 'UI'
+    bl_category = 'QSM'
+    bl_context = "objectmode"
+    bl_options = {'DEFAULT_CLOSED'}
 
-        # Name of shape key for growth animation.
-        GrowthName = 'ReverseGrowth'
+    # Layout of the cache panel.
+    def draw(self, context):
 
-        # Set boolean flags for simplicity.
-        if color_mode == 'from_file':
-            fFromFile = True
-        elif color_mode == 'random':
-            fRandomColor = True
-        else:
-            # Otherwise, ensure that vertex colors are not
-            # added if color mode is unknown.
-            fVertexColor = False
+        layout = self.layout
+        settings = context.scene.cacheSettings
 
-        if fShapeKeyGeneration:
+        # Boolean: cache tables.
+        row = layout.row()
+        row.prop(settings, "cacheEnabled")
+
+        if settings.cacheEnabled:
 
-            # Store twig start points.
-            growthOrigin = []
-            # Store index of twig start point for each vertex.
-            IGrowthOrigin = []
+            # Memory limit.
+            row = layout.row()
+            row.prop(settings, "cacheSize")
 
-        with open(file_path) as lines:
+            # Current use.
+            row = layout.row()
+            row.label(text="%d file(s), %.1f MB" %
+                      (len(table_cache.tables), table_cache.nbytes / 2**20))
 
-            # Number of lines in input file.
-            NLine = sum(1 for line in lines)
+        # Clear button.
+        row = layout.row()
+        row.operator("qsm.clear_cache")
 
-            # Last displayed percentage.
-            PLast = 0
+        # Boolean: cache generated geometry.
+        row = layout.row()
+        row.prop(settings, "geometryCacheEnabled")
 
-            # Return to file beginning for second iteration.
-            lines.seek(0)
+        if settings.geometryCacheEnabled:
 
-            # Iterate over rows in input file.
-            for iLine, line in enumerate(lines):
+            # Cache directory.
+            row = layout.row()
+            row.prop(settings, "geometryCacheDir")
 
-                # Split row into parameters.
-                params = line.split(' ', 1)
+            # Disk space limit.
+            row = layout.row()
+            row.prop(settings, "geometryCacheSize")
 
-                # Ignore rows with too few parameters.
-                if len(params) < 2:
-                    continue
+        # Clear button.
+        row = layout.row()
+        row.operator("qsm.clear_geometry_cache")
 
-                if fPrintProgress:
-                    # Print progress in the console every nth row.
-                    PLast = print_progress(NLine, iLine, 10, PLast)
 
-                # Type of line.
+class LibraryPanel(bpy.types.Panel):
+    """Creates a Panel in the scene context of the properties editor"""
 
-                # Base vertex.
-                if params[0] == 'v':
+    bl_label = "Tree libraries"
+    bl_idname = "SCENE_PT_qsm_library"
+    bl_space_type = 'VIEW_3D'
+    bl_region_type = 'TOOLS' if bpy.app.version < (2, 80) else 'UI'
+    bl_category = 'QSM'
+    bl_context = "objectmode"
+    bl_options = {'DEFAULT_CLOSED'}
 
-                    # If vertex adding has been closed,
-                    # ignore further vertex lines.
-                    if fVertDone:
-                        continue
+    # Layout of the library panel.
+    def draw(self, context):
 
-                    # Get vertex coordinates.
-                    co = params[1].split()
+        layout = self.layout
+        settings = context.scene.librarySettings
 
-                    # Should have three coordinates.
-                    if len(co) != 3:
-                        continue
+        # Library directory.
+        row = layout.row()
+        row.prop(settings, "libraryDir")
 
-                    # Append new base vertex.
-                    base_vert.append(np.array([float(co[0]),
-                                               float(co[1]),
-                                               float(co[2])]))
+        # Boolean: move imported trees to libraries.
+        row = layout.row()
+        row.prop(settings, "libraryOnImport")
 
-                    # Increase base vertex count.
-                    NVert += 1
+        # Move button.
+        row = layout.row()
+        row.operator("qsm.move_to_library")
 
-                # Base face.
-                elif params[0] == 'f':
 
-                    # If face adding has been closed,
-                    # ignore further face lines.
-                    if fFaceDone:
-                        continue
+class ImportLeafModel(bpy.types.Operator):
+    """Import leaves as planes"""
 
-                    # Close vertex adding.
-                    if not fVertDone:
-                        fVertDone = True
+    bl_idname = "leaf.import_leaves"
+    bl_label = "Import"
 
-                    # Indices of face vertices.
-                    ind = params[1].split()
+    def import_obj(self, file_path):
 
-                    # Faces have to have at least three vertices.
-                    if len(ind) < 3:
-                        continue
+        # Use built-in OBJ-importer with fixed parameters.
+        bpy.ops.import_scene.obj(
+            filepath=file_path,
+            axis_forward='Y',
+            axis_up='Z',
+            filter_glob="*.obj;*.mtl",
+            use_edges=True,
+            use_smooth_groups=True,
+            use_split_objects=False,
+            use_split_groups=False,
+            use_groups_as_vgroups=False,
+            use_image_search=False,
+            split_mode='OFF',
+            global_clight_size=0
+        )
 
-                    # Append new face.
-                    base_face.append(np.array([int(x) - 1 for x in ind]))
+        # Get imported objects, assumed to be selected.
+        return bpy.context.selected_objects[:]
 
-                    # Increase base face count.
-                    NFace += 1
+    # Create a leaf object from the given leaves.
+    def createLeafObject(self, name, base, leaves, fShapeKeyGeneration,
+                         fVertexColor, color_mode, animParam):
 
-                # Leaf transformation parameters.
-                elif params[0] == 'L':
+        # Name of shape key for growth animation.
+        GrowthName = 'ReverseGrowth'
 
-                    # Close vertex and face adding.
-                    if not fFaceDone:
-                        fFaceDone = True
-                        fVertDone = True
+        # Number of leaves.
+        NLeaf = len(leaves['start'])
 
-                    # If no geometry, unable to create leaf.
-                    if NVert == 0 or NFace == 0:
-                        self.report({'ERROR_INVALID_INPUT'},
-                                    'Input file missing vertices or faces.')
-                        break
+        # Compute geometry of all leaves.
+        self.profiler.phase('geometry')
+        geom = build_cached(bpy.context, leaf_geometry, base,
+                            {key: leaves[key] for key in
+                             ('start', 'direction', 'normal', 'scale')})
 
-                    # Transformation configuration.
-                    config = params[1].split()
+        # Create mesh and object.
+        self.profiler.phase('mesh write')
+        me = create_mesh(name, geom['co'], geom['loop_vert'],
+                         geom['poly_start'], geom['poly_size'])
+        ob = bpy.data.objects.new(name, me)
 
-                    # Line should have at least 15 parameters.
-                    if len(config) < 15:
-                        print('L line has too few parameters:',len(config))
-                        continue
+        # Assign the colour of each leaf to its loops.
+        if fVertexColor:
 
-                    # Increase leaf count.
-                    NLeaf += 1
+            NMissingColor = np.count_nonzero(~leaves['has_color'])
 
-                    # Initialize object and mesh data, and optionally
-                    # shape key and color map layers.
-                    if NLeaf == 1:
+            if color_mode == 'from_file' and NMissingColor > 0:
+                print('Color data missing from %d lines, replaced with default color' % NMissingColor)
 
-                        # Create mesh.
-                        me = bpy.data.meshes.new('LeafModel')
+            # Add alpha channel value.
+            colors = np.ones((NLeaf, 4), dtype=np.float32)
+            colors[:, :3] = leaf_colors(leaves, color_mode)
 
-                        # Create object.
-                        ob = bpy.data.objects.new('LeafModel', me)
+            layer = me.vertex_colors.new(name="Color")
+            layer.data.foreach_set('color',
+                                   colors[geom['loop_leaf']].ravel())
 
-                        # Bmesh.
-                        bm = bmesh.new()
+        if fShapeKeyGeneration:
 
-                        if fVertexColor:
-                            # Create new layer for colourmap.
-                            cl = bm.loops.layers.color.new("Color")
+            # Add default shape key.
+            self.profiler.phase('shape keys')
+            ob.shape_key_add(name='Basis')
 
-                    if fShapeKeyGeneration:
+            # List of extra shape keys.
+            ShapeKeys = []
 
-                        # Start point of twig used for growth animation.
-                        twig_start = tuple([float(x) for x in config[0:3]])
+            # Number of shape keys is set by user.
+            NGroup = len(animParam['times'])
 
-                    # Leaf parameters.
-                    leaf_start  = np.array([float(x) for x in config[3:6]])
-                    leaf_dir    = np.array([float(x) for x in config[6:9]])
-                    leaf_normal = np.array([float(x) for x in config[9:12]])
-                    leaf_scale  = np.array([float(x) for x in config[12:15]])
+            # Generate new shape keys, where the leaves of the group are
+            # moved to the start points of their twigs.
+            for iGroup, co in enumerate(growth_shape_keys(geom['co'],
+                                                          geom['vert_leaf'],
+                                                          leaves['twig_start'],
+                                                          NGroup,
+                                                          leaves['id'])):
 
-                    # Get vertex color value if necessary.
-                    if fVertexColor:
-                        # Additional color elements should be present on line.
-                        if fFromFile:
+                if NGroup == 1:
+                    SetName = GrowthName
+                else:
+                    SetName = GrowthName + '_Set_' + str(iGroup + 1)
+
+                # Use object-level method for adding new shape key layer.
+                sk = ob.shape_key_add(name=SetName)
+                sk.data.foreach_set('co', co.astype(np.float32).ravel())
+
+                ShapeKeys.append(sk)
+
+            # Name of custom property that drives all shape keys.
+            DriverName = 'Growth'
+
+            # Create custom property and set value.
+            me[DriverName] = 1.0
+
+            # Get custom property as variable.
+            rna = me.get('_RNA_UI')
+            if rna is None:
+                me['_RNA_UI'] = {}
+                rna = me['_RNA_UI']
+
+            # Set other custom property values.
+            rna[DriverName] = {
+                "description":"Growth progress driver. Controls shape key layers.",
+                "default": 1.0,
+                "min": 0.0,
+                "max": 1.0,
+                "soft_min": 0.0,
+                "soft_max": 1.0
+            }
+
+            # Modify each shape key.
+            for iGroup in range(NGroup):
+
+                # Relative start time of the growth animation
+                # in the interval [0,1].
+                starttime = animParam['times'][iGroup][0]
+
+                # Relative end time of the growth animation.
+                # Same interval.
+                endtime = animParam['times'][iGroup][1]
+
+                # If for some reason the start time is larger 
+                # than the end time, f-curve handles should be 
+                # reversed.
+                if starttime < endtime:
+                    fac = 1.0
+                else:
+                    fac = -1.0
 
-                            # Check that vertex color values are present 
-                            # in file. If not increse missing color count.
-                            if len(config) < 18:
+                # Relative length of the growth animation for this
+                # shape key.
+                timelen = fac*(endtime - starttime)
 
-                                NMissingColor += 1
-                                # Set color as default (black).
-                                vert_color = [0.0, 0.0, 0.0]
+                # Current shape key.
+                sk = ShapeKeys[iGroup]
 
-                            else:
+                # Add driver to shape key value.
+                curve = sk.driver_add("value")
 
-                                vert_color = [float(x) for x in config[15:18]]
+                # Add two points to the curve controlling the
+                # driver.
+                curve.keyframe_points.add(2)
 
-                        # Generate random 3-element array from
-                        # uniform distribution.
-                        elif fRandomColor:
-                            vert_color = [uniform(0, 1) for x in "rgb"]
+                # Set first point at the shape key start time
+                # and the value to zero, i.e., growth not started.
+                curve.keyframe_points[0].co = (starttime, 0.0)
 
-                        # Add alpha channel value.
-                        vert_color.append(1.0)
+                # Set second point at shape key end time
+                # and the value to one, i.e., growth completed.
+                curve.keyframe_points[1].co = (endtime, 1.0)
 
-                    # Scaling.
-                    vert = np.multiply(base_vert, leaf_scale)
 
-                    # Coordinate change matrix.
-                    E = np.array([np.cross(leaf_normal, leaf_dir),
-                                  leaf_dir,
-                                  leaf_normal
-                                  ])
+                for p in curve.keyframe_points:
+                    # Set vector handles for curve points.
+                    # Handle length is 30 percent of the relative
+                    # growth length. Both handles are horizontal.
+                    p.handle_left = p.co \
+                        - Vector((fac*0.3*timelen, 0.0))
+                    p.handle_right = p.co \
+                        + Vector((fac*0.3*timelen, 0.0))
 
-                    # Rotation.
-                    vert = np.dot(vert, E)
+                    # Set point interpolation to Bezier for smooth
+                    # transitions.
+                    p.interpolation = 'BEZIER'
 
-                    # Transition.
-                    vert += leaf_start
+                # Remove default modifiers.
+                if curve.modifiers:
+                    for iMod in range(len(curve.modifiers)):
+                        curve.modifiers.remove(curve.modifiers[iMod])
 
-                    # Added vertices.
-                    bm_vert = []
+                # Driver object.
+                driver = curve.driver
 
-                    # Add vertices to bmesh.
-                    for v in vert:
+                # Add new variable to drive relation.
+                var = driver.variables.new()
 
-                        # Add vertex.
-                        bv = bm.verts.new(tuple(v))
+                # Select the leaf model mesh as the variable.
+                var.type = 'SINGLE_PROP'
+                var.targets[0].id_type = 'MESH'
+                var.targets[0].id = me
 
-                        # Append to list.
-                        bm_vert.append(bv)
+                # Custom property is the driving property.
+                var.targets[0].data_path = '["' + DriverName + '"]'
 
-                    # Convert to numpy array for easy indexing.
-                    bm_vert = np.array(bm_vert)
+                # Driver controls growth while shape keys are 
+                # 'reverse' growth. Thus, reverse relation with
+                # the 1 - var relation.
+                driver.expression = '1 - ' + var.name
 
-                    # Iterate over face indices in base.
-                    for f in base_face:
+        # Link to current collection.
+        self.profiler.phase('linking')
+        bpy.context.collection.objects.link(ob)
 
-                        # Create new face to mesh.
-                        bf = bm.faces.new(tuple(bm_vert[f]))
+        # Set selected.
+        ob.select_set(True)
 
-                        # If vertex color information is present in the
-                        # input file add color layer and assign color
-                        # for each vertex.
-                        if fVertexColor:
-                            for loop in bf.loops:
-                                loop[cl] = vert_color
 
-                    if fShapeKeyGeneration:
+        return ob
 
-                        # Store growth animation origin.
-                        growthOrigin.append(twig_start)
-                        # Store indices of origin for all new vertices.
-                        IGrowthOrigin.extend(
-                            [NLeaf - 1 for i in range(len(vert))]
-                        )
+    def import_ext_obj(self, file_path, fShapeKeyGeneration,
+                       fVertexColor, color_mode, animParam):
 
-                # Unknown line type.
-                else:
-                    continue
+        # Deselect all just to be safe.
+        bpy.ops.object.select_all(action='DESELECT')
 
-            if NMissingColor > 0:
-                print('Color data missing from %d lines, replaced with default color' % NMissingColor)
+        # Ensure that vertex colors are not added if color mode is
+        # unknown.
+        if color_mode not in ('from_file', 'random'):
+            fVertexColor = False
 
-            if ob is not None:
+        # Read base geometry and leaf parameters in a single pass, so
+        # that compressed files are decompressed only once.
+        try:
+            base, leaves = read_cached(bpy.context, read_ext_obj, file_path)
+        except ValueError as e:
+            self.report({'ERROR_INVALID_INPUT'}, str(e))
+            return []
+
+        # Index of each leaf in the file, which sets its growth group.
+        leaves['id'] = np.arange(len(leaves['start']))
+
+        # Select the leaves in the region of interest.
+        if self.region is not None:
+            self.profiler.phase('region')
+            leaves = take_leaves(leaves, select_leaves(
+                base, leaves, self.region,
+                file_path if self.regionIndex else None
+            ))
+
+        # Keep a subset of the leaves, scaled to preserve leaf area.
+        if self.decimation is not None:
+            self.profiler.phase('decimation')
+            leaves = decimate_leaves(leaves, *self.decimation)
+
+        # Number of leaves.
+        NLeaf = len(leaves['start'])
+
+        # Return empty array if no object can be created.
+        if NLeaf == 0:
+            return []
+
+        # Spatial chunks of leaves, as ranges in an order where the
+        # leaves of each chunk are consecutive.
+        if self.chunkSize > 0:
+            self.profiler.phase('chunks')
+            order, bounds = cell_chunks(leaves['start'], self.chunkSize)
+        else:
+            order = np.arange(NLeaf)
+            bounds = np.array([0, NLeaf])
 
-                # If shape keys are requested growth origins should be
-                # present also.
-                if fShapeKeyGeneration and IGrowthOrigin:
+        # Order the leaves of each object along a Morton curve. The
+        # growth groups are set by the index of the leaf in the file,
+        # so they are not changed.
+        if self.fMorton:
+            self.profiler.phase('chunks')
+            order = morton_order(leaves['start'], order, bounds)
 
-                    # Add default shape key.
-                    ob.shape_key_add(name='Basis')
+        if self.chunkSize > 0 or self.fMorton:
+            leaves = take_leaves(leaves, order)
 
-                    # List of extra shape keys.
-                    ShapeKeys = []
+        # Number of digits to use in object naming.
+        NDigit = len(str(len(bounds) - 1))
 
-                    # Number of shape keys is set by user.
-                    NGroup = len(animParam['times'])
-
-                    # Generate new shape keys.
-                    for iGroup in range(NGroup):
-
-                        if NGroup == 1:
-                            SetName = GrowthName
-                        else:
-                            SetName = GrowthName + '_Set_' + \
-                                str(iGroup + 1)
-
-
-                        # Use object-level method for adding new
-                        # shape key layer.
-                        ShapeKeys.append(
-                            ob.shape_key_add(name=SetName)
-                        )
-
-                    # Index of the previous growth origin,
-                    # used to check if leaf has changed.
-                    iPrev = IGrowthOrigin[0]
-
-                    # Index of the current leaf, determining the
-                    # index of the shape key to use.
-                    iLeaf = 1
-
-                    # Index of the shape key to use.
-                    iLeafGroup = 0
+        leaf_objects = []
 
-                    # Bind bmesh to mesh.
-                    bm.to_mesh(me)
-                    bm.verts.ensure_lookup_table()
-
-                    # Name of custom property that drives all shape keys.
-                    DriverName = 'Growth'
-
-                    # Create custom property and set value.
-                    me[DriverName] = 1.0
-
-                    # Get custom property as variable.
-                    rna = me.get('_RNA_UI')
-                    if rna is None:
-                        me['_RNA_UI'] = {}
-                        rna = me['_RNA_UI']
-
-                    # Set other custom property values.
-                    rna[DriverName] = {
-                        "description":"Growth progress driver. Controls shape key layers.",
-                        "default": 1.0,
-                        "min": 0.0,
-                        "max": 1.0,
-                        "soft_min": 0.0,
-                        "soft_max": 1.0
-                    }
-
-                    # Modify each shape key.
-                    for iGroup in range(NGroup):
-
-                        # Relative start time of the growth animation
-                        # in the interval [0,1].
-                        starttime = animParam['times'][iGroup][0]
-
-                        # Relative end time of the growth animation.
-                        # Same interval.
-                        endtime = animParam['times'][iGroup][1]
-
-                        # If for some reason the start time is larger 
-                        # than the end time, f-curve handles should be 
-                        # reversed.
-                        if starttime < endtime:
-                            fac = 1.0
-                        else:
-                            fac = -1.0
-
-                        # Relative length of the growth animation for this
-                        # shape key.
-                        timelen = fac*(endtime - starttime)
-
-                        # Current shape key.
-                        sk = ShapeKeys[iGroup]
-
-                        # Add driver to shape key value.
-                        curve = sk.driver_add("value")
-
-                        # Add two points to the curve controlling the
-                        # driver.
-                        curve.keyframe_points.add(2)
-
-                        # Set first point at the shape key start time
-                        # and the value to zero, i.e., growth not started.
-                        curve.keyframe_points[0].co = (starttime, 0.0)
-
-                        # Set second point at shape key end time
-                        # and the value to one, i.e., growth completed.
-                        curve.keyframe_points[1].co = (endtime, 1.0)
-
-                        
-                        for p in curve.keyframe_points:
-                            # Set vector handles for curve points.
-                            # Handle length is 30 percent of the relative
-                            # growth length. Both handles are horizontal.
-                            p.handle_left = p.co \
-                                - Vector((fac*0.3*timelen, 0.0))
-                            p.handle_right = p.co \
-                                + Vector((fac*0.3*timelen, 0.0))
-
-                            # Set point interpolation to Bezier for smooth
-                            # transitions.
-                            p.interpolation = 'BEZIER'
-
-                        # Remove default modifiers.
-                        if curve.modifiers:
-                            for iMod in range(len(curve.modifiers)):
-                                curve.modifiers.remove(curve.modifiers[iMod])
-
-                        # Driver object.
-                        driver = curve.driver
-
-                        # Add new variable to drive relation.
-                        var = driver.variables.new()
-
-                        # Select the leaf model mesh as the variable.
-                        var.type = 'SINGLE_PROP'
-                        var.targets[0].id_type = 'MESH'
-                        var.targets[0].id = me
-
-                        # Custom property is the driving property.
-                        var.targets[0].data_path = '["' + DriverName + '"]'
-
-                        # Driver controls growth while shape keys are 
-                        # 'reverse' growth. Thus, reverse relation with
-                        # the 1 - var relation.
-                        driver.expression = '1 - ' + var.name
-
-                    # Iterate over vertices/growth origins.
-                    for iVert, iOrigin in enumerate(IGrowthOrigin):
-
-                        # Check if leaf has changed.
-                        if IGrowthOrigin[iVert] != iPrev:
-
-                            # Increase number of leaves.
-                            iLeaf += 1
-                            # Compute group index in which this leaf is
-                            # growing.
-                            iLeafGroup = (iLeaf - 1) % NGroup
-                            # Update index of previous growth origin.
-                            iPrev = IGrowthOrigin[iVert]
-
-
-                        # Go through shape key layers.
-                        for iGroup in range(NGroup):
-
-                            # If this leaf is part of the current growth
-                            # group, set new coordinate on shape key 
-                            # layer. Otherwise the same coordinate is
-                            # used by default.
-                            if iGroup == iLeafGroup:
-                                co = growthOrigin[iOrigin]
-                                ShapeKeys[iGroup].data[iVert].co = co
+        for iChunk in range(len(bounds) - 1):
 
-                else:
-                    # Bind bmesh to mesh.
-                    bm.to_mesh(me)
+            # Number the objects if there are several chunks.
+            if len(bounds) > 2:
+                name = 'LeafModel_' + str(iChunk + 1).zfill(NDigit)
+            else:
+                name = 'LeafModel'
 
-                
-                # Remove from all collections.
-                bpy.ops.collection.objects_remove_all()
+            leaf_objects.append(self.createLeafObject(
+                name, base,
+                take_leaves(leaves, slice(bounds[iChunk],
+                                          bounds[iChunk + 1])),
+                fShapeKeyGeneration, fVertexColor, color_mode, animParam
+            ))
 
-                # Link to current collection.
-                bpy.context.collection.objects.link(ob)
+        # Parent the chunks to an empty object.
+        if len(leaf_objects) > 1:
+            LeafParent = bpy.data.objects.new('LeafParent', None)
+            bpy.context.collection.objects.link(LeafParent)
 
-                # Set selected.
-                ob.select_set(True)
+            for ob in leaf_objects:
+                ob.parent = LeafParent
 
-                # Return a list of objects for compatibility
-                # with OBJ-importer.
-                return [ob]
+        # Return a list of objects for compatibility with OBJ-importer.
+        return leaf_objects
 
-            else:
+    # Create linked duplicates of the leaf objects of an earlier import,
+    # under a new parent empty. Returns the operator result and the
+    # copies.
+    def instance_leaves(self, context, file_path, sources):
+
+        self.profiler.phase('linking')
+
+        bpy.ops.object.select_all(action='DESELECT')
+
+        LeafParent = bpy.data.objects.new('LeafParent', None)
+        LeafParent["LeafSource"] = file_path
+        context.collection.objects.link(LeafParent)
+
+        leaf_objects = duplicate_linked(sources, LeafParent,
+                                        context.collection)
+
+        for obj in leaf_objects:
+            obj.select_set(True)
 
-                # Return empty array if no object was created.
-                return []
+        return {'FINISHED'}, leaf_objects
 
     # Operator for importing leaf model.
     def execute(self, context):
+        return run_profiled(self.import_leaves, context,
+                            context.scene.importProfileSettings)
+
+    # Import a leaf model with the current settings. Returns the
+    # operator result and the created objects.
+    def import_leaves(self, context, profiler):
+
+        # Profiler for recording the duration of import phases.
+        self.profiler = profiler
+
+        # Optional debugging of the expensive functions.
+        self.debug = DebugHooks(
+            context.scene.importProfileSettings.debugMode,
+            bpy.path.abspath(context.scene.importProfileSettings.debugFilePath)
+        )
 
         print('Importing leaves.')
 
@@ -822,7 +1399,7 @@ class ImportLeafModel(bpy.types.Operator):
                 'Missing input file path.'
             )
             print('Cancelled.')
-            return {'CANCELLED'}
+            return {'CANCELLED'}, []
 
         # Convert to absolute path.
         file_path = bpy.path.abspath(filestr)
@@ -834,7 +1411,53 @@ class ImportLeafModel(bpy.types.Operator):
                 'No file with given path.'
             )
             print('Cancelled.')
-            return {'CANCELLED'}
+            return {'CANCELLED'}, []
+
+        # Check that compressed file can be read.
+        msg = check_file_support(file_path)
+
+        # Built-in OBJ-importer does not read compressed files.
+        if not msg and settings.importType == 'obj' and \
+           detect_compression(file_path):
+            msg = 'Compressed files are only supported with the ' \
+                  'Extended OBJ format.'
+
+        if msg:
+            self.report({'ERROR_INVALID_INPUT'}, msg)
+            print('Cancelled.')
+            return {'CANCELLED'}, []
+
+        # Region of interest of Extended OBJ leaves.
+        self.region, msg = region_of_interest(context)
+        if msg:
+            self.report({'ERROR_INVALID_INPUT'}, msg)
+            print('Cancelled.')
+            return {'CANCELLED'}, []
+
+        # Grid index next to the input file, if enabled.
+        self.regionIndex = scene.regionSettings.regionIndex
+
+        # Decimation ratio, seed and voxel size of Extended OBJ leaves.
+        if settings.leafDecimation:
+            if settings.leafDecimationMode == 'voxel':
+                cell = settings.leafDecimationCell
+            else:
+                cell = 0.0
+
+            self.decimation = (settings.leafDecimationRatio,
+                               settings.leafDecimationSeed,
+                               cell)
+        else:
+            self.decimation = None
+
+        # Edge length of the spatial chunks of leaves, or zero.
+        if settings.leafChunks:
+            self.chunkSize = settings.leafChunkSize
+        else:
+            self.chunkSize = 0.0
+
+        # Flag: Morton order of the leaves.
+        self.fMorton = settings.leafMortonOrder
 
         # Check if UVs are to be generated.
         fUvGeneration = settings.leafUvGeneration
@@ -849,7 +1472,31 @@ class ImportLeafModel(bpy.types.Operator):
                     self.report({'ERROR_INVALID_INPUT'},
                                 'Custom UV generation selected, but UV mesh not found.')
                     print('Cancelled.')
-                    return {'CANCELLED'}
+                    return {'CANCELLED'}, []
+
+        # Key of the import for reusing the data of an identical earlier
+        # import. Leaves in a region of interest depend on the region
+        # object, and are not reused.
+        importKey = None
+
+        if settings.leafReuseData and self.region is None:
+            self.profiler.phase('reuse')
+
+            # Vertices of the custom UV mesh.
+            if fUvGeneration and settings.leafUvType == 'custom':
+                uv_source = np.empty(3 * len(UvSource.vertices))
+                UvSource.vertices.foreach_get('co', uv_source)
+            else:
+                uv_source = None
+
+            importKey = import_key([file_path], settings, LEAF_KEY_EXCLUDE,
+                                   uv_source)
+
+            sources = find_instances("LeafInstance", importKey)
+
+            if sources:
+                print('Reusing the leaf data of', sources[0].name)
+                return self.instance_leaves(context, file_path, sources)
 
         # Record start time.
         start = datetime.datetime.now()
@@ -858,6 +1505,8 @@ class ImportLeafModel(bpy.types.Operator):
         import_type = settings.importType
 
         # Import using built-in OBJ-importer.
+        self.profiler.phase('read')
+
         if import_type == 'obj':
             leaf_objects = self.import_obj(file_path)
 
@@ -873,7 +1522,7 @@ class ImportLeafModel(bpy.types.Operator):
                     intMax = settings.growthGroupIntMax
                     seedInt = settings.growthSeed
 
-                    animParam = self.growth_anim_limits(
+                    animParam = growth_anim_limits(
                         NGroup,
                         intMin,
                         intMax,
@@ -894,11 +1543,13 @@ class ImportLeafModel(bpy.types.Operator):
             color_mode = settings.vertexColorMode
 
             # Generate leaves with the selected parameters.
-            leaf_objects = self.import_ext_obj(file_path,
-                                               fShapeKeyGeneration,
-                                               fVertexColor,
-                                               color_mode,
-                                               animParam)
+            leaf_objects = self.debug.run('import_ext_obj',
+                                          self.import_ext_obj,
+                                          file_path,
+                                          fShapeKeyGeneration,
+                                          fVertexColor,
+                                          color_mode,
+                                          animParam)
 
         # If import generated no objects, stop execution.
         if len(leaf_objects) == 0:
@@ -906,9 +1557,18 @@ class ImportLeafModel(bpy.types.Operator):
                 {'ERROR_INVALID_INPUT'},
                 'No leaf object generated!'
             )
-            return {'CANCELLED'}
+            return {'CANCELLED'}, []
+
+        # Store the input file on the objects and their parent, for
+        # replacing them when the file is reloaded.
+        for obj in leaf_objects:
+            obj["LeafSource"] = file_path
+
+            if obj.parent is not None:
+                obj.parent["LeafSource"] = file_path
 
         # Selected material for leaves.
+        self.profiler.phase('materials')
         matname = settings.leafModelMaterial
 
         # Check if material selected.
@@ -924,6 +1584,7 @@ class ImportLeafModel(bpy.types.Operator):
                 print('Material not found.')
 
         # Flag: skip UV generation due to input errors.
+        self.profiler.phase('uvs')
         fSkipUv = False
 
         if fUvGeneration:
@@ -935,68 +1596,21 @@ class ImportLeafModel(bpy.types.Operator):
 
             leafUvType = settings.leafUvType
 
-            if leafUvType == 'isosceles_triangle':
-                # UV vertex locations for a isosceles triangle.
-                uv_verts = [Vector((1, 0)),
-                            Vector((0.5, 1)),
-                            Vector((0, 0))]
-
-            elif leafUvType == 'square':
-                # UV vertex locations for a square.
-                uv_verts = [Vector((1, 0)),
-                            Vector((1, 1)),
-                            Vector((0, 1)),
-                            Vector((0, 0))]
+            if leafUvType in UV_SHAPES:
+                # UV vertex locations of a built-in shape.
+                uv_verts = UV_SHAPES[leafUvType]
 
             elif leafUvType == 'custom':
 
-                # Initialize array.
-                uv_verts = []
-
                 # Copy local (x,y)-coordinates of source mesh.
-                for v in UvSource.vertices:
-                    uv_verts.append(v.co.xy)
+                co = np.empty(3 * len(UvSource.vertices))
+                UvSource.vertices.foreach_get('co', co)
+                uv_verts = co.reshape(-1, 3)[:, :2]
 
             elif leafUvType == 'from_file':
 
-                # Initialize array.
-                uv_verts = []
-
-                NVert = 0
-
-                with open(file_path) as lines:
-
-                    # Iterate over rows in input file.
-                    for line in lines:
-
-                        # Split row into parameters.
-                        params = line.split(' ', 1)
-
-                        # Ignore rows with too few parameters.
-                        if len(params) < 2:
-                            continue
-
-                        # Type of line.
-
-                        # Base vertex.
-                        if params[0] == 'v':
-
-                            # Get vertex coordinates.
-                            co = params[1].split()
-
-                            # Should have three coordinates.
-                            if len(co) != 3:
-                                continue
-
-                            co = Vector([float(co[0]), float(co[1])])
-
-                            # Increase number of vertices.
-                            NVert += 1
-
-                            uv_verts.append(co)
-
-                        elif params[0] == 'f' or params[0] == 'L':
-                            break
+                # Local (x,y)-coordinates of the base vertices.
+                uv_verts = read_base_vertices(file_path)[:, :2]
 
             else:
                 # Otherwise, the selection is illegal.
@@ -1006,32 +1620,13 @@ class ImportLeafModel(bpy.types.Operator):
                     UV generation skipped."
                 )
 
-                fSkipUv = True
-
-            # Number of vertices in input UV map.
-            NVert = len(uv_verts)
+                uv_verts = []
 
             # Scale uv coordinates to unit square.
-            if NVert > 0:
-
-                # Unitialize extreme values.
-                vert_min = copy.deepcopy(uv_verts[0])
-                vert_max = copy.deepcopy(uv_verts[0])
-
-                # Find extreme values.
-                for vert in uv_verts:
-                    for i in range(0, 2):
-                        vert_min[i] = min(vert_min[i], vert[i])
-                        vert_max[i] = max(vert_max[i], vert[i])
-
-                # Scale coordinates with extreme values.
-                for vert in uv_verts:
-                    for i in range(0, 2):
-                        vert[i] = vert[i] - vert_min[i]
-                        if vert_max[i] != vert_min[i]:
-                            vert[i] /= (vert_max[i] - vert_min[i])
+            uv_verts = normalize_uv(uv_verts)
 
-            
+            # Without UV vertices the coordinates can not be set.
+            fSkipUv = len(uv_verts) == 0
 
         # Iterate over selected objects.
         for obj in leaf_objects:
@@ -1047,42 +1642,24 @@ class ImportLeafModel(bpy.types.Operator):
             if fUvGeneration and not fSkipUv:
 
                 # Create new UV map.
-                me.uv_layers.new(name=MapName)
+                uv_layer = me.uv_layers.new(name=MapName)
 
-                # Create a bmesh from mesh data for UV map manipulation.
-                bm = bmesh.new()
-                bm.from_mesh(me)
+                # Index of the vertex of each loop.
+                loop_vert = np.empty(len(me.loops), dtype=np.int32)
+                me.loops.foreach_get('vertex_index', loop_vert)
 
-                # Create UV layer.
-                uv_layer = bm.loops.layers.uv[0]
+                # Set UV coordinates of all loops, given by the vertex
+                # index modulo the number of UV vertices.
+                uv = leaf_uv_coordinates(loop_vert, uv_verts)
+                uv_layer.data.foreach_set('uv', uv.astype(np.float32).ravel())
 
-                # Initialize lookup table.
-                bm.faces.ensure_lookup_table()
-
-                # Number of leaves.
-                NFace = len(bm.faces)
-
-                # Iterate over leaves.
-                for iFace in range(NFace):
-
-                    # Number of vertices in face.
-                    NFaceVert = len(bm.faces[iFace].loops)
-
-                    # Iterate over vertices in leaf.
-                    for iVert in range(NFaceVert):
-
-                        # Index of current vertex modulo set
-                        # number of vertices.
-                        uv_index = bm.faces[iFace].loops[iVert].vert.index \
-                            % NVert
-                        # Set UV map vertex to coordinate given
-                        # by above index.
-                        bm.faces[iFace].loops[iVert][uv_layer].uv = uv_verts[
-                            uv_index
-                        ]
-
-                # Update mesh data.
-                bm.to_mesh(me)
+        # Store the key of the import on the objects, for reusing their
+        # data in identical imports.
+        if importKey is not None:
+            for i, obj in enumerate(leaf_objects):
+                obj["LeafInstance"] = {'key': importKey,
+                                       'index': i,
+                                       'count': len(leaf_objects)}
 
         # Record end time.
         end = datetime.datetime.now()
@@ -1096,7 +1673,7 @@ class ImportLeafModel(bpy.types.Operator):
         # Print duration.
         print('Done is ' + timestr + ' seconds.')
 
-        return {'FINISHED'}
+        return {'FINISHED'}, leaf_objects
 
 
 class ImportQSM(bpy.types.Operator):
@@ -1105,153 +1682,185 @@ class ImportQSM(bpy.types.Operator):
     bl_idname = "qsm.qsm_import"
     bl_label = "Import"
 
-    def createQSMParent(self, collection):
+    # Single file to import instead of the file of the import settings,
+    # and its tree index column flag, used when reloading changed files.
+    file_path: bpy.props.StringProperty(default="",
+                                        options={'HIDDEN', 'SKIP_SAVE'})
+    tree_column: bpy.props.BoolProperty(default=False,
+                                        options={'HIDDEN', 'SKIP_SAVE'})
+
+    def createQSMParent(self, collection, name='TreeParent'):
 
         # Create empty parent object for the resulting object(s).
-        EmptyParent = bpy.data.objects.new('TreeParent', None)
+        EmptyParent = bpy.data.objects.new(name, None)
         EmptyParent.empty_display_size = 1
         EmptyParent.empty_display_type = 'PLAIN_AXES'
         EmptyParent.location = Vector((0.0, 0.0, 0.0))
 
-        # Remove from all collections.
-        bpy.ops.collection.objects_remove_all()
-
         # Link to current collection.
         collection.objects.link(EmptyParent)
 
         # Return parent object.
         return EmptyParent
 
-    # Function to create mesh cylinder by copying the data
-    # of a base object, and then transforming it.
-    def addMeshCylinder(self, baseobj, cp, rot, h, r, mat):
+    # Create a new parent empty for each tree of an earlier import, with
+    # linked duplicates of its objects. Returns the operator result and
+    # the new parents.
+    def instance_qsm(self, collection, sources):
 
-        # Copy base object and data.
-        ob = baseobj.copy()
-        ob.data = baseobj.data.copy()
+        self.profiler.phase('linking')
 
-        # Translate to center point.
-        ob.location = cp
+        trees = []
 
-        # Scale to match cylinder radius and length.
-        ob.scale = (r, r, h)
+        for source in sources:
 
-        # Set rotation.
-        ob.rotation_euler = rot
+            TreeParent = self.createQSMParent(collection,
+                                              source["QsmInstance"]['name'])
 
-        if mat:
-            ob.data.materials.append(mat)
+            # Source and update information of the tree.
+            for key in ("QsmSource", "QsmUpdate", "QsmInstance"):
+                if key in source:
+                    TreeParent[key] = source[key].to_dict()
 
-        # Link new object to scene.
-        bpy.context.scene.collection.objects.link(ob)
+            duplicate_linked(source.children, TreeParent, collection)
 
-        # Return new object.
-        return ob
+            TreeParent.select_set(True)
+            trees.append(TreeParent)
 
-    # Function to import a QSM as mesh cylinders.
-    def import_as_mesh_cylinders(self, context, file_path, EmptyParent,
-                                 fBranchSeparation,
-                                 matStem, matBranch):
+        return {'FINISHED'}, trees
 
-        print('Importing QSM as mesh cylinders.')
+    # Function to create a mesh from the cylinders with indices
+    # [c0, c1), by slicing the global geometry arrays.
+    def createCylinderMesh(self, meshname, geom, cyl, c0, c1,
+                           colormap, materials, cylMat):
 
-        # Current scene to read properties.
-        scene = context.scene
-        settings = scene.qsmImportSettings
+        # Ranges of the cylinders in the global arrays.
+        v0, v1 = geom['vert_start'][c0], geom['vert_start'][c1]
+        l0, l1 = geom['loop_start'][c0], geom['loop_start'][c1]
+        p0, p1 = geom['poly_first'][c0], geom['poly_first'][c1]
 
-        if not settings.qsm_colormap_custom_name and \
-           len(settings.qsm_colormap_name) > 0:
-            colormap = settings.qsm_colormap_name
-        else:
-            colormap = 'Color'
+        # Create mesh with indices relative to the slice.
+        self.profiler.phase('mesh write')
+        me = create_mesh(meshname,
+                         geom['co'][v0:v1],
+                         geom['loop_vert'][l0:l1] - v0,
+                         geom['poly_start'][p0:p1] - l0,
+                         geom['poly_size'][p0:p1])
+        me.polygons.foreach_set('use_smooth', geom['poly_smooth'][p0:p1])
 
-        # Number of imported branches.
-        NBranch = 0
-        # Index of last branch in input file.
-        iLastBranch = 0
+        # Store the index of the cylinder in the input file on the
+        # model, to allow updating vertex colours afterwards.
+        self.profiler.phase('attributes')
+        vert_cyl = geom['vert_cyl'][v0:v1]
+        if 'id' in cyl:
+            vert_cyl = cyl['id'][vert_cyl]
 
-        # Flag: a material has been set.
-        fMat = (matStem or matBranch)
+        layer = me.vertex_layers_int.new(name="CylinderId")
+        layer.data.foreach_set('value', (vert_cyl + 1).astype(np.int32))
 
-        # Initialize material.
-        mat = None
+        # If vertex colour information is present in the input file
+        # add colour layer and assign colour for each loop.
+        if cyl['has_color'][c0:c1].any():
+            colors = me.vertex_colors.new(name=colormap)
+            colors.data.foreach_set(
+                'color',
+                cyl['color'][geom['loop_cyl'][l0:l1]].astype(np.float32).ravel()
+            )
 
-        # Flag: should the cylinder index be stored in a vertex layer.
-        # Allows updating vertex colour afterwards.
-        fIdColor = True
+        # Add the materials used by the cylinders, and set the material
+        # index of each polygon.
+        self.profiler.phase('materials')
+        used = [m for m in range(len(materials))
+                if np.any(cylMat[c0:c1] == m)]
 
-        # Minimum vertex count in cylinder rings.
-        vmin = settings.qsmVertexCountMin
-        # Maximum vertex count.
-        vmax = settings.qsmVertexCountMax
+        if used:
+            for m in used:
+                me.materials.append(materials[m])
 
-        # Number of different vertex counts.
-        vcount = vmax - vmin + 1
+            # Map global material indices to the slots of this mesh.
+            slot = np.zeros(len(materials), dtype=np.int32)
+            slot[used] = np.arange(len(used))
 
-        # Initialize list of base objects that will be copied for
-        # optimization.
-        baseobj = []
+            me.polygons.foreach_set(
+                'material_index',
+                slot[np.maximum(cylMat[geom['poly_cyl'][p0:p1]], 0)]
+            )
 
-        # Collect all created objects.
-        allobj = []
+        return me
 
-        # Generate a base object for each vertex count.
-        for v in range(0, vcount):
-
-            # Number of vertices in the rings of the current
-            # base object cylinder.
-            nvert = vmin + v
-
-            # Add a cylinder primitive with the built-in operator.
-            bpy.ops.mesh.primitive_cylinder_add(vertices=nvert,
-                                                radius=1,
-                                                depth=1,
-                                                end_fill_type='NGON',
-                                                align='WORLD',
-                                                enter_editmode=False,
-                                                location=(0.0, 0.0, 0.0),
-                                                rotation=(0.0, 0.0, 0.0))
-
-            # Get newly generated base object.
-            ob = context.selected_objects[0]
-            # Deselect.
-            ob.select_set(False)
+    # Function to get the bevel object of the curves, either a new
+    # Bezier circle parented to the given object, or the object named
+    # in the settings. Returns None after reporting an error.
+    def getBevelObject(self, context, EmptyParent):
 
-            # Get mesh data of base object.
-            me = ob.data
+        settings = context.scene.qsmImportSettings
 
-            # Translation vector.
-            point = Vector((0.0, 0.0, -0.5))
+        if settings.qsmGenerateBevelObject:
 
-            # Move base object so that the starting point is at the origin.
-            tra = Matrix.Translation(ob.matrix_world.translation - point)
-            me.transform(tra)
+            # Get bevel object by name. This object is set as
+            # the bevel object of all the Bezier curves.
+            bpy.ops.curve.primitive_bezier_circle_add(
+                radius=1,
+                align='WORLD',
+                enter_editmode=False,
+                location=(0, 0, 0)
+            )
+
+            # Selected object is the added curve.
+            BevelObject = context.selected_objects[0]
+
+            # Bevel object name.
+            BevelObject.name = 'BevelObject'
+            BevelObject.parent = EmptyParent
+            BevelObject.data.resolution_u = 5
+        else:
+            # Bevel object name.
+            bevel_object_name = settings.qsmBevelObject
+            # Get bevel object by name. This object is set as the
+            # bevel object of all the Bezier curves.
+            BevelObject = bpy.data.objects.get(bevel_object_name)
+
+            # Check that bevel object exists.
+            if not BevelObject:
+                self.report({'ERROR_INVALID_INPUT'},
+                            'Missing bevel object.')
+                return None
+
+            # Check that the object is a curve object.
+            if BevelObject.type != 'CURVE':
+                self.report({'ERROR_INVALID_INPUT'},
+                            'Bevel object has to be a curve.')
+                return None
+
+        BevelObject.select_set(False)
+
+        return BevelObject
 
-            # Update mesh data.
-            me.update()
-            # Do opposite transition in object mode to get object
-            # origin corrected.
-            ob.matrix_world.translation = point
+    # Function to import a QSM as mesh cylinders.
+    # The cylinder table can contain several trees, given as a list of
+    # tuples of parent object and cylinder range. The maximum vertex
+    # count of each tree is lowered by its level of detail factor, if
+    # given.
+    def import_as_mesh_cylinders(self, context, cyl, trees,
+                                 fBranchSeparation,
+                                 matStem, matBranch, treeLod=None):
 
-            # Create bmesh object to set the shading of the envelope
-            # faces as smooth.
-            bm = bmesh.new()
-            bm.from_mesh(me)
+        print('Importing QSM as mesh cylinders.')
 
-            # Iterate over the faces other than the last two which
-            # are the caps.
-            for f in bm.faces[-(nvert + 2):]:
-                if f.select:
-                    if len(f.verts) == 4:
-                        # Set shading smooth.
-                        f.smooth = True
+        # Current scene to read properties.
+        scene = context.scene
+        settings = scene.qsmImportSettings
 
-            # Update mesh data and delete bmesh.
-            bm.to_mesh(me)
-            bm.free()
+        if not settings.qsm_colormap_custom_name and \
+           len(settings.qsm_colormap_name) > 0:
+            colormap = settings.qsm_colormap_name
+        else:
+            colormap = 'Color'
 
-            # Add base object to list.
-            baseobj.append(ob)
+        # Minimum vertex count in cylinder rings.
+        vmin = settings.qsmVertexCountMin
+        # Maximum vertex count.
+        vmax = settings.qsmVertexCountMax
 
         # Minimum vertex count must be at least three.
         if vmin < 3:
@@ -1261,266 +1870,138 @@ class ImportQSM(bpy.types.Operator):
         if vmax < vmin:
             vmax = vmin
 
-        with open(file_path) as lines:
+        # Flag: spatial chunks. Separated branches are not divided into
+        # chunks.
+        fChunks = settings.qsmChunks and not fBranchSeparation
+        # Flag: Morton order of the cylinders of each object.
+        fMorton = settings.qsmMortonOrder
+
+        # Cylinder centres for chunks and ordering.
+        if fChunks or fMorton:
+            self.profiler.phase('chunks')
+            center, _ = cylinder_spheres(cyl)
+
+        # New order of the cylinders.
+        order = np.arange(len(cyl['radius']))
+
+        # Ranges of cylinders forming separate objects in each tree.
+        # Spatial chunks are ranges in an order where the cylinders of
+        # each chunk are consecutive.
+        treeBounds = []
+
+        for _, c0, c1 in trees:
+            if fBranchSeparation:
+                bounds = branch_bounds(cyl['branch'], c0, c1)
+            elif fChunks:
+                o, bounds = cell_chunks(center[c0:c1], settings.qsmChunkSize)
+                order[c0:c1] = o + c0
+                bounds = bounds + c0
+            else:
+                bounds = np.array([c0, c1])
+
+            treeBounds.append(bounds)
 
-            # File line count.
-            NLine = 0
+        # Order the cylinders of each object along a Morton curve, for
+        # spatially coherent mesh data. The cylinder index of the
+        # vertices is the index in the file, so it is not changed.
+        if fMorton:
+            order = morton_order(center, order, np.unique(np.concatenate(
+                [[0]] + treeBounds
+            )))
 
-            # Last displayed percentage.
-            PLast = 0
+        if fChunks or fMorton:
+            cyl = take_cylinders(cyl, order)
 
-            # Iterate through the file rows, recording the count and
-            # minimum and maximum radius values.
-            for line in lines:
+        # Maximum vertex count of each tree.
+        if treeLod is None:
+            treeVmax = None
+        else:
+            treeVmax = lod_vertex_counts(treeLod, vmin, vmax)
 
-                # Increase counter.
-                NLine = NLine + 1
+        # Compute geometry of all cylinders of all trees in one pass,
+        # or load it from the geometry cache. The cylinders of whole
+        # files are keyed by the files and the import settings.
+        treeStart = [c0 for _, c0, _ in trees]
 
-                # Split file line into parameter array.
-                params = line.split()
+        if self.geometrySource is None:
+            source = None
+        else:
+            source = self.geometrySource + (vmin, vmax, treeStart, treeVmax)
 
-                # Ignore rows with too few parameters.
-                if len(params) < 9:
-                    continue
+        geom = build_cached(context, build_cylinder_geometry,
+                            {key: cyl[key] for key in
+                             ('start', 'axis', 'length', 'radius')},
+                            vmin, vmax, treeStart, treeVmax,
+                            source=source)
 
-                # Get radius parameter of row.
-                r = float(params[8])
+        # Materials to use, and the index of the material of each
+        # cylinder in the list, or -1 if no material.
+        self.profiler.phase('materials')
+        materials, cylMat = cylinder_materials(cyl['branch'],
+                                               matStem, matBranch)
 
-                # Initialize min and max on first row.
-                if NLine == 1:
-                    rmin = r
-                    rmax = r
-                else:
-                    # Update extremes if necessary.
-                    if r < rmin:
-                        rmin = r
-                    if r > rmax:
-                        rmax = r
+        # Flag: store branch hashes for updates. Chunks are not updated,
+        # as a changed branch can move between chunks.
+        fHashes = self.fHashes and not fChunks
+
+        # Collect all created objects.
+        allobj = []
+
+        for (EmptyParent, c0, c1), bounds in zip(trees, treeBounds):
+
+            # Vertex counts and radius range of the tree, which set the
+            # vertex counts of updated cylinders.
+            if fHashes:
+                EmptyParent["QsmUpdate"] = {
+                    'vmin': vmin,
+                    'vmax': vmax,
+                    'radius': [float(cyl['radius'][c0:c1].min()),
+                               float(cyl['radius'][c0:c1].max())],
+                    'separation': fBranchSeparation,
+                }
 
             # Number of digits to use in object naming.
-            NDigit = len(str(NLine))
-
-            # Return to file beginning for second iteration.
-            lines.seek(0)
-
-            # List of objects that are later joined to form either
-            # a branch or the full QSM.
-            allcyl = []
-
-            # Index of current cylinder.
-            iCyl = 0
-
-            # Iterate over rows in input file.
-            for iLine, line in enumerate(lines):
-
-                # Split row into parameters.
-                params = line.split()
-
-                # Ignore rows with too few parameters.
-                if len(params) < 9:
-                    continue
-
-                # Increase number of cylinders.
-                iCyl += 1
-
-                # Print progress in the console every nth row.
-                PLast = print_progress(NLine, iLine, 10, PLast)
-
-                # Store parameters.
-                iBranch = int(float(params[0]))
-                sp = Vector((float(params[1]),
-                             float(params[2]),
-                             float(params[3])))
-                ax = Vector((float(params[4]),
-                             float(params[5]),
-                             float(params[6])))
-                h = float(params[7])
-                r = float(params[8])
-
-                # Convert axis to Euler rotation.
-                rot = ax.to_track_quat('Z', 'Y').to_euler()
-
-                # Select number of vertices based on linear
-                # interpolation of radius.
-                nvert = vmin + (vmax - vmin) * (r - rmin) / (rmax - rmin)
-                # Convert result to an integer by rounding.
-                nvert = int(round(nvert))
-
-                # Index of base object based on vertex count.
-                iObj = nvert - vmin
-
-                # Flag: file contains an additional row to use as
-                # colourmap values.
-                fVertColor = False
-                fVectorVertColor = False
-
-                # Check if extra column for colourmap exists.
-                if len(params) > 9:
-                    fVertColor = True
-                    if len(params) > 11:
-                        fVectorVertColor = True
-                        VertColor = Vector((float(params[9]),
-                                            float(params[10]),
-                                            float(params[11]),
-                                            1.0))
-                    else:
-                        fVectorVertColor = False
-                        VertColor = float(params[9])
-
-                if fMat:
-                    if iBranch == 1 or not matBranch:
-                        mat = matStem
-                    else:
-                        mat = matBranch
-
-                # If this is the first branch, or the index differs
-                # form the previous row.
-                if NBranch == 0 or iBranch != iLastBranch:
-
-                    # Update index of previous branch.
-                    iLastBranch = iBranch
-                    # Increase branch count.
-                    NBranch += 1
-
-                    # If multiple objects are created, use unique
-                    # object and mesh names by numbering them.
-                    if fBranchSeparation:
-                        meshname = "branch_" + str(NBranch).zfill(NDigit)
-                        objname = "branch_" + str(NBranch).zfill(NDigit)
-                    else:
-                        meshname = "qsm_mesh"
-                        objname = "qsm"
-
-                    # Start a new branch if this is the first one, or
-                    # if the user has selected to separate branches.
-                    if NBranch == 1 or fBranchSeparation:
-
-                        # If separate branches and not the first one.
-                        if NBranch > 1:
-
-                            # Select all objects in last branch.
-                            for ob in allcyl:
-                                ob.select_set(True)
-
-                            # Set one of them as active.
-                            context.view_layer.objects.active = allcyl[0]
-                            # Join the objects.
-                            bpy.ops.object.join()
-                            # Apply object scale.
-                            bpy.ops.object.transform_apply(location=False,
-                                                           rotation=False,
-                                                           scale=True)
-
-                            # Deselect resulting object.
-                            allcyl[0].select_set(False)
-
-                            # Store new object.
-                            allobj.append(allcyl[0])
-
-                            # Initialize array for next branch.
-                            allcyl = []
-
-
-                        # Add current cylinder by copying and modifying
-                        # the base object.
-                        ob = self.addMeshCylinder(
-                            baseobj[iObj],
-                            sp, rot, h, r, mat
-                        )
-
-                        # Set name and parent.
-                        ob.name = objname
-                        ob.parent = EmptyParent
-
-                    # No need to change object even though the branch
-                    # index changed.
-                    else:
-                        ob = self.addMeshCylinder(
-                            baseobj[iObj],
-                            sp, rot, h, r, mat
-                        )
-
-                # Still on same branch index.
+            NDigit = len(str(len(bounds) - 1))
+
+            # Create a mesh and an object for each range.
+            for iBranch in range(len(bounds) - 1):
+
+                # If multiple objects are created, use unique
+                # object and mesh names by numbering them.
+                if fBranchSeparation:
+                    meshname = "branch_" + str(iBranch + 1).zfill(NDigit)
+                    objname = "branch_" + str(iBranch + 1).zfill(NDigit)
+                elif fChunks and len(bounds) > 2:
+                    meshname = "qsm_mesh_" + str(iBranch + 1).zfill(NDigit)
+                    objname = "qsm_" + str(iBranch + 1).zfill(NDigit)
                 else:
-                    ob = self.addMeshCylinder(
-                        baseobj[iObj],
-                        sp, rot, h, r, mat
-                    )
+                    meshname = "qsm_mesh"
+                    objname = "qsm"
 
-                # Add new object to list of cylinders in current branch.
-                allcyl.append(ob)
+                me = self.createCylinderMesh(meshname, geom, cyl,
+                                             bounds[iBranch],
+                                             bounds[iBranch + 1],
+                                             colormap, materials, cylMat)
 
-                # Get mesh data of new cylinder.
-                me = ob.data
-                # Create a bmesh object for colourmap creation from
-                # mesh data.
-                bm = bmesh.new()
-                bm.from_mesh(me)
-
-                # If cylinder ID should be stored on the model.
-                if fIdColor:
-                    # Get or create new layer for index colouring.
-                    layer = bm.verts.layers.int.get("CylinderId")
-                    if not layer:
-                        layer = bm.verts.layers.int.new("CylinderId")
-
-                    # Iterate over mesh vertices and set index colouring
-                    # value to index of the cylinder.
-                    for v in bm.verts:
-                        v[layer] = iCyl
-
-                # If vertex colour information is present in the input file
-                # add colour layer and assign colour for each vertex.
-                if fVertColor:
-                    # Get or create new layer for input colourmap.
-                    colors = bm.loops.layers.color.get(colormap)
-                    if not colors:
-                        colors = bm.loops.layers.color.new(colormap)
-
-                    # Iterate over vertices and set vertex colour by
-                    # repeating the input value three times.
-                    for v in bm.verts:
-                        for loop in v.link_loops:
-                            if fVectorVertColor:
-                                loop[colors] = VertColor
-                            else:
-                                loop[colors] = [VertColor] * 4
-
-                # Update mesh data and delete bmesh.
-                bm.to_mesh(me)
-                bm.free()
-
-            # Select all cylinders of last object.
-            for ob in allcyl:
-                ob.select_set(True)
-
-            # Set active object.
-            context.view_layer.objects.active = allcyl[0]
-
-            # Join all cylinders in list.
-            bpy.ops.object.join()
-            # Apply object scale.
-            bpy.ops.object.transform_apply(location=False,
-                                           rotation=False,
-                                           scale=True)
-
-            # Get resulting object.
-            ob = allcyl[0]
-
-            # Store into list.
-            allobj.append(ob)
-
-        # As clean-up, remove the base objects and
-        # their mesh data.
-        for ob in baseobj:
-            bpy.data.objects.remove(ob)
+                # Create object and set parent.
+                self.profiler.phase('linking')
+                ob = bpy.data.objects.new(objname, me)
+                ob.parent = EmptyParent
+
+                if fHashes:
+                    self.profiler.phase('hashes')
+                    store_branch_hashes(ob, take_cylinders(
+                        cyl, slice(bounds[iBranch], bounds[iBranch + 1])
+                    ))
+
+                allobj.append(ob)
 
         return allobj
 
     # Function to import a QSM as Bezier cylinders.
     def import_as_bezier_cylinders(self,
                                    context,
-                                   file_path,
+                                   cyl,
                                    EmptyParent,
                                    fBranchSeparation,
                                    matStem,
@@ -1529,9 +2010,6 @@ class ImportQSM(bpy.types.Operator):
 
         print('Importing QSM as Bezier cylinders.')
 
-        # Current scene to read properties.
-        scene = context.scene
-
         # Current collection.
         collection = context.collection
 
@@ -1540,255 +2018,173 @@ class ImportQSM(bpy.types.Operator):
         # Index of last branch.
         iLastBranch = 0
 
-        # Length of right and left control handles.
-        len_r = 0.45
-        len_l = 0.45
-
         # Collect all created objects.
         allobj = []
 
-        with open(file_path) as lines:
+        # Number of cylinders.
+        NCyl = len(cyl['radius'])
 
-            # Count number of lines in file.
-            NLine = sum(1 for line in lines)
+        # Number of digits to use in object naming.
+        NDigit = len(str(NCyl))
 
-            # Number of digits to use in object naming.
-            NDigit = len(str(NLine))
+        # If file did not have any cylinders.
+        if NCyl <= 0:
+            self.report(
+                {'ERROR_INVALID_INPUT'},
+                'Selected file is empty.'
+            )
 
-            # If file did not have any lines.
-            if NLine <= 0:
-                self.report(
-                    {'ERROR_INVALID_INPUT'},
-                    'Selected file is empty.'
-                )
+            return []
 
-                return {'CANCELLED'}
+        # Curve points and handles of all cylinders.
+        points = bezier_cylinder_points(cyl['start'], cyl['axis'],
+                                        cyl['length'], cyl['radius'])
+
+        # Last displayed percentage.
+        PLast = 0
+
+        # Iterate over cylinders.
+        for iCyl in range(NCyl):
+
+            # Print progress in the console every nth cylinder.
+            PLast = print_progress(NCyl, iCyl, 10, PLast)
+
+            # Get cylinder parameters.
+            iBranch = int(cyl['branch'][iCyl])
+
+            # If the first branch or branch index has changed.
+            if NBranch == 0 or iBranch != iLastBranch:
+
+                # Update last index.
+                iLastBranch = iBranch
+                # Increase branch count.
+                NBranch += 1
+
+                # If multiple objects are created, use unique
+                # object and mesh names by numbering them.
+                if fBranchSeparation:
+                    curvename = "branch_" + str(NBranch).zfill(NDigit)
+                    objname   = "branch_" + str(NBranch).zfill(NDigit)
+                else:
+                    curvename = "qsm_curve"
+                    objname   = "qsm"
 
-            # Return to file beginning.
-            lines.seek(0)
-
-            # Last displayed percentage.
-            PLast = 0
-
-            # Iterate over file rows.
-            for iLine, line in enumerate(lines):
-
-                # Split row into parameters.
-                params = line.split()
-
-                # Ignore rows with too few parameters.
-                if len(params) < 9:
-                    continue
-
-                # Print progress in the console every nth row.
-                PLast = print_progress(NLine, iLine, 10, PLast)
-
-                # Get cylinder parameters.
-                iBranch = int(float(params[0]))
-                sp = (float(params[1]), float(params[2]), float(params[3]))
-                ax = (float(params[4]), float(params[5]), float(params[6]))
-                h = float(params[7])
-                r = float(params[8])
-
-                # If the first branch or branch index has changed.
-                if NBranch == 0 or iBranch != iLastBranch:
-
-                    # Update last index.
-                    iLastBranch = iBranch
-                    # Increase branch count.
-                    NBranch += 1
-
-                    # If multiple objects are created, use unique
-                    # object and mesh names by numbering them.
-                    if fBranchSeparation:
-                        curvename = "branch_" + str(NBranch).zfill(NDigit)
-                        objname   = "branch_" + str(NBranch).zfill(NDigit)
-                    else:
-                        curvename = "qsm_curve"
-                        objname   = "qsm"
-
-                    # Start a new branch if this is the first one,
-                    # or if the user has selected to separate branches.
-                    if NBranch == 1 or fBranchSeparation:
-
-                        # Create Bezier curve for new branch.
-                        curvedata = bpy.data.curves.new(name=curvename,
-                                                        type='CURVE')
-                        curvedata.dimensions = '3D'
-                        # Set bevel object.
-                        curvedata.bevel_object = BevelObject
-                        curvedata.use_fill_caps = True
-
-                        # Add stem material to object if it is the
-                        # first branch, or if branch material is not
-                        # set (same material for all branches),
-                        # and if stem material is set.
-                        if iBranch == 1 or not matBranch:
-                            if matStem:
-                                curvedata.materials.append(matStem)
-
-                        # Add branch material if material is set and
-                        # it is different from the stem material.
-                        if matBranch and (matStem != matBranch):
-                            curvedata.materials.append(matBranch)
-
-                        # Create new object with the curve data.
-                        objectdata = bpy.data.objects.new(objname, curvedata)
-
-                        # Position to origin.
-                        objectdata.location = (0, 0, 0)
-
-                        # Remove from all collections.
-                        bpy.ops.collection.objects_remove_all()
-
-                        # Link to current collection.
-                        collection.objects.link(objectdata)
-
-                        # Parent to created empty.
-                        objectdata.parent = EmptyParent
-
-                        # Add new object to list.
-                        allobj.append(objectdata)
-
-                        # Set as selected.
-                        objectdata.select_set(False)
-                        
-
-                # For each cylinder add a new Bezier spline into the
-                # curve data.
-                polyline = curvedata.splines.new('BEZIER')
-                # Add an extra point to have two in total.
-                polyline.bezier_points.add(1)
-                # Set order to one as the cylinder axis will be linear.
-                polyline.resolution_u = 1
-
-                # Create the starting (i == 0) and ending (i == 1)
-                # points of the spline.
-                for i in (0, 1):
-
-                    # Position on axis (0 = bottom, 1 = top).
-                    hf = i
-
-                    # Position of curve point.
-                    co    = [sp_i + h * ax_i * hf                    for sp_i,ax_i in zip(sp,ax)]
-                    # Position of left handle.
-                    left  = [sp_i + h * ax_i * hf - len_l * ax_i * h for sp_i,ax_i in zip(sp,ax)]
-                    # Position of right handle.
-                    right = [sp_i + h * ax_i * hf + len_r * ax_i * h for sp_i,ax_i in zip(sp,ax)]
-
-                    # Set Bezier curve point properties.
-                    polyline.bezier_points[i].co = co
-                    polyline.bezier_points[i].handle_left = left
-                    polyline.bezier_points[i].handle_right = right
-
-                    # Set curve point radius.
-                    polyline.bezier_points[i].radius = r
-
-                    # Assign proper materials from the splots.
-                    if iBranch == 1:
+                # Start a new branch if this is the first one,
+                # or if the user has selected to separate branches.
+                if NBranch == 1 or fBranchSeparation:
+
+                    # Create Bezier curve for new branch.
+                    curvedata = bpy.data.curves.new(name=curvename,
+                                                    type='CURVE')
+                    curvedata.dimensions = '3D'
+                    # Set bevel object.
+                    curvedata.bevel_object = BevelObject
+                    curvedata.use_fill_caps = True
+
+                    # Add stem material to object if it is the
+                    # first branch, or if branch material is not
+                    # set (same material for all branches),
+                    # and if stem material is set.
+                    if iBranch == 1 or not matBranch:
                         if matStem:
-                            polyline.material_index = 0
-                    else:
-                        if matBranch or matStem:
-                            polyline.material_index = len(curvedata.materials)
+                            curvedata.materials.append(matStem)
+
+                    # Add branch material if material is set and
+                    # it is different from the stem material.
+                    if matBranch and (matStem != matBranch):
+                        curvedata.materials.append(matBranch)
+
+                    # Create new object with the curve data.
+                    objectdata = bpy.data.objects.new(objname, curvedata)
+
+                    # Position to origin.
+                    objectdata.location = (0, 0, 0)
 
-                    # Set curve resolution.
-                    polyline.resolution_u = 1
-                    polyline.use_endpoint_u = True
+                    # Remove from all collections.
+                    bpy.ops.collection.objects_remove_all()
+
+                    # Link to current collection.
+                    collection.objects.link(objectdata)
+
+                    # Parent to created empty.
+                    objectdata.parent = EmptyParent
+
+                    # Add new object to list.
+                    allobj.append(objectdata)
+
+                    # Set as selected.
+                    objectdata.select_set(False)
+                    
+
+            # For each cylinder add a new Bezier spline into the
+            # curve data.
+            self.addBezierCylinder(curvedata, points, iCyl, iBranch,
+                                   matStem, matBranch)
 
         return allobj
 
+    # Function to add a cylinder-level Bezier spline to the given curve
+    # data, from the curve points of the cylinder with index iCyl.
+    def addBezierCylinder(self, curvedata, points, iCyl, iBranch,
+                          matStem, matBranch):
+
+        polyline = curvedata.splines.new('BEZIER')
+        # Add an extra point to have two in total.
+        polyline.bezier_points.add(1)
+
+        # Set the starting and ending points of the spline, and
+        # the curve point radius.
+        for key in ('co', 'handle_left', 'handle_right', 'radius'):
+            polyline.bezier_points.foreach_set(key,
+                                               points[key][iCyl].ravel())
+
+        # Assign proper materials from the splots.
+        if iBranch == 1:
+            if matStem:
+                polyline.material_index = 0
+        else:
+            if matBranch or matStem:
+                polyline.material_index = len(curvedata.materials)
+
+        # Set order to one as the cylinder axis will be linear.
+        polyline.resolution_u = 1
+        polyline.use_endpoint_u = True
+
     # Function to add a branch-level Bezier spline to the given
     # curve data, from the given cylinder parameters.
-    def addBezierCurve(self, curvedata, SP, AX, H, R):
+    # If tolerance is positive, the resolution of the spline is set
+    # adaptively from its curvature and radius.
+    def addBezierCurve(self, curvedata, SP, AX, H, R, tolerance=0):
+
+        # Curve points and handles.
+        points = bezier_branch_points(SP, AX, H, R)
 
         # Number of curve points = cylinder count + start point + end point.
-        NPoint = len(R) + 2
+        NPoint = len(points['radius'])
 
         # Create new spline.
         polyline = curvedata.splines.new('BEZIER')
         # Add curve points to get NPoint points.
         polyline.bezier_points.add(NPoint - 1)
 
-        # Iterate over cylinders in the input parameter lists.
-        for i in range(0, NPoint):
-
-            # Base of first cylinder.
-            if i == 0:
-                # Use normal radius.
-                rf = 1  # Radius scaler
-                # Point at the bottom of the cylinder.
-                hf = 0  # Position along cylinder axis.
-                j = 0  # Index of curve point.
-
-                # Shorter handles as there are more than one curve point
-                # "on" the first cylinder.
-                len_r = 0.25  # Length of right handle.
-                len_l = 0.25  # Length of left handle.
-
-            # Tip of last cylinder.
-            elif i == NPoint - 1:
-                # Taper to 10% of radius.
-                rf = 0.1
-                # Point at the end of the cylinder.
-                hf = 1
-                # Last curve point.
-                j = len(SP) - 1
-
-                # Shorter handles as there are more than one curve point
-                # "on" the last cylinder.
-                len_l = 0.25
-                len_r = 0.25
-
-            # Curve points in the middle of the cylinders.
-            else:
-                # Normal radius.
-                rf = 1
-                # Point at the center of cylinder.
-                hf = 0.5
-                j = i - 1
-
-                # Normal handle length, unless its the left handle of the
-                # first cylinder, or the right handle of the last cylinder.
-                len_r = 0.45
-                len_l = 0.45
-
-                # Middle of the first cylinder.
-                if i == 1:
-                    len_l = 0.25
-
-                # Middle of the last cylinder.
-                if i == NPoint - 2:
-                    len_r = 0.25
-
-            # Get parameters of current cylinder.
-            sp = SP[j]  # Start point
-            ax = AX[j]  # Axis
-            h = H[j]   # Length
-            r = R[j]   # Radius
-
-            # Compute curve point location.
-            co    = [sp_i + h * ax_i * hf                    for sp_i,ax_i in zip(sp,ax)]
-            # And handle locations.
-            left  = [sp_i + h * ax_i * hf - len_l * ax_i * h for sp_i,ax_i in zip(sp,ax)]
-            right = [sp_i + h * ax_i * hf + len_r * ax_i * h for sp_i,ax_i in zip(sp,ax)]
-
-            # Set curve point properties and radius.
-            polyline.bezier_points[i].co = co
-            polyline.bezier_points[i].handle_left = left
-            polyline.bezier_points[i].handle_right = right
-            polyline.bezier_points[i].radius = r * rf
-
-        # Set curve resolution based on the number of curve points.
-        # At most the resolution can be 10.
-        polyline.resolution_u = min(NPoint - 2, 10)
+        # Set curve point properties and radius.
+        for key in ('co', 'handle_left', 'handle_right', 'radius'):
+            polyline.bezier_points.foreach_set(key, points[key].ravel())
+
+        # Set curve resolution adaptively so that the tube surface
+        # deviates at most by the tolerance. Otherwise set resolution
+        # based on the number of curve points, at most 10.
+        if tolerance > 0:
+            polyline.resolution_u = bezier_resolution(points, tolerance)
+        else:
+            polyline.resolution_u = min(NPoint - 2, 10)
         polyline.use_endpoint_u = True
 
         # Return new spline.
         return polyline
 
     # Function to import a QSM as branch-level bevelled Bezier curves.
-    def import_as_bezier_curves(self, context, file_path, EmptyParent,
+    def import_as_bezier_curves(self, context, cyl, EmptyParent,
                                 fBranchSeparation,
                                 matStem, matBranch, BevelObject):
 
@@ -1796,6 +2192,14 @@ class ImportQSM(bpy.types.Operator):
 
         # Current scene to read properties.
         scene = context.scene
+        settings = scene.qsmImportSettings
+
+        # Error tolerance of adaptive spline resolution, or zero to
+        # set the resolution based on the number of curve points.
+        if settings.qsmAdaptiveResolution:
+            tolerance = settings.qsmResolutionTolerance
+        else:
+            tolerance = 0
 
         # Current collection.
         collection = context.collection
@@ -1814,198 +2218,241 @@ class ImportQSM(bpy.types.Operator):
         # Collect all created objects.
         allobj = []
 
-        with open(file_path) as lines:
+        # Number of cylinders.
+        NCyl = len(cyl['radius'])
 
-            # Count number of lines in file.
-            NLine = sum(1 for line in lines)
+        # Number of digits to use in object naming.
+        NDigit = len(str(NCyl))
 
-            # Number of digits to use in object naming.
-            NDigit = len(str(NLine))
+        # If file had any cylinders.
+        if NCyl > 0:
 
-            # If file had any rows.
-            if NLine > 0:
+            # If multiple objects are created, use unique
+            # object and mesh names by numbering them.
+            if fBranchSeparation:
+                curvename = "branch_" + str(1).zfill(NDigit)
+                objname   = "branch_" + str(1).zfill(NDigit)
+            else:
+                curvename = "qsm_curve"
+                objname   = "qsm"
 
-                # If multiple objects are created, use unique
-                # object and mesh names by numbering them.
-                if fBranchSeparation:
-                    curvename = "branch_" + str(1).zfill(NDigit)
-                    objname   = "branch_" + str(1).zfill(NDigit)
-                else:
-                    curvename = "qsm_curve"
-                    objname   = "qsm"
+            # Create new curve to hold splines.
+            curvedata = bpy.data.curves.new(
+                name=curvename,
+                type='CURVE'
+            )
 
-                # Create new curve to hold splines.
-                curvedata = bpy.data.curves.new(
-                    name=curvename,
-                    type='CURVE'
-                )
+            curvedata.dimensions = '3D'
+            # Set bevel object and fill caps.
+            curvedata.bevel_object = BevelObject
+            curvedata.use_fill_caps = True
 
-                curvedata.dimensions = '3D'
-                # Set bevel object and fill caps.
-                curvedata.bevel_object = BevelObject
-                curvedata.use_fill_caps = True
+            # Add stem material to first object.
+            if matStem:
+                curvedata.materials.append(matStem)
 
-                # Add stem material to first object.
-                if matStem:
-                    curvedata.materials.append(matStem)
+            # Add branch material to first object if present.
+            if matBranch and (matStem != matBranch):
+                curvedata.materials.append(matBranch)
 
-                # Add branch material to first object if present.
-                if matBranch and (matStem != matBranch):
-                    curvedata.materials.append(matBranch)
+            # Create new object with curve data.
+            objectdata = bpy.data.objects.new(objname, curvedata)
+            # Set position to origin.
+            objectdata.location = (0, 0, 0)
 
-                # Create new object with curve data.
-                objectdata = bpy.data.objects.new(objname, curvedata)
-                # Set position to origin.
-                objectdata.location = (0, 0, 0)
+            # Remove from all collections.
+            bpy.ops.collection.objects_remove_all()
 
-                # Remove from all collections.
-                bpy.ops.collection.objects_remove_all()
+            # Link to current collection.
+            collection.objects.link(objectdata)
 
-                # Link to current collection.
-                collection.objects.link(objectdata)
+            # Parent to created empty.
+            objectdata.parent = EmptyParent
 
-                # Parent to created empty.
-                objectdata.parent = EmptyParent
+            # Set selected.
+            objectdata.select_set(True)
 
-                # Set selected.
-                objectdata.select_set(True)
+            # Add new object to list.
+            allobj.append(objectdata)
 
-            # Otherwise the file was empty.
-            else:
-                self.report(
-                    {'ERROR_INVALID_INPUT'},
-                    'Selected file is empty.'
-                )
+        # Otherwise the file was empty.
+        else:
+            self.report(
+                {'ERROR_INVALID_INPUT'},
+                'Selected file is empty.'
+            )
 
-                return {'CANCELLED'}
+            return []
 
-            # Move back to file beginning.
-            lines.seek(0)
-
-            # Last displayed percentage.
-            PLast = 0
-
-            # Iterate over file rows.
-            for iLine, line in enumerate(lines):
-
-                # Split row into parameters.
-                params = line.split()
-
-                # Ignore rows with too few parameters.
-                if len(params) < 9:
-                    continue
-
-                # Print progress in the console every nth row.
-                PLast = print_progress(NLine, iLine, 10, PLast)
-
-                # Get cylinder parameters.
-                iBranch = int(float(params[0]))
-
-                # On first branch.
-                if NBranch < 1:
-                    # Set count to one.
-                    NBranch = 1
-                    # Set last index to first index.
-                    iLastBranch = iBranch
-
-                # If new branch begins, complete the last branch.
-                if iBranch != iLastBranch:
-
-                    # Add new spline with the cylinder parameter arrays.
-                    polyline = self.addBezierCurve(curvedata, sp, ax, h, r)
-
-                    # If the branch index of the branch to complete is one,
-                    # assign stem material.
-                    if iLastBranch == 1:
-                        polyline.material_index = 0
-                    # Otherwise, assign last material slot, which is stem
-                    # material if its the only material and branch material
-                    # if it is present.
-                    else:
-                        polyline.material_index = len(curvedata.materials)
-
-                    # Update last branch to current value.
-                    iLastBranch = iBranch
-                    # Increase branch count.
-                    ++NBranch
-
-                    # Empty parameter arrays.
-                    sp[:] = []
-                    ax[:] = []
-                    h[:] = []
-                    r[:] = []
-
-                    # If branches are separated, create new object with a
-                    # name based on index.
-                    if fBranchSeparation:
-                        curvename = "branch_" + str(NBranch).zfill(NDigit)
-                        objname   = "branch_" + str(NBranch).zfill(NDigit)
-
-                        # New curve data.
-                        curvedata = bpy.data.curves.new(name=curvename,
-                                                        type='CURVE')
-                        curvedata.dimensions = '3D'
-                        curvedata.bevel_object = BevelObject
-                        curvedata.use_fill_caps = True
-
-                        # Add branch material to rest of the
-                        # objects if present.
-                        if matBranch:
-                            curvedata.materials.append(matBranch)
-                        # Otherwise use stem material if given.
-                        elif matStem:
-                            curvedata.materials.append(matStem)
+        # Last displayed percentage.
+        PLast = 0
 
-                        # New object with curve data.
-                        objectdata = bpy.data.objects.new(objname, curvedata)
+        # Iterate over cylinders.
+        for iCyl in range(NCyl):
 
-                        # Position to origin.
-                        objectdata.location = (0, 0, 0)
+            # Print progress in the console every nth cylinder.
+            PLast = print_progress(NCyl, iCyl, 10, PLast)
 
-                        # Remove from all collections.
-                        bpy.ops.collection.objects_remove_all()
+            # Get cylinder parameters.
+            iBranch = int(cyl['branch'][iCyl])
 
-                        # Link to current collection.
-                        collection.objects.link(objectdata)
+            # On first branch.
+            if NBranch < 1:
+                # Set count to one.
+                NBranch = 1
+                # Set last index to first index.
+                iLastBranch = iBranch
 
-                        # Parent to empty.
-                        objectdata.parent = EmptyParent
+            # If new branch begins, complete the last branch.
+            if iBranch != iLastBranch:
 
-                        # Set selected.
-                        objectdata.select_set(False)
+                # Add new spline with the cylinder parameter arrays.
+                polyline = self.addBezierCurve(curvedata, sp, ax, h, r,
+                                           tolerance)
 
-                        # Append new object.
-                        allobj.append(objectdata)
+                # If the branch index of the branch to complete is one,
+                # assign stem material.
+                if iLastBranch == 1:
+                    polyline.material_index = 0
+                # Otherwise, assign last material slot, which is stem
+                # material if its the only material and branch material
+                # if it is present.
+                else:
+                    polyline.material_index = len(curvedata.materials)
 
-                # Append cylinder parameters from current file
-                # row to parameter arrays.
-                sp.append((float(params[1]),
-                           float(params[2]),
-                           float(params[3])))
-                ax.append((float(params[4]),
-                           float(params[5]),
-                           float(params[6])))
-                h.append(float(params[7]))
-                r.append(float(params[8]))
+                # Update last branch to current value.
+                iLastBranch = iBranch
+                # Increase branch count.
+                ++NBranch
 
-            # Complete final branch.
-            polyline = self.addBezierCurve(curvedata, sp, ax, h, r)
+                # Empty parameter arrays.
+                sp[:] = []
+                ax[:] = []
+                h[:] = []
+                r[:] = []
 
-            # If the branch index of the branch to complete is one,
-            # assign stem material.
-            if iBranch == 1:
-                polyline.material_index = 0
-            # Otherwise, assign last material slot, which is stem
-            # material if its the only material and branch material
-            # if it is present.
-            else:
-                polyline.material_index = len(curvedata.materials)
+                # If branches are separated, create new object with a
+                # name based on index.
+                if fBranchSeparation:
+                    curvename = "branch_" + str(NBranch).zfill(NDigit)
+                    objname   = "branch_" + str(NBranch).zfill(NDigit)
+
+                    # New curve data.
+                    curvedata = bpy.data.curves.new(name=curvename,
+                                                    type='CURVE')
+                    curvedata.dimensions = '3D'
+                    curvedata.bevel_object = BevelObject
+                    curvedata.use_fill_caps = True
+
+                    # Add branch material to rest of the
+                    # objects if present.
+                    if matBranch:
+                        curvedata.materials.append(matBranch)
+                    # Otherwise use stem material if given.
+                    elif matStem:
+                        curvedata.materials.append(matStem)
+
+                    # New object with curve data.
+                    objectdata = bpy.data.objects.new(objname, curvedata)
+
+                    # Position to origin.
+                    objectdata.location = (0, 0, 0)
+
+                    # Remove from all collections.
+                    bpy.ops.collection.objects_remove_all()
+
+                    # Link to current collection.
+                    collection.objects.link(objectdata)
+
+                    # Parent to empty.
+                    objectdata.parent = EmptyParent
+
+                    # Set selected.
+                    objectdata.select_set(False)
+
+                    # Append new object.
+                    allobj.append(objectdata)
+
+            # Append parameters of the current cylinder to
+            # parameter arrays.
+            sp.append(tuple(float(x) for x in cyl['start'][iCyl]))
+            ax.append(tuple(float(x) for x in cyl['axis'][iCyl]))
+            h.append(float(cyl['length'][iCyl]))
+            r.append(float(cyl['radius'][iCyl]))
+
+        # Complete final branch.
+        polyline = self.addBezierCurve(curvedata, sp, ax, h, r,
+                                       tolerance)
+
+        # If the branch index of the branch to complete is one,
+        # assign stem material.
+        if iBranch == 1:
+            polyline.material_index = 0
+        # Otherwise, assign last material slot, which is stem
+        # material if its the only material and branch material
+        # if it is present.
+        else:
+            polyline.material_index = len(curvedata.materials)
 
         return allobj
 
     # Main function of the QSM import operator.
     def execute(self, context):
 
+        result = run_profiled(self.import_qsm, context,
+                              context.scene.importProfileSettings)
+
+        # Move the imported trees into library files.
+        if 'FINISHED' in result and \
+           context.scene.librarySettings.libraryOnImport:
+            trees = [ob for ob in context.selected_objects
+                     if "QsmSource" in ob]
+            result, _ = move_to_libraries(self, context, trees)
+
+        return result
+
+    # Read the cylinders of a file, and select those in the region of
+    # interest, if given.
+    def read_region(self, context, file_path, fTreeId, region):
+
+        cyl = read_cached(context, read_qsm_file, file_path, fTreeId)
+
+        # Index of each cylinder in the file, which is stored as the
+        # cylinder index of mesh vertices.
+        cyl['id'] = np.arange(len(cyl['radius']))
+
+        if region is None:
+            return cyl
+
+        self.profiler.phase('region')
+
+        # Grid index next to the input file, if enabled.
+        if context.scene.regionSettings.regionIndex:
+            index_file = file_path
+        else:
+            index_file = None
+
+        key = 'cylinders_tree' if fTreeId else 'cylinders'
+        cyl = take_cylinders(cyl, select_cylinders(cyl, region,
+                                                   index_file, key))
+
+        self.profiler.phase('read')
+
+        return cyl
+
+    # Import a QSM with the current settings. Returns the operator
+    # result and the created parent objects.
+    def import_qsm(self, context, profiler):
+
+        # Profiler for recording the duration of import phases.
+        self.profiler = profiler
+
+        # Optional debugging of the expensive functions.
+        self.debug = DebugHooks(
+            context.scene.importProfileSettings.debugMode,
+            bpy.path.abspath(context.scene.importProfileSettings.debugFilePath)
+        )
+
         # Deselect all just to be safe.
         bpy.ops.object.select_all(action='DESELECT')
 
@@ -2020,7 +2467,7 @@ class ImportQSM(bpy.types.Operator):
         collection = context.collection
 
         # Path to input file.
-        filestr = settings.qsm_file_path
+        filestr = self.file_path or settings.qsm_file_path
 
         # Check for empty filepath.
         if len(filestr) == 0:
@@ -2030,75 +2477,214 @@ class ImportQSM(bpy.types.Operator):
             )
 
             print('Cancelled.')
-            return {'CANCELLED'}
+            return {'CANCELLED'}, []
 
         # Convert to absolute path.
         file_path = bpy.path.abspath(filestr)
 
-        # Check that file exists.
-        if not os.path.isfile(file_path):
+        # Path with wildcards imports each matching file as a tree.
+        file_paths = input_file_paths(file_path)
+
+        # Check that files exist.
+        if not file_paths or not all(os.path.isfile(f) for f in file_paths):
             self.report(
                 {'ERROR_INVALID_INPUT'},
                 'No file with given path.'
             )
 
             print('Cancelled.')
-            return {'CANCELLED'}
+            return {'CANCELLED'}, []
+
+        # Check that compressed files can be read.
+        for f in file_paths:
+            msg = check_file_support(f)
+            if msg:
+                self.report({'ERROR_INVALID_INPUT'}, msg)
+                print('Cancelled.')
+                return {'CANCELLED'}, []
+
+        # Region of interest.
+        region, msg = region_of_interest(context)
+        if msg:
+            self.report({'ERROR_INVALID_INPUT'}, msg)
+            print('Cancelled.')
+            return {'CANCELLED'}, []
+
+        # Camera for the distance-based level of detail.
+        if settings.qsmLod:
+            LodCamera = bpy.data.objects.get(settings.qsmLodCamera)
+
+            if not LodCamera:
+                self.report({'ERROR_INVALID_INPUT'}, 'Missing LOD camera.')
+                print('Cancelled.')
+                return {'CANCELLED'}, []
+
+        # Key of the import for reusing the data of an identical earlier
+        # import. Trees reduced by the region or level of detail depend
+        # on other objects, and are not reused.
+        importKey = None
+
+        if settings.qsmReuseData and region is None and not settings.qsmLod:
+            self.profiler.phase('reuse')
+            importKey = import_key(file_paths, settings, QSM_KEY_EXCLUDE)
+
+            sources = find_instances("QsmInstance", importKey)
+
+            if sources:
+                print('Reusing the tree data of', sources[0].name)
+                return self.instance_qsm(collection, sources)
+
+        # Flag: store branch hashes of mesh objects for updates. Trees
+        # reduced by the region or level of detail are not updated.
+        self.fHashes = settings.qsmUpdateHashes and region is None and \
+            not settings.qsmLod
 
         # Import mode: mesh / bezier
         mode = settings.qsmImportMode
         # Flag: separate objects for each branch.
         fBranchSeparation = settings.qsmSeparation
+        # Flag: first column of input file is the tree index.
+        if self.file_path:
+            fTreeId = self.tree_column
+        else:
+            fTreeId = settings.qsmTreeIdColumn
 
-        # Create empty parent for QSM object(s).
-        EmptyParent = self.createQSMParent(collection)
+        # Source of the cached geometry. Trees reduced by the region or
+        # level of detail depend on other objects, and their geometry
+        # is keyed by the cylinders.
+        self.geometrySource = None
 
-        # If curve-based mode, check that bevel object is given and
-        # exists.
-        if mode == 'bezier_cylinder' or mode == 'bezier_branch':
+        if region is None and not settings.qsmLod:
+            self.geometrySource = (
+                file_paths, settings_values(settings, QSM_KEY_EXCLUDE),
+                fTreeId
+            )
 
-            if settings.qsmGenerateBevelObject:
+        # Read cylinder parameters.
+        self.profiler.phase('read')
 
-                # Get bevel object by name. This object is set as
-                # the bevel object of all the Bezier curves.
-                bpy.ops.curve.primitive_bezier_circle_add(
-                    radius=1,
-                    align='WORLD',
-                    enter_editmode=False,
-                    location=(0, 0, 0)
-                )
+        if len(file_paths) == 1:
+            cyl = self.read_region(context, file_paths[0], fTreeId, region)
+        else:
+            cyl = concatenate_cylinders([
+                self.read_region(context, f, False, region)
+                for f in file_paths
+            ])
+
+        # Check that cylinders were found.
+        if len(cyl['radius']) == 0:
+            if region is None:
+                msg = 'Selected file does not contain cylinders.'
+            else:
+                msg = 'No cylinders in the region of interest.'
+
+            self.report({'ERROR_INVALID_INPUT'}, msg)
+
+            print('Cancelled.')
+            return {'CANCELLED'}, []
+
+        self.profiler.phase('topology')
 
-                # Selected object is the added curve.
-                BevelObject = context.selected_objects[0]
+        if len(file_paths) == 1:
 
-                # Bevel object name.
-                BevelObject.name = 'BevelObject'
-                BevelObject.parent = EmptyParent
-                BevelObject.data.resolution_u = 5
+            # Trees are named by their index in the file.
+            if 'tree' in cyl:
+                cyl, treeRanges = partition_trees(cyl)
+                treeSources = [(file_paths[0], iTree)
+                               for iTree, c0, c1 in treeRanges]
+                treeRanges = [('TreeParent_' + str(iTree), c0, c1)
+                              for iTree, c0, c1 in treeRanges]
             else:
-                # Bevel object name.
-                bevel_object_name = settings.qsmBevelObject
-                # Get bevel object by name. This object is set as the
-                # bevel object of all the Bezier curves.
-                BevelObject = bpy.data.objects.get(bevel_object_name)
+                treeSources = [(file_paths[0], -1)]
+                treeRanges = [('TreeParent', 0, len(cyl['radius']))]
 
-                # Check that bevel object exists.
-                if not BevelObject:
-                    self.report({'ERROR_INVALID_INPUT'},
-                                'Missing bevel object.')
-                    print('Cancelled.')
-                    return {'CANCELLED'}
+        else:
+            # Each file is a tree, named by the file name.
+            cyl, treeRanges = partition_trees(cyl)
+            treeSources = [(file_paths[iTree], -1)
+                           for iTree, c0, c1 in treeRanges]
+            treeRanges = [('TreeParent_' +
+                           os.path.basename(file_paths[iTree]).split('.')[0],
+                           c0, c1)
+                          for iTree, c0, c1 in treeRanges]
+
+        # Import mode of each tree.
+        treeModes = [mode] * len(treeRanges)
+
+        # Level of detail factor of each tree, from zero for the trees
+        # near the camera to one for the far trees.
+        treeLod = None
+
+        if settings.qsmLod:
+            self.profiler.phase('lod')
+
+            ranges = [(c0, c1) for name, c0, c1 in treeRanges]
+            treeLod = lod_factors(
+                tree_distances(cyl, ranges,
+                               LodCamera.matrix_world.translation),
+                settings.qsmLodNear,
+                settings.qsmLodFar
+            )
 
-                # Check that the object is a curve object.
-                if BevelObject.type != 'CURVE':
-                    self.report({'ERROR_INVALID_INPUT'},
-                                'Bevel object has to be a curve.')
-                    print('Cancelled.')
-                    return {'CANCELLED'}
+            # Remove thin branches by the factor.
+            index, ranges = lod_select(cyl, ranges, treeLod,
+                                       settings.qsmLodRadiusCutoff)
+            cyl = take_cylinders(cyl, index)
+
+            # Far trees can be imported in a different mode.
+            if settings.qsmLodFarMode != 'same':
+                treeModes = [settings.qsmLodFarMode if f >= 1 else mode
+                             for f in treeLod]
+
+            # Keep the trees that have cylinders left.
+            fKeep = [c1 > c0 and m != 'skip'
+                     for (c0, c1), m in zip(ranges, treeModes)]
+
+            treeRanges = [(name, c0, c1)
+                          for (name, _, _), (c0, c1), f
+                          in zip(treeRanges, ranges, fKeep) if f]
+            treeSources = [src for src, f in zip(treeSources, fKeep) if f]
+            treeModes = [m for m, f in zip(treeModes, fKeep) if f]
+            treeLod = [lod for lod, f in zip(treeLod, fKeep) if f]
+
+            if not treeRanges:
+                self.report({'ERROR_INVALID_INPUT'},
+                            'No trees left after level of detail.')
+                print('Cancelled.')
+                return {'CANCELLED'}, []
+
+        # Create empty parent for the object(s) of each tree.
+        self.profiler.phase('linking')
+        trees = [(self.createQSMParent(collection, name), c0, c1)
+                 for name, c0, c1 in treeRanges]
+
+        # Store the input file and the tree index in the file, or -1
+        # if the file has a single tree, on the parents.
+        for (TreeParent, c0, c1), (src, iTree) in zip(trees, treeSources):
+            TreeParent["QsmSource"] = {'file': src,
+                                       'tree': iTree,
+                                       'tree_column': fTreeId and iTree >= 0}
+
+        # Store the level of detail factor on the parents.
+        if treeLod is not None:
+            for (TreeParent, c0, c1), lod in zip(trees, treeLod):
+                TreeParent["LodFactor"] = float(lod)
+
+        # First parent, used for shared objects.
+        EmptyParent = trees[0][0]
+
+        # If curve-based mode, check that bevel object is given and
+        # exists.
+        if 'bezier_cylinder' in treeModes or 'bezier_branch' in treeModes:
 
-            BevelObject.select_set(False)
+            BevelObject = self.getBevelObject(context, EmptyParent)
+
+            if not BevelObject:
+                print('Cancelled.')
+                return {'CANCELLED'}, []
 
         # Get stem material name.
+        self.profiler.phase('materials')
         matname = settings.qsmStemMaterial
 
         # Check that values is not empty.
@@ -2131,49 +2717,311 @@ class ImportQSM(bpy.types.Operator):
 
         allobj = []
 
-        # Mesh cylinder.
-        if mode == 'mesh_cylinder':
-            allobj = self.import_as_mesh_cylinders(context,
-                                          file_path,
-                                          EmptyParent,
-                                          fBranchSeparation,
-                                          matStem,
-                                          matBranch)
-        # Cylinder-level Bezier curves.
-        elif mode == 'bezier_cylinder':
-            allobj = self.import_as_bezier_cylinders(context,
-                                            file_path,
-                                            EmptyParent,
-                                            fBranchSeparation,
-                                            matStem, matBranch,
-                                            BevelObject)
-        # Branch-level Bezier curves.
-        elif mode == 'bezier_branch':
-            allobj = self.import_as_bezier_curves(context,
-                                         file_path,
-                                         EmptyParent,
+        # Geometry is built in the import functions.
+        self.profiler.phase('geometry')
+
+        # Mesh cylinder, with the geometry of all trees built at once.
+        meshTrees = [i for i, m in enumerate(treeModes)
+                     if m == 'mesh_cylinder']
+
+        if meshTrees:
+
+            # Cylinders of the mesh trees only, so that the geometry and
+            # the vertex counts are not computed from curve trees.
+            if len(meshTrees) == len(trees):
+                meshCyl = cyl
+                meshRanges = [(c0, c1) for _, c0, c1 in trees]
+            else:
+                meshCyl, meshRanges = take_ranges(
+                    cyl, [trees[i][1:] for i in meshTrees]
+                )
+
+            allobj = self.debug.run(
+                'import_as_mesh_cylinders',
+                self.import_as_mesh_cylinders,
+                context,
+                meshCyl,
+                [(trees[i][0], c0, c1)
+                 for i, (c0, c1) in zip(meshTrees, meshRanges)],
+                fBranchSeparation,
+                matStem,
+                matBranch,
+                None if treeLod is None else [treeLod[i] for i in meshTrees]
+            )
+
+        for (TreeParent, c0, c1), treeMode in zip(trees, treeModes):
+
+            # Cylinder-level Bezier curves.
+            if treeMode == 'bezier_cylinder':
+                allobj += self.debug.run('import_as_bezier_cylinders',
+                                         self.import_as_bezier_cylinders,
+                                         context,
+                                         take_cylinders(cyl, slice(c0, c1)),
+                                         TreeParent,
+                                         fBranchSeparation,
+                                         matStem, matBranch,
+                                         BevelObject)
+            # Branch-level Bezier curves.
+            elif treeMode == 'bezier_branch':
+                allobj += self.debug.run('import_as_bezier_curves',
+                                         self.import_as_bezier_curves,
+                                         context,
+                                         take_cylinders(cyl, slice(c0, c1)),
+                                         TreeParent,
                                          fBranchSeparation,
                                          matStem,
                                          matBranch,
                                          BevelObject)
 
-        # Ensure all objects are deselected.
+        # Link added objects that are not yet in any collection to the
+        # current collection.
+        self.profiler.phase('linking')
+
         for ob in allobj:
+            if not ob.users_collection:
+                collection.objects.link(ob)
+
             ob.select_set(False)
 
-        # Link added objects to current collection.
-        for ob in allobj:
-            ob.select_set(True)
+        # Bake the curves into meshes, which are used instead of the
+        # curves until they are edited.
+        if settings.qsmBakeCurveMesh:
+            self.profiler.phase('baking')
 
-            # Remove from all collections.
-            bpy.ops.collection.objects_remove_all()
+            for ob in allobj:
+                if ob.type == 'CURVE':
+                    bake_curve_mesh(context, ob).select_set(False)
 
-            # Link to current collection.
-            collection.objects.link(ob)
+        for TreeParent, c0, c1 in trees:
+            TreeParent.select_set(True)
+
+        # Store the key of the import on the parents, for reusing their
+        # data in identical imports.
+        if importKey is not None:
+            for i, ((TreeParent, c0, c1), (name, _, _)) in \
+                    enumerate(zip(trees, treeRanges)):
+                TreeParent["QsmInstance"] = {'key': importKey,
+                                             'index': i,
+                                             'count': len(trees),
+                                             'name': name}
+
+        # Record end time.
+        end = datetime.datetime.now()
+        # Compute duration.
+        delta = end - start
+        # Format duration as string.
+        timestr = "{:.1f}".format(delta.total_seconds())
+
+        # Display import duration in the console.
+        sys.stdout.write("Processing finished in " +
+                         timestr + " sec" + " " * 100 + "\n")
+        sys.stdout.flush()
+
+        return {'FINISHED'}, [TreeParent for TreeParent, c0, c1 in trees]
+
+
+# Operator for updating the colourmap information of a mesh based QSM object,
+# without re-importing the geometry.
+class UpdateMeshQSMColorMap(bpy.types.Operator):
+    """Read colourmap values from file and update selected mesh object vertex colors"""
+
+    bl_idname = "qsm.update_colourmap"
+    bl_label = "Update colourmap"
+
+    # Main function of the colourmap update operator.
+    def execute(self, context):
+
+        # Record start time to compute duration.
+        start = datetime.datetime.now()
+
+        # Current scene for properties.
+        scene = context.scene
+        settings = scene.qsmImportSettings
+
+        if not settings.qsm_colormap_custom_name \
+           and len(settings.qsm_colormap_name) > 0:
+            colormap = settings.qsm_colormap_name
+        else:
+            colormap = 'Color'
+
+        # Object to update should be selected.
+        ob = bpy.context.selected_objects[0]
+
+        # If no selection or selected object is not a mesh.
+        if not ob:
+            self.report({'ERROR_INVALID_INPUT'},
+                        'No object selected.')
+            return {'CANCELLED'}
+        elif ob.type != 'MESH':
+            self.report({'ERROR_INVALID_INPUT'},
+                        'Selected object is not a mesh.')
+            return {'CANCELLED'}
+
+        # Path to input file.
+        file_path = bpy.path.abspath(settings.qsm_file_path)
+
+        # Check that file exists.
+        if not os.path.isfile(file_path):
+            self.report({'ERROR_INVALID_INPUT'},
+                        'No file with given path.')
+            print('Cancelled.')
+            return {'CANCELLED'}
+
+        # Check that compressed file can be read.
+        msg = check_file_support(file_path)
+        if msg:
+            self.report({'ERROR_INVALID_INPUT'}, msg)
+            print('Cancelled.')
+            return {'CANCELLED'}
+
+        # Mesh data of selected object.
+        me = ob.data
+
+        # Get integer layer that contains cylinder ID information,
+        # crucial for updating.
+        layer = me.vertex_layers_int.get("CylinderId")
+
+        # If layer does not exist, unable to update.
+        if not layer:
+            self.report({'ERROR_INVALID_INPUT'},
+                        'Selected object does not contain cylinder id info.')
+            return {'CANCELLED'}
+
+        # Read cylinder parameters, including colourmap values. The
+        # CylinderId layer stores the row of the cylinder in the file,
+        # so the table is indexed in file order.
+        cyl = read_cached(context, read_qsm_file,
+                          file_path, settings.qsmTreeIdColumn)
+
+        # Array to hold colourmap values of each cylinder.
+        CylinderColors = cyl['color']
+
+        # Cylinder index of each vertex, read from CylinderId layer.
+        vert_cyl = np.empty(len(me.vertices), dtype=np.int32)
+        layer.data.foreach_get('value', vert_cyl)
+
+        # Index of the vertex of each loop.
+        loop_vert = np.empty(len(me.loops), dtype=np.int32)
+        me.loops.foreach_get('vertex_index', loop_vert)
+
+        # Get colour layer that holds colourmap data.
+        colors = me.vertex_colors.get(colormap)
+        # If layer does not exist, create new.
+        if not colors:
+            colors = me.vertex_colors.new(name=colormap)
+
+        # Update colour layer with the colour value of the cylinder of
+        # each loop.
+        colors.data.foreach_set(
+            'color',
+            CylinderColors[vert_cyl[loop_vert] - 1].astype(np.float32).ravel()
+        )
+
+        # Update mesh data.
+        me.update()
+
+        # Record end time.
+        end = datetime.datetime.now()
+        # Compute duration.
+        delta = end - start
+        # Format duration as string.
+        timestr = "{:.1f}".format(delta.total_seconds())
+
+        # Display import duration in the console.
+        sys.stdout.write("Processing finished in " +
+                         timestr + " sec" + " " * 100 + "\n")
+        sys.stdout.flush()
+
+        return {'FINISHED'}
 
-            ob.select_set(False)
 
-        EmptyParent.select_set(True)
+# Operator for updating mesh based QSM objects in place after the input
+# file has changed. Only the branches whose cylinders changed are
+# rebuilt, and spliced into the kept geometry of the objects. Inherits
+# the mesh creation of the import operator.
+class UpdateQSM(ImportQSM):
+    """Rebuild the changed branches of the selected QSM objects from their input files"""
+
+    bl_idname = "qsm.update_qsm"
+    bl_label = "Update in place"
+
+    # Input file whose trees are updated, instead of the selected trees.
+    file_path: bpy.props.StringProperty(default="",
+                                        options={'HIDDEN', 'SKIP_SAVE'})
+
+    def execute(self, context):
+        return run_profiled(self.update_qsm, context,
+                            context.scene.importProfileSettings)
+
+    # Update the trees of the selected objects. Returns the operator
+    # result and the updated parent objects.
+    def update_qsm(self, context, profiler):
+
+        # Profiler for recording the duration of update phases.
+        self.profiler = profiler
+
+        # Record start time to compute duration.
+        start = datetime.datetime.now()
+
+        # Current scene for properties.
+        scene = context.scene
+        settings = scene.qsmImportSettings
+
+        if not settings.qsm_colormap_custom_name \
+           and len(settings.qsm_colormap_name) > 0:
+            colormap = settings.qsm_colormap_name
+        else:
+            colormap = 'Color'
+
+        # Parents of the selected trees, or the trees of the given
+        # file, with the information stored during the import.
+        if self.file_path:
+            objects = [ob for ob in scene.objects if "QsmSource" in ob and
+                       ob["QsmSource"]['file'] == self.file_path]
+        else:
+            objects = context.selected_objects
+
+        trees = []
+        for ob in objects:
+            if "QsmUpdate" not in ob and ob.parent is not None:
+                ob = ob.parent
+            if "QsmUpdate" in ob and "QsmSource" in ob and ob not in trees:
+                trees.append(ob)
+
+        if not trees:
+            self.report({'ERROR_INVALID_INPUT'},
+                        'No QSM imported with branch hashes selected.')
+            print('Cancelled.')
+            return {'CANCELLED'}, []
+
+        # Check that the input files exist and can be read.
+        for TreeParent in trees:
+
+            file_path = TreeParent["QsmSource"]['file']
+
+            if not os.path.isfile(file_path):
+                self.report({'ERROR_INVALID_INPUT'},
+                            'No file with given path: ' + file_path)
+                print('Cancelled.')
+                return {'CANCELLED'}, []
+
+            msg = check_file_support(file_path)
+            if msg:
+                self.report({'ERROR_INVALID_INPUT'}, msg)
+                print('Cancelled.')
+                return {'CANCELLED'}, []
+
+        # Stem and branch materials of the rebuilt cylinders.
+        self.profiler.phase('materials')
+        matStem = bpy.data.materials.get(settings.qsmStemMaterial)
+        matBranch = bpy.data.materials.get(settings.qsmBranchMaterial)
+
+        # Number of rebuilt branches.
+        NBranch = 0
+
+        for TreeParent in trees:
+            NBranch += self.update_tree(TreeParent, colormap,
+                                        matStem, matBranch)
 
         # Record end time.
         end = datetime.datetime.now()
@@ -2182,186 +3030,1088 @@ class ImportQSM(bpy.types.Operator):
         # Format duration as string.
         timestr = "{:.1f}".format(delta.total_seconds())
 
-        # Display import duration in the console.
-        sys.stdout.write("Processing finished in " +
-                         timestr + " sec" + " " * 100 + "\n")
-        sys.stdout.flush()
+        # Display update duration in the console.
+        sys.stdout.write("Processing finished in " +
+                         timestr + " sec" + " " * 100 + "\n")
+        sys.stdout.flush()
+
+        self.report({'INFO'}, 'Rebuilt ' + str(NBranch) + ' branch(es).')
+
+        return {'FINISHED'}, trees
+
+    # Update the mesh objects of a tree from its input file. Each object
+    # keeps the cylinders of its unchanged branches. Objects of removed
+    # branches are deleted, and new branches are added to the tree
+    # object, or as new objects if branches are separated. Returns the
+    # number of rebuilt branches.
+    def update_tree(self, TreeParent, colormap, matStem, matBranch):
+
+        source = TreeParent["QsmSource"]
+        info = TreeParent["QsmUpdate"]
+
+        # The objects no longer match the key of their import.
+        if "QsmInstance" in TreeParent:
+            del TreeParent["QsmInstance"]
+
+        # Read the cylinders of the tree.
+        self.profiler.phase('read')
+        cyl = read_cached(bpy.context, read_qsm_file,
+                          source['file'], source['tree_column'])
+        cyl['id'] = np.arange(len(cyl['radius']))
+
+        if source['tree'] >= 0:
+            cyl = take_cylinders(cyl,
+                                 np.flatnonzero(cyl['tree'] == source['tree']))
+
+        if len(cyl['radius']) == 0:
+            print('No cylinders left in tree', TreeParent.name)
+            return 0
+
+        # Hash of each branch in the new file.
+        self.profiler.phase('hashes')
+        hashes = branch_hashes(cyl)
+
+        # A changed radius range changes the vertex counts of all
+        # cylinders, so that all branches are rebuilt.
+        radius = [float(cyl['radius'].min()), float(cyl['radius'].max())]
+        fAll = radius != list(info['radius'])
+
+        # Mesh objects of the tree.
+        objects = [ob for ob in TreeParent.children
+                   if ob.type == 'MESH' and "QsmBranchHash" in ob]
+
+        # Branches already assigned to an object.
+        owned = set()
+
+        # Number of rebuilt branches.
+        NBranch = 0
+
+        for ob in objects:
+
+            old = ob["QsmBranchHash"].to_dict()
+
+            # Branches of the object in the new file.
+            if info['separation']:
+                target = [int(b) for b in old
+                          if int(b) in hashes and int(b) not in owned]
+            else:
+                target = list(hashes)
+
+            owned.update(target)
+
+            # Remove objects whose branches were removed.
+            if not target:
+                me = ob.data
+                bpy.data.objects.remove(ob)
+                if me.users == 0:
+                    bpy.data.meshes.remove(me)
+                continue
+
+            # Branches with unchanged cylinders.
+            kept = [b for b in target
+                    if not fAll and old.get(str(b)) == hashes[b]]
+
+            if len(kept) == len(target) == len(old):
+                continue
+
+            NBranch += len(target) - len(kept)
+
+            self.splice_branches(ob, cyl, target, kept, info, radius,
+                                 colormap, matStem, matBranch)
+
+        # New branches of separated trees are added as new objects.
+        if info['separation']:
+            for b in sorted(set(hashes) - owned):
+
+                self.profiler.phase('linking')
+                ob = bpy.data.objects.new("branch_" + str(b),
+                                          bpy.data.meshes.new("branch_" +
+                                                              str(b)))
+                ob.parent = TreeParent
+
+                for collection in TreeParent.users_collection:
+                    collection.objects.link(ob)
+
+                NBranch += 1
+
+                self.splice_branches(ob, cyl, [b], [], info, radius,
+                                     colormap, matStem, matBranch)
+
+        info['radius'] = radius
+
+        return NBranch
+
+    # Replace the mesh of an object with the geometry of the cylinders
+    # of the target branches. The cylinders of the kept branches are
+    # copied from the old mesh, and the others are built from the table.
+    def splice_branches(self, ob, cyl, target, kept, info, radius,
+                        colormap, matStem, matBranch):
+
+        # Old mesh arrays.
+        self.profiler.phase('mesh read')
+        old = ob.data
+
+        NVert = len(old.vertices)
+        NLoop = len(old.loops)
+        NPoly = len(old.polygons)
+
+        mesh = {'co': np.empty(3 * NVert, dtype=np.float32),
+                'loop_vert': np.empty(NLoop, dtype=np.int32),
+                'poly_start': np.empty(NPoly, dtype=np.int32),
+                'poly_size': np.empty(NPoly, dtype=np.int32),
+                'poly_smooth': np.empty(NPoly, dtype=bool),
+                'vert_cyl': np.empty(NVert, dtype=np.int32)}
+
+        old.vertices.foreach_get('co', mesh['co'])
+        mesh['co'] = mesh['co'].reshape(-1, 3)
+        old.loops.foreach_get('vertex_index', mesh['loop_vert'])
+        old.polygons.foreach_get('loop_start', mesh['poly_start'])
+        old.polygons.foreach_get('loop_total', mesh['poly_size'])
+        old.polygons.foreach_get('use_smooth', mesh['poly_smooth'])
+
+        # Index of the cylinder of each vertex in the old file.
+        layer = old.vertex_layers_int.get("CylinderId")
+        if layer:
+            layer.data.foreach_get('value', mesh['vert_cyl'])
+            mesh['vert_cyl'] -= 1
+        else:
+            mesh['vert_cyl'][:] = -1
+
+        # Old cylinders in file order, and their branches.
+        oldId = np.unique(mesh['vert_cyl'])
+        oldBranch = np.array(ob.get("QsmCylinderBranch", []), dtype=int)
+
+        # Without matching cylinder data, for example after editing,
+        # all cylinders are rebuilt.
+        if len(oldId) != len(oldBranch) or np.any(oldId < 0):
+            kept = []
+
+        # Index of each kept cylinder in the new table, or -1.
+        self.profiler.phase('topology')
+        if kept:
+            remap = remap_cylinders(oldBranch, cyl['branch'], kept)
+            mesh['vert_cyl'] = remap[np.searchsorted(oldId, mesh['vert_cyl'])]
+        else:
+            mesh['vert_cyl'][:] = -1
+
+        # Cylinders of the changed branches.
+        index = np.flatnonzero(np.isin(cyl['branch'], target) &
+                               ~np.isin(cyl['branch'], kept))
+
+        # Build the geometry of the changed cylinders with the vertex
+        # counts of the import.
+        self.profiler.phase('geometry')
+        geom = build_cylinder_geometry(take_cylinders(cyl, index),
+                                       info['vmin'], info['vmax'],
+                                       treeRadius=[radius])
+
+        geom = splice_cylinder_geometry(mesh, geom, index)
+
+        # Cylinder table in the order of the spliced geometry.
+        sub = take_cylinders(cyl, geom['index'])
+        materials, cylMat = cylinder_materials(sub['branch'],
+                                               matStem, matBranch)
+
+        meshname = old.name
+        me = self.createCylinderMesh(meshname, geom, sub,
+                                     0, len(geom['index']),
+                                     colormap, materials, cylMat)
+
+        # Replace the old mesh data.
+        self.profiler.phase('linking')
+        ob.data = me
+
+        if old.users == 0:
+            bpy.data.meshes.remove(old)
+            me.name = meshname
+
+        self.profiler.phase('hashes')
+        store_branch_hashes(ob, sub)
+
+
+# Operator for rebuilding imported trees with the current import
+# settings, such as the import mode, vertex counts and materials. The
+# cylinders are read through the table cache, so that trees whose files
+# are cached are rebuilt without reading their files.
+class RegenerateQSM(ImportQSM):
+    """Rebuild the selected trees with the current import settings, replacing their objects"""
+
+    bl_idname = "qsm.regenerate"
+    bl_label = "Regenerate"
+
+    def execute(self, context):
+        return run_profiled(self.regenerate_qsm, context,
+                            context.scene.importProfileSettings)
+
+    # Rebuild the trees of the selected objects. Returns the operator
+    # result and the rebuilt parent objects.
+    def regenerate_qsm(self, context, profiler):
+
+        # Profiler for recording the duration of the phases.
+        self.profiler = profiler
+
+        # Record start time to compute duration.
+        start = datetime.datetime.now()
+
+        # Current scene for properties.
+        scene = context.scene
+        settings = scene.qsmImportSettings
+
+        # Parents of the selected trees.
+        trees = []
+        for ob in context.selected_objects:
+            if "QsmSource" not in ob and ob.parent is not None:
+                ob = ob.parent
+            if "QsmSource" in ob and ob not in trees:
+                trees.append(ob)
+
+        if not trees:
+            self.report({'ERROR_INVALID_INPUT'},
+                        'No imported QSM selected.')
+            print('Cancelled.')
+            return {'CANCELLED'}, []
+
+        # Check that the input files exist.
+        for TreeParent in trees:
+            if not os.path.isfile(TreeParent["QsmSource"]['file']):
+                self.report({'ERROR_INVALID_INPUT'},
+                            'No file with given path: ' +
+                            TreeParent["QsmSource"]['file'])
+                print('Cancelled.')
+                return {'CANCELLED'}, []
+
+        # Check that compressed files can be read.
+        for TreeParent in trees:
+            msg = check_file_support(TreeParent["QsmSource"]['file'])
+            if msg:
+                self.report({'ERROR_INVALID_INPUT'}, msg)
+                print('Cancelled.')
+                return {'CANCELLED'}, []
+
+        # Region of interest.
+        region, msg = region_of_interest(context)
+        if msg:
+            self.report({'ERROR_INVALID_INPUT'}, msg)
+            print('Cancelled.')
+            return {'CANCELLED'}, []
+
+        # Import mode and branch separation.
+        mode = settings.qsmImportMode
+        fBranchSeparation = settings.qsmSeparation
+
+        # Flag: store branch hashes of mesh objects for updates.
+        self.fHashes = settings.qsmUpdateHashes and region is None
+
+        # Stem and branch materials.
+        self.profiler.phase('materials')
+        matStem = bpy.data.materials.get(settings.qsmStemMaterial)
+        matBranch = bpy.data.materials.get(settings.qsmBranchMaterial)
+
+        for TreeParent in trees:
+
+            source = TreeParent["QsmSource"]
+
+            # Cylinders of the tree.
+            self.profiler.phase('read')
+            cyl = self.read_region(context, source['file'],
+                                   source['tree_column'], region)
+
+            if source['tree'] >= 0:
+                cyl = take_cylinders(
+                    cyl, np.flatnonzero(cyl['tree'] == source['tree'])
+                )
+
+            # Source of the cached geometry of the whole tree.
+            self.geometrySource = None
+
+            if region is None:
+                self.geometrySource = (
+                    [source['file']],
+                    settings_values(settings, QSM_KEY_EXCLUDE),
+                    bool(source['tree_column']), source['tree']
+                )
+
+            # Remove the old objects and data of the tree, and the
+            # information of the old import. A generated bevel object
+            # parented to the tree is kept if the curves of other trees
+            # use it.
+            self.profiler.phase('linking')
+
+            remove_objects(list(TreeParent.children))
+
+            for key in ("QsmUpdate", "LodFactor", "QsmInstance"):
+                if key in TreeParent:
+                    del TreeParent[key]
+
+            if len(cyl['radius']) == 0:
+                continue
+
+            self.profiler.phase('geometry')
+
+            if mode == 'mesh_cylinder':
+                objects = self.import_as_mesh_cylinders(
+                    context, cyl, [(TreeParent, 0, len(cyl['radius']))],
+                    fBranchSeparation, matStem, matBranch
+                )
+            else:
+                BevelObject = self.getBevelObject(context, TreeParent)
+
+                if not BevelObject:
+                    print('Cancelled.')
+                    return {'CANCELLED'}, trees
+
+                if mode == 'bezier_cylinder':
+                    objects = self.import_as_bezier_cylinders(
+                        context, cyl, TreeParent, fBranchSeparation,
+                        matStem, matBranch, BevelObject
+                    )
+                else:
+                    objects = self.import_as_bezier_curves(
+                        context, cyl, TreeParent, fBranchSeparation,
+                        matStem, matBranch, BevelObject
+                    )
+
+            # Link the objects to the collections of the tree.
+            self.profiler.phase('linking')
+
+            for ob in objects:
+                if not ob.users_collection:
+                    for collection in TreeParent.users_collection:
+                        collection.objects.link(ob)
+
+                ob.select_set(False)
+
+            # Bake the curves into meshes.
+            if settings.qsmBakeCurveMesh:
+                self.profiler.phase('baking')
+
+                for ob in objects:
+                    if ob.type == 'CURVE':
+                        bake_curve_mesh(context, ob).select_set(False)
+
+        # Record end time.
+        end = datetime.datetime.now()
+        # Compute duration.
+        delta = end - start
+        # Format duration as string.
+        timestr = "{:.1f}".format(delta.total_seconds())
+
+        # Display duration in the console.
+        sys.stdout.write("Processing finished in " +
+                         timestr + " sec" + " " * 100 + "\n")
+        sys.stdout.flush()
+
+        return {'FINISHED'}, trees
+
+
+# Operator for emptying the table cache.
+class ClearTableCache(bpy.types.Operator):
+    """Remove the tables of all input files from memory"""
+
+    bl_idname = "qsm.clear_cache"
+    bl_label = "Clear cache"
+
+    def execute(self, context):
+
+        table_cache.clear()
+
+        return {'FINISHED'}
+
+
+# Operator for moving the selected trees into library files, replaced
+# with linked collection instances.
+class MoveToLibrary(bpy.types.Operator):
+    """Write the selected trees into library files and link them as collection instances"""
+
+    bl_idname = "qsm.move_to_library"
+    bl_label = "Move to libraries"
+
+    def execute(self, context):
+
+        # Parents of the selected trees.
+        trees = []
+        for ob in context.selected_objects:
+            if "QsmSource" not in ob and ob.parent is not None:
+                ob = ob.parent
+            if "QsmSource" in ob and ob not in trees:
+                trees.append(ob)
+
+        if not trees:
+            self.report({'ERROR_INVALID_INPUT'},
+                        'No imported QSM selected.')
+            print('Cancelled.')
+            return {'CANCELLED'}
+
+        bpy.ops.object.select_all(action='DESELECT')
+
+        result, _ = move_to_libraries(self, context, trees)
+
+        return result
+
+
+# Operator for removing the entries of the geometry cache.
+class ClearGeometryCache(bpy.types.Operator):
+    """Remove the cached geometry from the cache directory"""
+
+    bl_idname = "qsm.clear_geometry_cache"
+    bl_label = "Clear geometry cache"
+
+    def execute(self, context):
+
+        geometry_cache(context).clear()
+
+        return {'FINISHED'}
+
+
+# Interval of reading the rows appended to followed QSM files, in
+# seconds.
+FOLLOW_INTERVAL = 1.0
+
+# Maximum number of cylinders in each object of a followed file. New
+# rows are added to the last object until it is full, so that the cost
+# of reading new rows does not grow with the size of the file.
+FOLLOW_OBJECT_SIZE = 50000
+
+# Name of the last object of each followed tree and the cylinder table
+# of the object, by the name of the tree parent.
+follow_tails = {}
+
+
+# Operator for following a QSM TXT-file while it is being written. The
+# rows appended to the file are read on a timer, and their geometry is
+# added to the tree, without reading the earlier rows again. Inherits
+# the mesh and curve creation of the import operator.
+class FollowQSMFile(ImportQSM):
+    """Import the QSM input file and keep adding the rows appended to it, or stop following. Each second, the mesh of the last object, with up to 50000 cylinders, is rebuilt with the new rows. Files with a tree index column can not be followed"""
+
+    bl_idname = "qsm.follow_file"
+    bl_label = "Follow file"
+
+    # Flag: read the rows appended to the followed files, instead of
+    # starting or stopping to follow.
+    update: bpy.props.BoolProperty(default=False,
+                                   options={'HIDDEN', 'SKIP_SAVE'})
+
+    def execute(self, context):
+
+        # Phases of the mesh creation are not reported.
+        self.profiler = ImportProfiler()
+
+        if self.update:
+            return self.follow_update(context)
+
+        # Stop following.
+        followed = [ob for ob in context.scene.objects if "QsmFollow" in ob]
+
+        if followed:
+            for ob in followed:
+                del ob["QsmFollow"]
+                follow_tails.pop(ob.name, None)
+
+            self.report({'INFO'}, 'Stopped following.')
+            return {'FINISHED'}
+
+        return self.follow_start(context)
+
+    # Create the parent of a followed tree, read the current rows of
+    # the file, and start reading appended rows on a timer.
+    def follow_start(self, context):
+
+        settings = context.scene.qsmImportSettings
+
+        # Convert to absolute path.
+        file_path = bpy.path.abspath(settings.qsm_file_path)
+
+        # Check that file exists.
+        if not os.path.isfile(file_path):
+            self.report({'ERROR_INVALID_INPUT'},
+                        'No file with given path.')
+            print('Cancelled.')
+            return {'CANCELLED'}
+
+        # Only text rows can be read from an offset.
+        if detect_compression(file_path) or \
+           is_binary_qsm_file(file_path) or mat_file_version(file_path):
+            self.report({'ERROR_INVALID_INPUT'},
+                        'Only uncompressed TXT-files can be followed.')
+            print('Cancelled.')
+            return {'CANCELLED'}
+
+        # Branch-level curves need the complete branches.
+        mode = settings.qsmImportMode
+        if mode == 'bezier_branch':
+            self.report({'ERROR_INVALID_INPUT'},
+                        'Branch-level curves can not be followed.')
+            print('Cancelled.')
+            return {'CANCELLED'}
+
+        # The rows of all trees would be added to a single tree.
+        if settings.qsmTreeIdColumn:
+            self.report({'ERROR_INVALID_INPUT'},
+                        'Files with a tree index column can not be '
+                        'followed.')
+            print('Cancelled.')
+            return {'CANCELLED'}
+
+        # Minimum and maximum vertex count in cylinder rings.
+        vmin = max(settings.qsmVertexCountMin, 3)
+        vmax = max(settings.qsmVertexCountMax, vmin)
+
+        # Parent of the followed tree.
+        TreeParent = self.createQSMParent(context.collection)
+
+        # Bevel object of the curves.
+        bevel = ''
+        if mode == 'bezier_cylinder':
+            BevelObject = self.getBevelObject(context, TreeParent)
+
+            if not BevelObject:
+                bpy.data.objects.remove(TreeParent)
+                print('Cancelled.')
+                return {'CANCELLED'}
+
+            bevel = BevelObject.name
+
+        # File, read position and import settings of the tree.
+        TreeParent["QsmFollow"] = {'file': file_path,
+                                   'offset': 0,
+                                   'rows': 0,
+                                   'tree_column': False,
+                                   'mode': mode,
+                                   'vmin': vmin,
+                                   'vmax': vmax,
+                                   'radius': [0.0, 0.0],
+                                   'bevel': bevel,
+                                   'error': -1}
+
+        self.follow_update(context)
+
+        if not bpy.app.timers.is_registered(follow_files):
+            bpy.app.timers.register(follow_files,
+                                    first_interval=FOLLOW_INTERVAL)
+
+        return {'FINISHED'}
+
+    # Add the rows appended to the files of all followed trees.
+    def follow_update(self, context):
+
+        settings = context.scene.qsmImportSettings
+
+        if not settings.qsm_colormap_custom_name \
+           and len(settings.qsm_colormap_name) > 0:
+            colormap = settings.qsm_colormap_name
+        else:
+            colormap = 'Color'
+
+        # Materials of the new cylinders.
+        matStem = bpy.data.materials.get(settings.qsmStemMaterial)
+        matBranch = bpy.data.materials.get(settings.qsmBranchMaterial)
+
+        for TreeParent in [ob for ob in context.scene.objects
+                           if "QsmFollow" in ob]:
+            self.follow_tree(TreeParent, colormap, matStem, matBranch)
+
+        return {'FINISHED'}
+
+    # Read the rows appended to the file of a followed tree, and add
+    # them to the last object of the tree, or to a new object when the
+    # last one is full.
+    def follow_tree(self, TreeParent, colormap, matStem, matBranch):
+
+        follow = TreeParent["QsmFollow"]
+
+        signature = file_signature(follow['file'])
+        if signature is None:
+            return
+
+        # A file that became shorter has been rewritten, so the tree is
+        # read again from the beginning.
+        if signature[1] < follow['offset']:
+            remove_objects([ob for ob in TreeParent.children
+                            if ob.name != follow['bevel']])
+            follow_tails.pop(TreeParent.name, None)
+            follow['offset'] = 0
+            follow['rows'] = 0
+            follow['error'] = -1
+
+        # A row that can not be read, such as a row being rewritten, is
+        # read again on the next call. The error is reported once for
+        # each position.
+        try:
+            cyl, offset = read_appended_cylinders(follow['file'],
+                                                  follow['offset'],
+                                                  follow['tree_column'])
+        except ValueError as e:
+            if follow.get('error') != follow['offset']:
+                follow['error'] = follow['offset']
+                self.report({'WARNING'}, str(e))
+            return
+
+        # Number of new cylinders.
+        NCyl = len(cyl['radius'])
+
+        follow['offset'] = offset
+
+        if NCyl == 0:
+            return
+
+        # Index of each cylinder in the file.
+        cyl['id'] = follow['rows'] + np.arange(NCyl)
+
+        # Radius range of the rows read so far, which sets the vertex
+        # counts of the new cylinders.
+        radius = [float(cyl['radius'].min()), float(cyl['radius'].max())]
+        if follow['rows'] > 0:
+            radius = [min(radius[0], follow['radius'][0]),
+                      max(radius[1], follow['radius'][1])]
+
+        follow['radius'] = radius
+        follow['rows'] += NCyl
+
+        # Last object of the tree and its cylinders, unless full.
+        objname, tail = follow_tails.get(TreeParent.name, ('', None))
+        ob = bpy.data.objects.get(objname)
+
+        if ob is None or ob.parent != TreeParent or \
+           len(tail['radius']) + NCyl > FOLLOW_OBJECT_SIZE:
+            ob = None
+            tail = cyl
+        else:
+            tail = concatenate_cylinders([tail, cyl])
+
+        # Number the objects of the tree.
+        name = "qsm_" + str(len([c for c in TreeParent.children
+                                 if c.name != follow['bevel']]) + 1).zfill(3)
+
+        if follow['mode'] == 'mesh_cylinder':
+
+            # The mesh of the last object is rebuilt with the new rows.
+            geom = build_cylinder_geometry(tail,
+                                           follow['vmin'], follow['vmax'],
+                                           treeRadius=[radius])
+            materials, cylMat = cylinder_materials(tail['branch'],
+                                                   matStem, matBranch)
+
+            if ob is None:
+                data = self.createCylinderMesh(name + "_mesh", geom, tail,
+                                               0, len(tail['radius']),
+                                               colormap, materials, cylMat)
+            else:
+                old = ob.data
+                data = self.createCylinderMesh(old.name, geom, tail,
+                                               0, len(tail['radius']),
+                                               colormap, materials, cylMat)
+                ob.data = data
+
+                if old.users == 0:
+                    meshname = old.name
+                    bpy.data.meshes.remove(old)
+                    data.name = meshname
+
+        else:
+
+            # Splines of the new rows are added to the curve data.
+            if ob is None:
+                data = bpy.data.curves.new(name=name + "_curve",
+                                           type='CURVE')
+                data.dimensions = '3D'
+                data.bevel_object = bpy.data.objects.get(follow['bevel'])
+                data.use_fill_caps = True
+
+                if matStem:
+                    data.materials.append(matStem)
+                if matBranch and matStem != matBranch:
+                    data.materials.append(matBranch)
+            else:
+                data = ob.data
+
+            points = bezier_cylinder_points(cyl['start'], cyl['axis'],
+                                            cyl['length'], cyl['radius'])
+
+            for iCyl in range(NCyl):
+                self.addBezierCylinder(data, points, iCyl,
+                                       int(cyl['branch'][iCyl]),
+                                       matStem, matBranch)
+
+        # New object of the tree.
+        if ob is None:
+            ob = bpy.data.objects.new(name, data)
+            ob.parent = TreeParent
+
+            for collection in TreeParent.users_collection:
+                collection.objects.link(ob)
+
+        follow_tails[TreeParent.name] = (ob.name, tail)
+
+
+# Timer function adding the rows appended to followed QSM files. Returns
+# the time to the next call, or None to stop when no trees are followed.
+def follow_files():
+
+    if not any("QsmFollow" in ob for ob in bpy.context.scene.objects):
+        follow_tails.clear()
+        return None
+
+    run_in_window(bpy.ops.qsm.follow_file, update=True)
+
+    return FOLLOW_INTERVAL
+
+
+# Restart following after loading a file with followed trees. The last
+# objects are not extended, as their cylinders are not stored.
+@bpy.app.handlers.persistent
+def follow_load(dummy):
+    follow_tails.clear()
+    if any("QsmFollow" in ob for ob in bpy.context.scene.objects):
+        if not bpy.app.timers.is_registered(follow_files):
+            bpy.app.timers.register(follow_files,
+                                    first_interval=FOLLOW_INTERVAL)
+
+
+# Operator for converting a QSM TXT-file into the binary QSM format.
+class ConvertQSMBinary(bpy.types.Operator):
+    """Convert the QSM input file into a binary file that loads faster"""
+
+    bl_idname = "qsm.convert_binary"
+    bl_label = "Convert to binary"
+
+    # Main function of the conversion operator.
+    def execute(self, context):
+
+        # Current scene for properties.
+        scene = context.scene
+        settings = scene.qsmImportSettings
+
+        # Path to input file.
+        file_path = bpy.path.abspath(settings.qsm_file_path)
+
+        # Check that file exists.
+        if not os.path.isfile(file_path):
+            self.report({'ERROR_INVALID_INPUT'},
+                        'No file with given path.')
+            print('Cancelled.')
+            return {'CANCELLED'}
+
+        # Check that compressed file can be read.
+        msg = check_file_support(file_path)
+        if msg:
+            self.report({'ERROR_INVALID_INPUT'}, msg)
+            print('Cancelled.')
+            return {'CANCELLED'}
+
+        # Check that file is not already binary.
+        if is_binary_qsm_file(file_path):
+            self.report({'ERROR_INVALID_INPUT'},
+                        'Input file is already binary.')
+            return {'CANCELLED'}
+
+        # Output file next to the input file, without the extensions
+        # of the text and compression formats.
+        out_path = os.path.splitext(file_path)[0]
+        if detect_compression(file_path):
+            out_path = os.path.splitext(out_path)[0]
+        out_path += '.qsmb'
+
+        # Convert.
+        write_cylinder_binary(read_qsm_file(file_path,
+                                            settings.qsmTreeIdColumn),
+                              out_path)
+
+        # Use the new file as the input file.
+        settings.qsm_file_path = out_path
+
+        self.report({'INFO'}, 'Binary QSM written to ' + out_path)
+
+        return {'FINISHED'}
+
+
+# Operator for baking edited curve objects into their mesh objects.
+class BakeCurveMesh(bpy.types.Operator):
+    """Convert the selected curves into mesh objects used instead of the curves"""
+
+    bl_idname = "qsm.bake_curve_mesh"
+    bl_label = "Bake curve mesh"
+
+    # Main function of the bake operator.
+    def execute(self, context):
+
+        # Selected curve objects.
+        curves = [ob for ob in context.selected_objects
+                  if ob.type == 'CURVE']
+
+        if not curves:
+            self.report({'ERROR_INVALID_INPUT'},
+                        'No curve objects selected.')
+            return {'CANCELLED'}
+
+        for ob in curves:
+            bake_curve_mesh(context, ob)
+
+        self.report({'INFO'}, 'Baked ' + str(len(curves)) + ' curve(s).')
+
+        return {'FINISHED'}
+
+
+def min_update(self, context):
+    if self.__class__.__name__ == 'QsmImportSettings':
+
+        mi = context.scene.qsmImportSettings.qsmVertexCountMin
+        ma = context.scene.qsmImportSettings.qsmVertexCountMax
+
+        if mi > ma:
+            context.scene.qsmImportSettings.qsmVertexCountMax = mi
+
+    else:
+        mi = context.scene.leafModelImportSettings.growthGroupIntMin
+        ma = context.scene.leafModelImportSettings.growthGroupIntMax
+
+        if mi > ma:
+            context.scene.leafModelImportSettings.growthGroupIntMax = mi
+
+
+def max_update(self, context):
+    if self.__class__.__name__ == 'QsmImportSettings':
+
+        mi = context.scene.qsmImportSettings.qsmVertexCountMin
+        ma = context.scene.qsmImportSettings.qsmVertexCountMax
+
+        if mi > ma:
+            context.scene.qsmImportSettings.qsmVertexCountMin = ma
+
+    else:
+        mi = context.scene.leafModelImportSettings.growthGroupIntMin
+        ma = context.scene.leafModelImportSettings.growthGroupIntMax
+
+        if mi > ma:
+            context.scene.leafModelImportSettings.growthGroupIntMin = ma
+
+
+# Interval of polling the watched input files, in seconds.
+WATCH_INTERVAL = 0.5
+
+# Time that a changed file has to stay unchanged before it is reloaded,
+# in seconds, so that consecutive writes cause a single reload.
+WATCH_SETTLE = 1.0
+
+# Modification time and size of each watched file when it was last
+# loaded, and when it was last polled with the time of the last change.
+watch_state = {}
+
+
+# Modification time and size of a file, or None if it does not exist.
+def file_signature(file_path):
+
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return None
+
+    return (stat.st_mtime, stat.st_size)
+
+
+# Input files of a path, which can have wildcards. Grid index files
+# written next to the input files are not matched.
+def input_file_paths(file_path):
+
+    if not any(c in file_path for c in '*?['):
+        return [file_path]
+
+    return [f for f in sorted(glob.glob(file_path)) if not is_grid_index(f)]
+
+
+# Input files watched with the settings of a scene, as tuples of the
+# importer and the absolute path.
+def watched_files(scene):
+
+    files = []
+
+    settings = scene.qsmImportSettings
+
+    if settings.qsmWatchFile and settings.qsm_file_path:
+        file_path = bpy.path.abspath(settings.qsm_file_path)
+
+        files += [('qsm', f) for f in input_file_paths(file_path)]
+
+    settings = scene.leafModelImportSettings
+
+    if settings.leafWatchFile and settings.leaf_model_file_path:
+        files.append(('leaf',
+                      bpy.path.abspath(settings.leaf_model_file_path)))
+
+    return files
+
+
+# Run an operator from a timer, in the context of the first window if
+# there is one.
+def run_in_window(operator, **kwargs):
+
+    windows = bpy.context.window_manager.windows
+
+    if not windows:
+        return operator(**kwargs)
+
+    override = {'window': windows[0], 'screen': windows[0].screen}
 
-        return {'FINISHED'}
+    if hasattr(bpy.context, 'temp_override'):
+        with bpy.context.temp_override(**override):
+            return operator(**kwargs)
 
+    return operator(override, **kwargs)
 
-# Operator for updating the colourmap information of a mesh based QSM object,
-# without re-importing the geometry.
-class UpdateMeshQSMColorMap(bpy.types.Operator):
-    """Read colourmap values from file and update selected mesh object vertex colors"""
 
-    bl_idname = "qsm.update_colourmap"
-    bl_label = "Update colourmap"
+# Remove objects with their descendants, and their mesh and curve data
+# if not used by other objects.
+def remove_objects(objects, shared=None):
 
-    # Main function of the colourmap update operator.
-    def execute(self, context):
+    # A generated bevel object is kept while the curves of objects that
+    # are not removed use it, such as the trees of other files.
+    if shared is None:
+        removed = set()
+        stack = list(objects)
+        while stack:
+            ob = stack.pop()
+            removed.add(ob)
+            stack.extend(ob.children)
 
-        # Record start time to compute duration.
-        start = datetime.datetime.now()
+        shared = {ob.data.bevel_object for ob in bpy.data.objects
+                  if ob.type == 'CURVE' and ob not in removed}
 
-        # Current scene for properties.
-        scene = context.scene
-        settings = scene.qsmImportSettings
+    for ob in objects:
 
-        if not settings.qsm_colormap_custom_name \
-           and len(settings.qsm_colormap_name) > 0:
-            colormap = settings.qsm_colormap_name
-        else:
-            colormap = 'Color'
+        if ob in shared:
+            continue
 
-        # Object to update should be selected.
-        ob = bpy.context.selected_objects[0]
+        remove_objects(ob.children, shared)
 
-        # If no selection or selected object is not a mesh.
-        if not ob:
-            self.report({'ERROR_INVALID_INPUT'},
-                        'No object selected.')
-            return {'CANCELLED'}
-        elif ob.type != 'MESH':
-            self.report({'ERROR_INVALID_INPUT'},
-                        'Selected object is not a mesh.')
-            return {'CANCELLED'}
+        data = ob.data
+        fMesh = ob.type == 'MESH'
+        fCurve = ob.type == 'CURVE'
 
-        # Path to input file.
-        file_path = bpy.path.abspath(settings.qsm_file_path)
+        bpy.data.objects.remove(ob)
 
-        # Check that file exists.
-        if not os.path.isfile(file_path):
-            self.report({'ERROR_INVALID_INPUT'},
-                        'No file with given path.')
-            print('Cancelled.')
-            return {'CANCELLED'}
+        if data is not None and data.users == 0:
+            if fMesh:
+                bpy.data.meshes.remove(data)
+            elif fCurve:
+                bpy.data.curves.remove(data)
 
-        # Mesh data of selected object.
-        me = ob.data
-        # Create bmesh object for data modification.
-        bm = bmesh.new()
-        bm.from_mesh(me)
 
-        # Get integer layer that contains cylinder ID information,
-        # crucial for updating.
-        layer = bm.verts.layers.int.get("CylinderId")
+# Reload the trees of changed QSM files. Trees imported with branch
+# hashes are updated in place, so that only the changed branches are
+# rebuilt. Otherwise the trees of each changed file are replaced by a
+# new import of that file, while the trees of other files are kept.
+def reload_qsm(scene, changed):
 
-        # If layer does not exist, unable to update.
-        if not layer:
-            self.report({'ERROR_INVALID_INPUT'},
-                        'Selected object does not contain cylinder id info.')
-            return {'CANCELLED'}
+    for file_path in changed:
 
-        with open(file_path) as lines:
+        trees = [ob for ob in scene.objects if "QsmSource" in ob and
+                 ob["QsmSource"]['file'] == file_path]
 
-            # Count number of lines in file.
-            NLine = sum(1 for line in lines)
+        if trees and all("QsmUpdate" in ob for ob in trees):
+            print('Updating trees of', file_path)
+            run_in_window(bpy.ops.qsm.update_qsm, file_path=file_path)
+            continue
 
-            # Return to file beginning.
-            lines.seek(0)
+        print('Reloading', file_path)
 
-            # (Vector) array to hold colourmap values of each cylinder.
-            CylinderColors = []
+        # Tree index column of the earlier import.
+        if trees:
+            fTreeId = bool(trees[0]["QsmSource"]['tree_column'])
+        else:
+            fTreeId = scene.qsmImportSettings.qsmTreeIdColumn
 
-            # Iterate over file rows.
-            for iLine, line in enumerate(lines):
+        names = [ob.name for ob in trees]
 
-                # Split cylinder parameter on current row.
-                params = line.split()
+        remove_objects(trees)
+        run_in_window(bpy.ops.qsm.qsm_import, file_path=file_path,
+                      tree_column=fTreeId)
 
-                # Ignore rows with too few parameters.
-                if len(params) < 9:
-                    continue
+        # A single tree, such as a file of a wildcard import, keeps its
+        # name.
+        new = [ob for ob in scene.objects if "QsmSource" in ob and
+               ob["QsmSource"]['file'] == file_path]
 
-                # Display progress every 100th row.
-                if iLine == 0 or iLine % 100 == 1:
-                    msg = "Processing line %i of %i" % (iLine + 1, NLine)
-                    sys.stdout.write(msg + chr(8) * len(msg))
-                    sys.stdout.flush()
+        if len(names) == 1 and len(new) == 1:
+            new[0].name = names[0]
 
-                # Append new colourmap value to array.
-                if len(params) > 11:
-                    CylinderColors.append(Vector((
-                        float(params[9]),
-                        float(params[10]),
-                        float(params[11]),
-                        1.0
-                    )))
-                else:
-                    CylinderColors.append(float(params[9]))
 
-            # Get colour layer that holds colourmap data.
-            colors = bm.loops.layers.color.get(colormap)
-            # If layer does not exist, create new.
-            if not colors:
-                colors = bm.loops.layers.color.new(colormap)
+# Replace the leaf objects of a changed leaf model file.
+def reload_leaves(scene, file_path):
 
-            # Iterate over vertices in mesh.
-            for v in bm.verts:
+    print('Reloading', file_path)
 
-                # Cylinder index is read from CylinderId layer.
-                iCyl = v[layer]
+    remove_objects([ob for ob in scene.objects
+                    if ob.get("LeafSource") == file_path and
+                    (ob.parent is None or "LeafSource" not in ob.parent)])
 
-                # Update colour layer with new colour value.
-                for loop in v.link_loops:
-                    if not isinstance(CylinderColors[iCyl - 1], float):
-                        loop[colors] = CylinderColors[iCyl - 1]
-                    else:
-                        loop[colors] = [CylinderColors[iCyl - 1]] * 4
+    run_in_window(bpy.ops.leaf.import_leaves)
 
-        # Update mesh data.
-        bm.to_mesh(me)
-        # Free bmesh.
-        bm.free()
 
-        # Record end time.
-        end = datetime.datetime.now()
-        # Compute duration.
-        delta = end - start
-        # Format duration as string.
-        timestr = "{:.1f}".format(delta.total_seconds())
+# Timer function polling the watched input files. A file is reloaded
+# when its modification time or size has changed since it was loaded,
+# and has then stayed the same for the settle time. Returns the time
+# to the next call, or None to stop when no files are watched.
+def watch_files():
 
-        # Display import duration in the console.
-        sys.stdout.write("Processing finished in " +
-                         timestr + " sec" + " " * len(msg) + "\n")
-        sys.stdout.flush()
+    scene = bpy.context.scene
+    files = watched_files(scene)
 
-        return {'FINISHED'}
+    # Forget the files that are no longer watched.
+    for key in list(watch_state):
+        if key not in files:
+            del watch_state[key]
 
+    if not files:
+        return None
 
-def min_update(self, context):
-    if self.__class__.__name__ == 'QsmImportSettings':
+    now = time.monotonic()
 
-        mi = context.scene.qsmImportSettings.qsmVertexCountMin
-        ma = context.scene.qsmImportSettings.qsmVertexCountMax
+    # Watched files that changed and have settled.
+    changed = []
 
-        if mi > ma:
-            context.scene.qsmImportSettings.qsmVertexCountMax = mi
+    for key in files:
 
-    else:
-        mi = context.scene.leafModelImportSettings.growthGroupIntMin
-        ma = context.scene.leafModelImportSettings.growthGroupIntMax
+        signature = file_signature(key[1])
+        state = watch_state.get(key)
 
-        if mi > ma:
-            context.scene.leafModelImportSettings.growthGroupIntMax = mi
+        if state is None:
+            watch_state[key] = {'loaded': signature,
+                                'seen': signature,
+                                'time': now}
 
+        elif signature != state['seen']:
+            state['seen'] = signature
+            state['time'] = now
 
-def max_update(self, context):
-    if self.__class__.__name__ == 'QsmImportSettings':
+        elif signature is not None and signature != state['loaded'] and \
+                now - state['time'] >= WATCH_SETTLE:
+            state['loaded'] = signature
+            changed.append(key)
 
-        mi = context.scene.qsmImportSettings.qsmVertexCountMin
-        ma = context.scene.qsmImportSettings.qsmVertexCountMax
+    qsmChanged = [f for kind, f in changed if kind == 'qsm']
 
-        if mi > ma:
-            context.scene.qsmImportSettings.qsmVertexCountMin = ma
+    if qsmChanged:
+        reload_qsm(scene, qsmChanged)
 
-    else:
-        mi = context.scene.leafModelImportSettings.growthGroupIntMin
-        ma = context.scene.leafModelImportSettings.growthGroupIntMax
+    for kind, file_path in changed:
+        if kind == 'leaf':
+            reload_leaves(scene, file_path)
 
-        if mi > ma:
-            context.scene.leafModelImportSettings.growthGroupIntMin = ma
+    return WATCH_INTERVAL
+
+
+# Start polling the watched files, if not already polling.
+def watch_update(self, context):
+    if not bpy.app.timers.is_registered(watch_files):
+        bpy.app.timers.register(watch_files, first_interval=WATCH_INTERVAL)
+
+
+# Restart polling after loading a file with watched input files.
+@bpy.app.handlers.persistent
+def watch_load(dummy):
+    watch_state.clear()
+    if watched_files(bpy.context.scene):
+        watch_update(None, bpy.context)
 
 
 class QsmImportSettings(bpy.types.PropertyGroup):
@@ -2391,6 +4141,32 @@ class QsmImportSettings(bpy.types.PropertyGroup):
         description="Object that is asigned as the bevel object of each curve",
     )
 
+    # Flag: set the resolution of branch-level curves adaptively.
+    qsmAdaptiveResolution: bpy.props.BoolProperty(
+        name="Adaptive resolution",
+        description="If enabled the resolution of each branch curve is set from its curvature and radius, instead of its point count.",
+        default=False,
+        subtype='NONE',
+    )
+
+    # Error tolerance of adaptive curve resolution.
+    qsmResolutionTolerance: bpy.props.FloatProperty(
+        name="Tolerance",
+        default=0.001,
+        min=0.00001,
+        precision=5,
+        subtype='DISTANCE',
+        description="Maximum deviation of the curve surface from the smooth branch, in scene units",
+    )
+
+    # Flag: bake curves into meshes after import.
+    qsmBakeCurveMesh: bpy.props.BoolProperty(
+        name="Bake curve mesh",
+        description="If enabled the curves are converted into mesh objects used for display and rendering, and the curves are hidden until edited.",
+        default=False,
+        subtype='NONE',
+    )
+
     # Name of the stem material.
     qsmStemMaterial: bpy.props.StringProperty(
         name="Stem material",
@@ -2403,6 +4179,14 @@ class QsmImportSettings(bpy.types.PropertyGroup):
         description="Material to apply to branches after import"
     )
 
+    # Flag: first column of the input file is the tree index.
+    qsmTreeIdColumn: bpy.props.BoolProperty(
+        name="Tree index column",
+        description="If enabled the first column of the input file is the tree index, and each tree gets a separate parent.",
+        default=False,
+        subtype='NONE',
+    )
+
     # Flag: separate object for each branch.
     qsmSeparation: bpy.props.BoolProperty(
         name="Branch separation",
@@ -2411,14 +4195,118 @@ class QsmImportSettings(bpy.types.PropertyGroup):
         subtype='NONE',
     )
 
+    # Flag: spatial chunks of mesh cylinders.
+    qsmChunks: bpy.props.BoolProperty(
+        name="Spatial chunks",
+        description="Divide the mesh of each tree into separate objects by the grid cell of the cylinder centres.",
+        default=False,
+        subtype='NONE',
+    )
+
+    # Size of the spatial chunks.
+    qsmChunkSize: bpy.props.FloatProperty(
+        name="Chunk size",
+        default=2.0,
+        min=0.01,
+        subtype='DISTANCE',
+        description="Edge length of the grid cells of the mesh objects",
+    )
+
+    # Flag: store branch hashes of mesh objects.
+    qsmUpdateHashes: bpy.props.BoolProperty(
+        name="Allow update in place",
+        description="Store a hash of each branch on the mesh objects, so that the objects can be updated in place by rebuilding only the changed branches. Not used with spatial chunks, a region of interest or level of detail.",
+        default=False,
+        subtype='NONE',
+    )
+
+    # Flag: Morton order of mesh cylinders.
+    qsmMortonOrder: bpy.props.BoolProperty(
+        name="Spatial order",
+        description="Order the cylinders of each mesh along a Morton curve, for better cache locality and BVH quality in rendering.",
+        default=False,
+        subtype='NONE',
+    )
+
+    # Flag: distance-based level of detail.
+    qsmLod: bpy.props.BoolProperty(
+        name="Level of detail",
+        description="If enabled the detail of each tree is reduced with its distance from a camera.",
+        default=False,
+        subtype='NONE',
+    )
+
+    # Camera for the level of detail.
+    qsmLodCamera: bpy.props.StringProperty(
+        name="Camera",
+        description="Object whose distance to the trees sets their level of detail",
+    )
+
+    # Distance of full detail.
+    qsmLodNear: bpy.props.FloatProperty(
+        name="Near distance",
+        default=10.0,
+        min=0.0,
+        subtype='DISTANCE',
+        description="Trees closer than this distance are imported with full detail",
+    )
+
+    # Distance of lowest detail.
+    qsmLodFar: bpy.props.FloatProperty(
+        name="Far distance",
+        default=100.0,
+        min=0.0,
+        subtype='DISTANCE',
+        description="Trees farther than this distance are imported with the lowest detail",
+    )
+
+    # Radius of the thinnest branches kept in far trees.
+    qsmLodRadiusCutoff: bpy.props.FloatProperty(
+        name="Radius cutoff",
+        default=0.02,
+        min=0.0,
+        precision=4,
+        subtype='DISTANCE',
+        description="Cylinders thinner than this radius are removed from far trees, and thinner than a fraction of it from trees between the distances. Stem cylinders are always kept",
+    )
+
+    # Import mode of far trees.
+    qsmLodFarMode: bpy.props.EnumProperty(
+        name="Far trees",
+        description="Import mode of the trees farther than the far distance",
+        items=[
+            ("same",          "Same",          "Import mode of the other trees"),
+            ("mesh_cylinder", "Mesh cylinder", "Cylinder-level mesh elements"),
+            ("bezier_branch", "Bezier branch", "Branch-level Bezier curves"),
+            ("skip",          "Skip",          "Far trees are not imported"),
+        ]
+    )
+
     # Path to input file with cylinder parameters.
     qsm_file_path: bpy.props.StringProperty(
         name="Input file",
         default="",
-        description="TXT-file containing the cylinder parameters",
+        description="TXT-file, binary QSM file or TreeQSM MAT-file containing the cylinder parameters",
         subtype='FILE_PATH'
     )
 
+    # Flag: reload the trees when the input file changes.
+    qsmWatchFile: bpy.props.BoolProperty(
+        name="Reload on change",
+        description="Poll the input file and reload its trees when it changes. Trees imported with branch hashes are updated in place.",
+        default=False,
+        subtype='NONE',
+        update=watch_update,
+    )
+
+    # Flag: reuse the data of identical earlier imports.
+    qsmReuseData: bpy.props.BoolProperty(
+        name="Reuse identical imports",
+        description="When the same file content is imported again with the same settings, create a new parent with linked duplicates of the earlier objects instead of building the geometry again. Not used with a region of interest or level of detail.",
+        default=True,
+        subtype='NONE',
+    )
+
     # Minimum cylinder ring vertex count.
     qsmVertexCountMin: bpy.props.IntProperty(
         name="Vertex count minimum",
@@ -2478,6 +4366,23 @@ class LeafModelImportSettings(bpy.types.PropertyGroup):
         subtype='FILE_PATH',
     )
 
+    # Flag: reload the leaves when the input file changes.
+    leafWatchFile: bpy.props.BoolProperty(
+        name="Reload on change",
+        description="Poll the input file and replace the imported leaves when it changes.",
+        default=False,
+        subtype='NONE',
+        update=watch_update,
+    )
+
+    # Flag: reuse the data of identical earlier imports.
+    leafReuseData: bpy.props.BoolProperty(
+        name="Reuse identical imports",
+        description="When the same file content is imported again with the same settings, create a new parent with linked duplicates of the earlier leaf objects instead of building the geometry again. Not used with a region of interest.",
+        default=True,
+        subtype='NONE',
+    )
+
     # Name of the leaf material.
     leafModelMaterial: bpy.props.StringProperty(
         name="Material",
@@ -2569,6 +4474,76 @@ class LeafModelImportSettings(bpy.types.PropertyGroup):
         subtype='UNSIGNED',
     )
 
+    # Flag: leaf decimation.
+    leafDecimation: bpy.props.BoolProperty(
+        name="Decimate leaves",
+        description="Import a subset of the leaves, scaled up to preserve the leaf area of each twig or voxel.",
+        default=False,
+        subtype='NONE',
+    )
+
+    # Leaf decimation strata.
+    leafDecimationMode: bpy.props.EnumProperty(
+        name="Strata",
+        description="Groups of leaves that are decimated separately",
+        items=[
+            ("twig",  "Twig",  "Leaves of the same twig"),
+            ("voxel", "Voxel", "Leaves starting in the same voxel"),
+        ]
+    )
+
+    # Leaf decimation ratio.
+    leafDecimationRatio: bpy.props.IntProperty(
+        name="Ratio",
+        default=4,
+        min=1,
+        max=1000,
+        description="One in this many leaves of each twig or voxel is kept",
+        subtype='UNSIGNED',
+    )
+
+    # Voxel size of leaf decimation.
+    leafDecimationCell: bpy.props.FloatProperty(
+        name="Voxel size",
+        default=0.5,
+        min=0.001,
+        subtype='DISTANCE',
+        description="Edge length of the voxels of leaf decimation",
+    )
+
+    leafDecimationSeed: bpy.props.IntProperty(
+        name="Decimation seed",
+        default=0,
+        min=0,
+        description="Seed for the random selection of the kept leaves",
+        subtype='UNSIGNED',
+    )
+
+    # Flag: spatial chunks of leaves.
+    leafChunks: bpy.props.BoolProperty(
+        name="Spatial chunks",
+        description="Divide the leaves into separate objects by the grid cell of their start point.",
+        default=False,
+        subtype='NONE',
+    )
+
+    # Size of the spatial chunks of leaves.
+    leafChunkSize: bpy.props.FloatProperty(
+        name="Chunk size",
+        default=2.0,
+        min=0.01,
+        subtype='DISTANCE',
+        description="Edge length of the grid cells of the leaf objects",
+    )
+
+    # Flag: Morton order of leaves.
+    leafMortonOrder: bpy.props.BoolProperty(
+        name="Spatial order",
+        description="Order the leaves of each object along a Morton curve, for better cache locality and BVH quality in rendering.",
+        default=False,
+        subtype='NONE',
+    )
+
     # Leaf UV
 
     # Flag: generate UV map for leaves.
@@ -2598,6 +4573,140 @@ class LeafModelImportSettings(bpy.types.PropertyGroup):
     )
 
 
+class ImportProfileSettings(bpy.types.PropertyGroup):
+
+    # Flag: record memory use of import phases.
+    profileMemory: bpy.props.BoolProperty(
+        name="Record memory use",
+        description="Record the change of memory use in each import phase with tracemalloc. Slows down the import.",
+        default=False,
+        subtype='NONE',
+    )
+
+    # Flag: profile function calls with cProfile.
+    profileCalls: bpy.props.BoolProperty(
+        name="Profile function calls",
+        description="Profile function calls with cProfile. Statistics are written next to the report file, or displayed in the console.",
+        default=False,
+        subtype='NONE',
+    )
+
+    # Path to the JSON report file.
+    profileFilePath: bpy.props.StringProperty(
+        name="Report file",
+        default="",
+        description="JSON-file to write the import profile report to",
+        subtype='FILE_PATH'
+    )
+
+    # Flag: debug the expensive import functions.
+    debugMode: bpy.props.BoolProperty(
+        name="Debug mode",
+        description="Profile the function calls and allocations of the geometry generation functions. Slows down the import considerably.",
+        default=False,
+        subtype='NONE',
+    )
+
+    # Path to the debug report file.
+    debugFilePath: bpy.props.StringProperty(
+        name="Debug report file",
+        default="",
+        description="Text file to write the debug report to. If empty, the report is displayed in the console",
+        subtype='FILE_PATH'
+    )
+
+
+class LibrarySettings(bpy.types.PropertyGroup):
+
+    # Directory of the tree library files.
+    libraryDir: bpy.props.StringProperty(
+        name="Directory",
+        description="Directory of the library blend files of the trees. A relative path is relative to the current blend file",
+        default="//trees/",
+        subtype='DIR_PATH',
+    )
+
+    # Flag: move imported trees into library files.
+    libraryOnImport: bpy.props.BoolProperty(
+        name="Import to libraries",
+        description="Write each imported tree into its own library file, and link it into the scene as a collection instance.",
+        default=False,
+        subtype='NONE',
+    )
+
+
+class CacheSettings(bpy.types.PropertyGroup):
+
+    # Flag: cache the tables read from input files.
+    cacheEnabled: bpy.props.BoolProperty(
+        name="Cache input files",
+        description="Keep the tables read from the input files in memory, so that later imports, updates and regenerations of unchanged files do not read them again.",
+        default=True,
+        subtype='NONE',
+    )
+
+    # Memory limit of the cache.
+    cacheSize: bpy.props.IntProperty(
+        name="Size (MB)",
+        default=512,
+        min=1,
+        description="Maximum memory use of the cached tables. The least recently used tables are removed first",
+    )
+
+    # Flag: cache generated geometry on disk.
+    geometryCacheEnabled: bpy.props.BoolProperty(
+        name="Cache geometry",
+        description="Store the generated mesh cylinder and leaf geometry on disk, and load it when the same geometry is imported again, also in later sessions",
+        default=False,
+        subtype='NONE',
+    )
+
+    # Directory of the geometry cache.
+    geometryCacheDir: bpy.props.StringProperty(
+        name="Directory",
+        description="Directory of the geometry cache. If empty, a directory in the temporary directory of the system is used",
+        default="",
+        subtype='DIR_PATH',
+    )
+
+    # Disk space limit of the geometry cache.
+    geometryCacheSize: bpy.props.IntProperty(
+        name="Size (GB)",
+        default=4,
+        min=1,
+        description="Maximum disk space of the geometry cache. The least recently used geometry is removed first",
+    )
+
+
+class RegionSettings(bpy.types.PropertyGroup):
+
+    # Region type.
+    regionMode: bpy.props.EnumProperty(
+        name="Region",
+        description="Region of the cylinders and leaves to import",
+        items=[
+            ("none",   "All",    "Import all cylinders and leaves"),
+            ("box",    "Box",    "Bounding box of an object"),
+            ("sphere", "Sphere", "Sphere around the bounding box of an object"),
+            ("camera", "Camera", "View frustum of a camera"),
+        ]
+    )
+
+    # Object defining the region.
+    regionObject: bpy.props.StringProperty(
+        name="Object",
+        description="Object whose bounding box or camera view is the region of interest",
+    )
+
+    # Flag: store a spatial index next to the input file.
+    regionIndex: bpy.props.BoolProperty(
+        name="Spatial index",
+        description="If enabled a grid index is stored next to the input file, and later imports test only the cylinders or leaves near the region.",
+        default=False,
+        subtype='NONE',
+    )
+
+
 def register():
 
     # QSM settings class.
@@ -2606,6 +4715,18 @@ def register():
     # Leaf model settings class.
     bpy.utils.register_class(LeafModelImportSettings)
 
+    # Profiling settings class.
+    bpy.utils.register_class(ImportProfileSettings)
+
+    # Region settings class.
+    bpy.utils.register_class(RegionSettings)
+
+    # Cache settings class.
+    bpy.utils.register_class(CacheSettings)
+
+    # Library settings class.
+    bpy.utils.register_class(LibrarySettings)
+
     # Pointer to store all QSM import settings.
     bpy.types.Scene.qsmImportSettings = bpy.props.PointerProperty(
         type=QsmImportSettings
@@ -2616,10 +4737,45 @@ def register():
         type=LeafModelImportSettings
     )
 
+    # Pointer to store profiling settings shared by the importers.
+    bpy.types.Scene.importProfileSettings = bpy.props.PointerProperty(
+        type=ImportProfileSettings
+    )
+
+    # Pointer to store region settings shared by the importers.
+    bpy.types.Scene.regionSettings = bpy.props.PointerProperty(
+        type=RegionSettings
+    )
+
+    # Pointer to store cache settings shared by the importers.
+    bpy.types.Scene.cacheSettings = bpy.props.PointerProperty(
+        type=CacheSettings
+    )
+
+    # Pointer to store tree library settings.
+    bpy.types.Scene.librarySettings = bpy.props.PointerProperty(
+        type=LibrarySettings
+    )
+
     # Register classes.
 
     # Update colourmap operator.
     bpy.utils.register_class(UpdateMeshQSMColorMap)
+    # Update in place operator.
+    bpy.utils.register_class(UpdateQSM)
+    # File following operator.
+    bpy.utils.register_class(FollowQSMFile)
+    # Regenerate operator.
+    bpy.utils.register_class(RegenerateQSM)
+    # Cache clearing operators.
+    bpy.utils.register_class(ClearTableCache)
+    bpy.utils.register_class(ClearGeometryCache)
+    # Library operator.
+    bpy.utils.register_class(MoveToLibrary)
+    # Binary conversion operator.
+    bpy.utils.register_class(ConvertQSMBinary)
+    # Curve baking operator.
+    bpy.utils.register_class(BakeCurveMesh)
     # QSM import operator.
     bpy.utils.register_class(ImportQSM)
     # Leaf import operator.
@@ -2628,21 +4784,67 @@ def register():
     bpy.utils.register_class(QSMPanel)
     # Leaf panel.
     bpy.utils.register_class(LeafModelPanel)
+    # Profiling panel.
+    bpy.utils.register_class(ImportProfilePanel)
+    # Region panel.
+    bpy.utils.register_class(RegionPanel)
+    # Cache panel.
+    bpy.utils.register_class(CachePanel)
+    # Library panel.
+    bpy.utils.register_class(LibraryPanel)
+
+    # Restart file watching and following after loading a blend file.
+    bpy.app.handlers.load_post.append(watch_load)
+    bpy.app.handlers.load_post.append(follow_load)
 
 
 def unregister():
+    # Stop file watching.
+    if watch_load in bpy.app.handlers.load_post:
+        bpy.app.handlers.load_post.remove(watch_load)
+
+    if bpy.app.timers.is_registered(watch_files):
+        bpy.app.timers.unregister(watch_files)
+
+    # Stop file following.
+    if follow_load in bpy.app.handlers.load_post:
+        bpy.app.handlers.load_post.remove(follow_load)
+
+    if bpy.app.timers.is_registered(follow_files):
+        bpy.app.timers.unregister(follow_files)
+
     # Delete custom properties from scene.
     del bpy.types.Scene.qsmImportSettings
     del bpy.types.Scene.leafModelImportSettings
+    del bpy.types.Scene.importProfileSettings
+    del bpy.types.Scene.regionSettings
+    del bpy.types.Scene.cacheSettings
+    del bpy.types.Scene.librarySettings
 
     # Unregister classes.
+    bpy.utils.unregister_class(LibraryPanel)
+    bpy.utils.unregister_class(CachePanel)
+    bpy.utils.unregister_class(RegionPanel)
+    bpy.utils.unregister_class(ImportProfilePanel)
     bpy.utils.unregister_class(LeafModelPanel)
     bpy.utils.unregister_class(QSMPanel)
+    bpy.utils.unregister_class(MoveToLibrary)
+    bpy.utils.unregister_class(ClearGeometryCache)
+    bpy.utils.unregister_class(ClearTableCache)
+    bpy.utils.unregister_class(RegenerateQSM)
+    bpy.utils.unregister_class(FollowQSMFile)
+    bpy.utils.unregister_class(UpdateQSM)
     bpy.utils.unregister_class(ImportQSM)
     bpy.utils.unregister_class(UpdateMeshQSMColorMap)
+    bpy.utils.unregister_class(ConvertQSMBinary)
+    bpy.utils.unregister_class(BakeCurveMesh)
     bpy.utils.unregister_class(ImportLeafModel)
     bpy.utils.unregister_class(QsmImportSettings)
     bpy.utils.unregister_class(LeafModelImportSettings)
+    bpy.utils.unregister_class(ImportProfileSettings)
+    bpy.utils.unregister_class(RegionSettings)
+    bpy.utils.unregister_class(CacheSettings)
+    bpy.utils.unregister_class(LibrarySettings)
 
 
 if __name__ == "__main__":
@@ -17,12 +17,35 @@ import bpy
 import sys
 import os
 import math
-import copy
-import bmesh
-from mathutils import Vector, Matrix
+from mathutils import Vector
 import datetime
+import importlib.util
 import numpy as np
-from random import uniform, seed
+
+# Blender-independent parsing and geometry functions, shared with the
+# addon for newer Blender versions. The package is searched next to
+# this file, if it is not installed in the Blender modules directory.
+if importlib.util.find_spec('qsm_core') is None:
+    sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from qsm_core import (detect_compression,
+                      check_file_support,
+                      read_qsm_file,
+                      branch_bounds,
+                      cylinder_materials,
+                      build_cylinder_geometry,
+                      bezier_cylinder_points,
+                      bezier_branch_points,
+                      bezier_resolution,
+                      UV_SHAPES,
+                      read_ext_obj,
+                      read_base_vertices,
+                      leaf_geometry,
+                      leaf_colors,
+                      growth_anim_limits,
+                      growth_shape_keys,
+                      normalize_uv,
+                      leaf_uv_coordinates)
 
 bl_info = {
     "name": "Tree model (QSM) and leaf model (L-QSM) importer",
@@ -71,6 +94,70 @@ def print_progress(NLine, iLine, d, last):
     return last
 
 
+# Create a mesh from vertex coordinates, the vertex indices of the
+# loops, and the first loop and loop count of each polygon.
+def create_mesh(meshname, co, loop_vert, poly_start, poly_size):
+
+    # Create mesh and allocate elements.
+    me = bpy.data.meshes.new(meshname)
+    me.vertices.add(len(co))
+    me.loops.add(len(loop_vert))
+    me.polygons.add(len(poly_start))
+
+    # Set geometry.
+    me.vertices.foreach_set('co', np.ravel(co).astype(np.float32))
+    me.loops.foreach_set('vertex_index', loop_vert)
+    me.polygons.foreach_set('loop_start', poly_start)
+    me.polygons.foreach_set('loop_total', poly_size)
+
+    # Generate edges and update mesh data.
+    me.update(calc_edges=True)
+
+    return me
+
+
+# Bake the evaluated geometry of a curve object into a mesh object. The
+# mesh object is created next to the curve object on the first call, and
+# its mesh data is replaced on later calls. The curve object is hidden,
+# so that the viewport and renders use the baked mesh.
+def bake_curve_mesh(context, ob):
+
+    # Convert the evaluated curve into new mesh data.
+    me = ob.to_mesh(context.scene, True, 'PREVIEW')
+    me.name = ob.data.name + "_mesh"
+
+    # Mesh object of earlier bakes.
+    mesh_ob = bpy.data.objects.get(ob.get("BakedMesh", ""))
+
+    if mesh_ob is None or mesh_ob.type != 'MESH':
+
+        # Create object with the same parent and scenes.
+        mesh_ob = bpy.data.objects.new(ob.name + "_mesh", me)
+        mesh_ob.parent = ob.parent
+
+        for scene in ob.users_scene:
+            scene.objects.link(mesh_ob)
+
+        # Store the name of the mesh object on the curve object.
+        ob["BakedMesh"] = mesh_ob.name
+    else:
+
+        # Replace the old mesh data.
+        old = mesh_ob.data
+        mesh_ob.data = me
+
+        if old.users == 0:
+            bpy.data.meshes.remove(old)
+
+    mesh_ob.matrix_local = ob.matrix_local.copy()
+
+    # Hide the curve object.
+    ob.hide = True
+    ob.hide_render = True
+
+    return mesh_ob
+
+
 class QSMPanel(bpy.types.Panel):
     """Creates a Panel in the scene context of the properties editor"""
 
@@ -149,6 +236,19 @@ class QSMPanel(bpy.types.Panel):
                 row = layout.row()
                 row.prop_search(settings, "qsmBevelObject", scene, "objects")
 
+            # Mesh baking of the curves.
+            row = layout.row()
+            row.prop(settings, "qsmBakeCurveMesh")
+
+            # Adaptive resolution of branch-level curves.
+            if settings.qsmImportMode == 'bezier_branch':
+                row = layout.row()
+                row.prop(settings, "qsmAdaptiveResolution")
+
+                if settings.qsmAdaptiveResolution:
+                    row = layout.row()
+                    row.prop(settings, "qsmResolutionTolerance")
+
         layout.separator()
 
         # Colormap update button.
@@ -156,6 +256,11 @@ class QSMPanel(bpy.types.Panel):
             row = layout.row()
             row.operator("qsm.update_colourmap")
 
+        # Curve baking button.
+        if settings.qsmImportMode != 'mesh_cylinder':
+            row = layout.row()
+            row.operator("qsm.bake_curve_mesh")
+
         # Import buttons.
         row = layout.row()
         row.operator("qsm.qsm_import")
@@ -261,55 +366,6 @@ class ImportLeafModel(bpy.types.Operator):
     bl_idname = "leaf.import_leaves"
     bl_label = "Import leaf model"
 
-    def growth_anim_limits(self, NGroup, intMin, intMax, seedInt):
-    # Compute relative start and end times for animations with 
-    # random offsets.
-
-        # Initialize seed, for reproductability.
-        seed(seedInt)
-
-        # Minimum generated time.
-        minTime = 0
-        # Maximum generated time.
-        maxTime = 0
-
-        # List to store tuples of start and end times.
-        times = []
-
-        # Generate N pairs of times.
-        for iGroup in range(0, NGroup):
-
-            # Initial start times.
-            starttime = iGroup/NGroup
-
-            # If not the first group, compute random offset.
-            if iGroup > 0:
-                offset = uniform(intMin, intMax)
-
-                # Add offset to start time.
-                starttime += offset/100
-
-            # Start time is always the default.
-            endtime = (iGroup+1.0)/NGroup
-
-            # Update extreme values.
-            minTime = min(minTime, starttime, endtime)
-            maxTime = max(maxTime, starttime, endtime)
-
-            # Add new start-end time pair into list.
-            times.append([starttime, endtime])
-
-        # Compute full animation length from extreme values for scaling.
-        fullTime = maxTime - minTime
-
-        # Scale all values onto interval [0, 1].
-        for i, time in enumerate(times):
-            for j, t in enumerate(time):
-                times[i][j] = (t - minTime)/fullTime
-
-        # Return a dict with the generated times as a field.
-        return {'times': times}
-
     def import_obj(self, file_path):
 
         # Use built-in OBJ-importer with fixed parameters.
@@ -334,456 +390,190 @@ class ImportLeafModel(bpy.types.Operator):
     def import_ext_obj(self, file_path, fShapeKeyGeneration,
                        fVertexColor, color_mode, animParam):
 
-        # Array of base vertices.
-        base_vert = []
-        # Array of base faces.
-        base_face = []
-
-        # Flag: vertex addition completed.
-        fVertDone = False
-        # Flag: face addition completed.
-        fFaceDone = False
-        # Flag: read vertex colors from file.
-        fFromFile = False
-        # Flag: randomize vertex colors.
-        fRandomColor = False
-        # Flag: print progress.
-        fPrintProgress = False
-
-        # Number of added base vertices.
-        NVert = 0
-        # Number of added face vertices.
-        NFace = 0
-        # Number of added leaves.
-        NLeaf = 0
-        # Number of missing color data.
-        NMissingColor = 0
-
-        # Resulting object.
-        ob = None
-
         # Name of shape key for growth animation.
         GrowthName = 'ReverseGrowth'
 
-        # Set boolean flags for simplicity.
-        if color_mode == 'from_file':
-            fFromFile = True
-        elif color_mode == 'random':
-            fRandomColor = True
-        else:
-            # Otherwise, ensure that vertex colors are not
-            # added if color mode is unknown.
+        # Ensure that vertex colors are not added if color mode is
+        # unknown.
+        if color_mode not in ('from_file', 'random'):
             fVertexColor = False
 
-        if fShapeKeyGeneration:
-
-            # Store twig start points.
-            growthOrigin = []
-            # Store index of twig start point for each vertex.
-            IGrowthOrigin = []
-
-        with open(file_path) as lines:
-
-            # Number of lines in input file.
-            NLine = sum(1 for line in lines)
-
-            # Last displayed percentage.
-            PLast = 0
-
-            # Return to file beginning for second iteration.
-            lines.seek(0)
-
-            # Iterate over rows in input file.
-            for iLine, line in enumerate(lines):
-
-                # Split row into parameters.
-                params = line.split(' ', 1)
-
-                # Ignore rows with too few parameters.
-                if len(params) < 2:
-                    continue
-
-                if fPrintProgress:
-                    # Print progress in the console every nth row.
-                    PLast = print_progress(NLine, iLine, 10, PLast)
-
-                # Type of line.
-
-                # Base vertex.
-                if params[0] == 'v':
-
-                    # If vertex adding has been closed,
-                    # ignore further vertex lines.
-                    if fVertDone:
-                        continue
-
-                    # Get vertex coordinates.
-                    co = params[1].split()
-
-                    # Should have three coordinates.
-                    if len(co) != 3:
-                        continue
-
-                    # Append new base vertex.
-                    base_vert.append(np.array([float(co[0]),
-                                               float(co[1]),
-                                               float(co[2])]))
-
-                    # Increase base vertex count.
-                    NVert += 1
-
-                # Base face.
-                elif params[0] == 'f':
-
-                    # If face adding has been closed,
-                    # ignore further face lines.
-                    if fFaceDone:
-                        continue
+        # Read base geometry and leaf parameters.
+        try:
+            base, leaves = read_ext_obj(file_path)
+        except ValueError as e:
+            self.report({'ERROR_INVALID_INPUT'}, str(e))
+            return []
 
-                    # Close vertex adding.
-                    if not fVertDone:
-                        fVertDone = True
+        # Number of leaves.
+        NLeaf = len(leaves['start'])
 
-                    # Indices of face vertices.
-                    ind = params[1].split()
+        # Return empty array if no object can be created.
+        if NLeaf == 0:
+            return []
 
-                    # Faces have to have at least three vertices.
-                    if len(ind) < 3:
-                        continue
+        # Compute geometry of all leaves.
+        geom = leaf_geometry(base, leaves)
 
-                    # Append new face.
-                    base_face.append(np.array([int(x) - 1 for x in ind]))
+        # Create mesh and object.
+        me = create_mesh('LeafModel', geom['co'], geom['loop_vert'],
+                         geom['poly_start'], geom['poly_size'])
+        ob = bpy.data.objects.new('LeafModel', me)
 
-                    # Increase base face count.
-                    NFace += 1
+        # Assign the colour of each leaf to its loops.
+        if fVertexColor:
 
-                # Leaf transformation parameters.
-                elif params[0] == 'L':
+            NMissingColor = np.count_nonzero(~leaves['has_color'])
 
-                    # Close vertex and face adding.
-                    if not fFaceDone:
-                        fFaceDone = True
-                        fVertDone = True
-
-                    # If no geometry, unable to create leaf.
-                    if NVert == 0 or NFace == 0:
-                        self.report({'ERROR_INVALID_INPUT'},
-                                    'Input file missing vertices or faces.')
-                        break
-
-                    # Transformation configuration.
-                    config = params[1].split()
-
-                    # Line should have at least 15 parameters.
-                    if len(config) < 15:
-                        print('L line has too few parameters:',len(config))
-                        continue
-
-                    # Increase leaf count.
-                    NLeaf += 1
-
-                    # Initialize object and mesh data, and optionally
-                    # shape key and color map layers.
-                    if NLeaf == 1:
-
-                        # Create mesh.
-                        me = bpy.data.meshes.new('LeafModel')
-
-                        # Create object.
-                        ob = bpy.data.objects.new('LeafModel', me)
-
-                        # Bmesh.
-                        bm = bmesh.new()
-
-                        if fVertexColor:
-                            # Create new layer for colourmap.
-                            cl = bm.loops.layers.color.new("Color")
-
-                    if fShapeKeyGeneration:
-
-                        # Start point of twig used for growth animation.
-                        twig_start = tuple([float(x) for x in config[0:3]])
-
-                    # Leaf parameters.
-                    leaf_start  = np.array([float(x) for x in config[3:6]])
-                    leaf_dir    = np.array([float(x) for x in config[6:9]])
-                    leaf_normal = np.array([float(x) for x in config[9:12]])
-                    leaf_scale  = np.array([float(x) for x in config[12:15]])
-
-                    # Get vertex color value if necessary.
-                    if fVertexColor:
-                        # Additional color elements should be present on line.
-                        if fFromFile:
-
-                            # Check that vertex color values are present 
-                            # in file. If not increse missing color count.
-                            if len(config) < 18:
-
-                                NMissingColor += 1
-                                # Set color as default (black).
-                                vert_color = [0.0, 0.0, 0.0]
-
-                            else:
-
-                                vert_color = [float(x) for x in config[15:18]]
-
-                        # Generate random 3-element array from
-                        # uniform distribution.
-                        elif fRandomColor:
-                            vert_color = [uniform(0, 1) for x in "rgb"]
-
-                    # Scaling.
-                    vert = np.multiply(base_vert, leaf_scale)
-
-                    # Coordinate change matrix.
-                    E = np.array([np.cross(leaf_normal, leaf_dir),
-                                  leaf_dir,
-                                  leaf_normal
-                                  ])
+            if color_mode == 'from_file' and NMissingColor > 0:
+                print('Color data missing from %d lines, replaced with default color' % NMissingColor)
 
-                    # Rotation.
-                    vert = np.dot(vert, E)
+            colors = leaf_colors(leaves, color_mode).astype(np.float32)
 
-                    # Transition.
-                    vert += leaf_start
+            layer = me.vertex_colors.new("Color")
+            layer.data.foreach_set('color',
+                                   colors[geom['loop_leaf']].ravel())
 
-                    # Added vertices.
-                    bm_vert = []
+        if fShapeKeyGeneration:
 
-                    # Add vertices to bmesh.
-                    for v in vert:
+            # Add default shape key.
+            ob.shape_key_add('Basis')
 
-                        # Add vertex.
-                        bv = bm.verts.new(tuple(v))
+            # List of extra shape keys.
+            ShapeKeys = []
 
-                        # Append to list.
-                        bm_vert.append(bv)
+            # Number of shape keys is set by user.
+            NGroup = len(animParam['times'])
 
-                    # Convert to numpy array for easy indexing.
-                    bm_vert = np.array(bm_vert)
+            # Generate new shape keys, where the leaves of the group are
+            # moved to the start points of their twigs.
+            for iGroup, co in enumerate(growth_shape_keys(geom['co'],
+                                                          geom['vert_leaf'],
+                                                          leaves['twig_start'],
+                                                          NGroup)):
 
-                    # Iterate over face indices in base.
-                    for f in base_face:
+                if NGroup == 1:
+                    SetName = GrowthName
+                else:
+                    SetName = GrowthName + '_Set_' + str(iGroup + 1)
+
+                # Use object-level method for adding new shape key layer.
+                sk = ob.shape_key_add(SetName)
+                sk.data.foreach_set('co', co.astype(np.float32).ravel())
+
+                ShapeKeys.append(sk)
+
+            # Name of custom property that drives all shape keys.
+            DriverName = 'Growth'
+
+            # Create custom property and set value.
+            me[DriverName] = 1.0
+
+            # Get custom property as variable.
+            rna = me.get('_RNA_UI')
+            if rna is None:
+                me['_RNA_UI'] = {}
+                rna = me['_RNA_UI']
+
+            # Set other custom property values.
+            rna[DriverName] = {
+                "description":"Growth progress driver. Controls shape key layers.",
+                "default": 1.0,
+                "min": 0.0,
+                "max": 1.0,
+                "soft_min": 0.0,
+                "soft_max": 1.0
+            }
+
+            # Modify each shape key.
+            for iGroup in range(NGroup):
+
+                # Relative start time of the growth animation
+                # in the interval [0,1].
+                starttime = animParam['times'][iGroup][0]
+
+                # Relative end time of the growth animation.
+                # Same interval.
+                endtime = animParam['times'][iGroup][1]
+
+                # If for some reason the start time is larger 
+                # than the end time, f-curve handles should be 
+                # reversed.
+                if starttime < endtime:
+                    fac = 1.0
+                else:
+                    fac = -1.0
 
-                        # Create new face to mesh.
-                        bf = bm.faces.new(tuple(bm_vert[f]))
+                # Relative length of the growth animation for this
+                # shape key.
+                timelen = fac*(endtime - starttime)
 
-                        # If vertex color information is present in the
-                        # input file add color layer and assign color
-                        # for each vertex.
-                        if fVertexColor:
-                            for loop in bf.loops:
-                                loop[cl] = vert_color
+                # Current shape key.
+                sk = ShapeKeys[iGroup]
 
-                    if fShapeKeyGeneration:
+                # Add driver to shape key value.
+                curve = sk.driver_add("value")
 
-                        # Store growth animation origin.
-                        growthOrigin.append(twig_start)
-                        # Store indices of origin for all new vertices.
-                        IGrowthOrigin.extend(
-                            [NLeaf - 1 for i in range(len(vert))]
-                        )
+                # Add two points to the curve controlling the
+                # driver.
+                curve.keyframe_points.add(2)
 
-                # Unknown line type.
-                else:
-                    continue
+                # Set first point at the shape key start time
+                # and the value to zero, i.e., growth not started.
+                curve.keyframe_points[0].co = (starttime, 0.0)
 
-            if NMissingColor > 0:
-                print('Color data missing from %d lines, replaced with default color' % NMissingColor)
+                # Set second point at shape key end time
+                # and the value to one, i.e., growth completed.
+                curve.keyframe_points[1].co = (endtime, 1.0)
 
-            if ob is not None:
 
-                # If shape keys are requested growth origins should be
-                # present also.
-                if fShapeKeyGeneration and IGrowthOrigin:
+                for p in curve.keyframe_points:
+                    # Set vector handles for curve points.
+                    # Handle length is 30 percent of the relative
+                    # growth length. Both handles are horizontal.
+                    p.handle_left = p.co \
+                        - Vector((fac*0.3*timelen, 0.0))
+                    p.handle_right = p.co \
+                        + Vector((fac*0.3*timelen, 0.0))
 
-                    # Add default shape key.
-                    ob.shape_key_add('Basis')
+                    # Set point interpolation to Bezier for smooth
+                    # transitions.
+                    p.interpolation = 'BEZIER'
 
-                    # List of extra shape keys.
-                    ShapeKeys = []
+                # Remove default modifiers.
+                if curve.modifiers:
+                    for iMod in range(len(curve.modifiers)):
+                        curve.modifiers.remove(curve.modifiers[iMod])
 
-                    # Number of shape keys is set by user.
-                    NGroup = len(animParam['times'])
-
-                    # Generate new shape keys.
-                    for iGroup in range(NGroup):
-
-                        if NGroup == 1:
-                            SetName = GrowthName
-                        else:
-                            SetName = GrowthName + '_Set_' + \
-                                str(iGroup + 1)
-
-
-                        # Use object-level method for adding new
-                        # shape key layer.
-                        ShapeKeys.append(
-                            ob.shape_key_add(SetName)
-                        )
-
-                    # Index of the previous growth origin,
-                    # used to check if leaf has changed.
-                    iPrev = IGrowthOrigin[0]
-
-                    # Index of the current leaf, determining the
-                    # index of the shape key to use.
-                    iLeaf = 1
-
-                    # Index of the shape key to use.
-                    iLeafGroup = 0
+                # Driver object.
+                driver = curve.driver
 
-                    # Bind bmesh to mesh.
-                    bm.to_mesh(me)
-                    bm.verts.ensure_lookup_table()
-
-                    # Name of custom property that drives all shape keys.
-                    DriverName = 'Growth'
-
-                    # Create custom property and set value.
-                    me[DriverName] = 1.0
-
-                    # Get custom property as variable.
-                    rna = me.get('_RNA_UI')
-                    if rna is None:
-                        me['_RNA_UI'] = {}
-                        rna = me['_RNA_UI']
-
-                    # Set other custom property values.
-                    rna[DriverName] = {
-                        "description":"Growth progress driver. Controls shape key layers.",
-                        "default": 1.0,
-                        "min": 0.0,
-                        "max": 1.0,
-                        "soft_min": 0.0,
-                        "soft_max": 1.0
-                    }
-
-                    # Modify each shape key.
-                    for iGroup in range(NGroup):
-
-                        # Relative start time of the growth animation
-                        # in the interval [0,1].
-                        starttime = animParam['times'][iGroup][0]
-
-                        # Relative end time of the growth animation.
-                        # Same interval.
-                        endtime = animParam['times'][iGroup][1]
-
-                        # If for some reason the start time is larger 
-                        # than the end time, f-curve handles should be 
-                        # reversed.
-                        if starttime < endtime:
-                            fac = 1.0
-                        else:
-                            fac = -1.0
-
-                        # Relative length of the growth animation for this
-                        # shape key.
-                        timelen = fac*(endtime - starttime)
-
-                        # Current shape key.
-                        sk = ShapeKeys[iGroup]
-
-                        # Add driver to shape key value.
-                        curve = sk.driver_add("value")
-
-                        # Add two points to the curve controlling the
-                        # driver.
-                        curve.keyframe_points.add(2)
-
-                        # Set first point at the shape key start time
-                        # and the value to zero, i.e., growth not started.
-                        curve.keyframe_points[0].co = (starttime, 0.0)
-
-                        # Set second point at shape key end time
-                        # and the value to one, i.e., growth completed.
-                        curve.keyframe_points[1].co = (endtime, 1.0)
-
-                        
-                        for p in curve.keyframe_points:
-                            # Set vector handles for curve points.
-                            # Handle length is 30 percent of the relative
-                            # growth length. Both handles are horizontal.
-                            p.handle_left = p.co \
-                                - Vector((fac*0.3*timelen, 0.0))
-                            p.handle_right = p.co \
-                                + Vector((fac*0.3*timelen, 0.0))
-
-                            # Set point interpolation to Bezier for smooth
-                            # transitions.
-                            p.interpolation = 'BEZIER'
-
-                        # Remove default modifiers.
-                        if curve.modifiers:
-                            for iMod in range(len(curve.modifiers)):
-                                curve.modifiers.remove(curve.modifiers[iMod])
-
-                        # Driver object.
-                        driver = curve.driver
-
-                        # Add new variable to drive relation.
-                        var = driver.variables.new()
-
-                        # Select the leaf model mesh as the variable.
-                        var.type = 'SINGLE_PROP'
-                        var.targets[0].id_type = 'MESH'
-                        var.targets[0].id = me
-
-                        # Custom property is the driving property.
-                        var.targets[0].data_path = '["' + DriverName + '"]'
-
-                        # Driver controls growth while shape keys are 
-                        # 'reverse' growth. Thus, reverse relation with
-                        # the 1 - var relation.
-                        driver.expression = '1 - ' + var.name
-
-                    # Iterate over vertices/growth origins.
-                    for iVert, iOrigin in enumerate(IGrowthOrigin):
-
-                        # Check if leaf has changed.
-                        if IGrowthOrigin[iVert] != iPrev:
-
-                            # Increase number of leaves.
-                            iLeaf += 1
-                            # Compute group index in which this leaf is
-                            # growing.
-                            iLeafGroup = (iLeaf - 1) % NGroup
-                            # Update index of previous growth origin.
-                            iPrev = IGrowthOrigin[iVert]
-
-
-                        # Go through shape key layers.
-                        for iGroup in range(NGroup):
-
-                            # If this leaf is part of the current growth
-                            # group, set new coordinate on shape key 
-                            # layer. Otherwise the same coordinate is
-                            # used by default.
-                            if iGroup == iLeafGroup:
-                                co = growthOrigin[iOrigin]
-                                ShapeKeys[iGroup].data[iVert].co = co
+                # Add new variable to drive relation.
+                var = driver.variables.new()
 
-                else:
-                    # Bind bmesh to mesh.
-                    bm.to_mesh(me)
+                # Select the leaf model mesh as the variable.
+                var.type = 'SINGLE_PROP'
+                var.targets[0].id_type = 'MESH'
+                var.targets[0].id = me
 
-                # Link object to scene.
-                scene = bpy.context.scene
-                scene.objects.link(ob)
+                # Custom property is the driving property.
+                var.targets[0].data_path = '["' + DriverName + '"]'
 
-                # Set as active and selected.
-                scene.objects.active = ob
-                ob.select = True
+                # Driver controls growth while shape keys are 
+                # 'reverse' growth. Thus, reverse relation with
+                # the 1 - var relation.
+                driver.expression = '1 - ' + var.name
 
-                # Return a list of objects for compatibility
-                # with OBJ-importer.
-                return [ob]
+        # Link object to scene.
+        scene = bpy.context.scene
+        scene.objects.link(ob)
 
-            else:
+        # Set as active and selected.
+        scene.objects.active = ob
+        ob.select = True
 
-                # Return empty array if no object was created.
-                return []
+        # Return a list of objects for compatibility with OBJ-importer.
+        return [ob]
 
     # Operator for importing leaf model.
     def execute(self, context):
@@ -812,6 +602,20 @@ class ImportLeafModel(bpy.types.Operator):
             print('Cancelled.')
             return {'CANCELLED'}
 
+        # Check that compressed file can be read.
+        msg = check_file_support(file_path)
+
+        # Built-in OBJ-importer does not read compressed files.
+        if not msg and settings.importType == 'obj' and \
+           detect_compression(file_path):
+            msg = 'Compressed files are only supported with the ' \
+                  'Extended OBJ format.'
+
+        if msg:
+            self.report({'ERROR_INVALID_INPUT'}, msg)
+            print('Cancelled.')
+            return {'CANCELLED'}
+
         # Check if UVs are to be generated.
         fUvGeneration = settings.leafUvGeneration
 
@@ -849,7 +653,7 @@ class ImportLeafModel(bpy.types.Operator):
                     intMax = settings.growthGroupIntMax
                     seedInt = settings.growthSeed
 
-                    animParam = self.growth_anim_limits(
+                    animParam = growth_anim_limits(
                         NGroup,
                         intMin,
                         intMax,
@@ -908,97 +712,33 @@ class ImportLeafModel(bpy.types.Operator):
 
             leafUvType = settings.leafUvType
 
-            if leafUvType == 'isosceles_triangle':
-                # UV vertex locations for a isosceles triangle.
-                uv_verts = [Vector((1, 0)), Vector((0.5, 1)), Vector((0, 0))]
-
-            elif leafUvType == 'square':
-                # UV vertex locations for a square.
-                uv_verts = [Vector((1, 0)),
-                            Vector((1, 1)),
-                            Vector((0, 1)),
-                            Vector((0, 0))]
+            if leafUvType in UV_SHAPES:
+                # UV vertex locations of a built-in shape.
+                uv_verts = UV_SHAPES[leafUvType]
 
             elif leafUvType == 'custom':
 
-                # Initialize array.
-                uv_verts = []
-
                 # Copy local (x,y)-coordinates of source mesh.
-                for v in UvSource.vertices:
-                    uv_verts.append(v.co.xy)
+                co = np.empty(3 * len(UvSource.vertices))
+                UvSource.vertices.foreach_get('co', co)
+                uv_verts = co.reshape(-1, 3)[:, :2]
 
             elif leafUvType == 'from_file':
 
-                # Initialize array.
-                uv_verts = []
-
-                NVert = 0
-
-                with open(file_path) as lines:
-
-                    # Iterate over rows in input file.
-                    for line in lines:
-
-                        # Split row into parameters.
-                        params = line.split(' ', 1)
-
-                        # Ignore rows with too few parameters.
-                        if len(params) < 2:
-                            continue
-
-                        # Type of line.
-
-                        # Base vertex.
-                        if params[0] == 'v':
-
-                            # Get vertex coordinates.
-                            co = params[1].split()
-
-                            # Should have three coordinates.
-                            if len(co) != 3:
-                                continue
-
-                            co = Vector([float(co[0]), float(co[1])])
-
-                            # Increase number of vertices.
-                            NVert += 1
-
-                            uv_verts.append(co)
-
-                        elif params[0] == 'f' or params[0] == 'L':
-                            break
+                # Local (x,y)-coordinates of the base vertices.
+                uv_verts = read_base_vertices(file_path)[:, :2]
 
             else:
                 # Otherwise, the selection is illegal.
                 self.report({'WARNING'},
                             'Unknown UV generation type selected. UV generation skipped.')
-                fSkipUv = True
-
-            # Number of vertices in input UV map.
-            NVert = len(uv_verts)
+                uv_verts = []
 
             # Scale uv coordinates to unit square.
-            if NVert > 0:
+            uv_verts = normalize_uv(uv_verts)
 
-                # Unitialize extreme values.
-                vert_min = copy.deepcopy(uv_verts[0])
-                vert_max = copy.deepcopy(uv_verts[0])
-
-                # Find extreme values.
-                for vert in uv_verts:
-                    for i in range(0, 2):
-                        vert_min[i] = min(vert_min[i], vert[i])
-                        vert_max[i] = max(vert_max[i], vert[i])
-
-                # Scale coordinates with extreme values.
-                for vert in uv_verts:
-                    for i in range(0, 2):
-                        vert[i] = vert[i] - vert_min[i]
-                        if vert_max[i] != vert_min[i]:
-                            vert[i] /= (vert_max[i] - vert_min[i])
-
-            
+            # Without UV vertices the coordinates can not be set.
+            fSkipUv = len(uv_verts) == 0
 
         # Iterate over selected objects.
         for obj in leaf_objects:
@@ -1016,40 +756,17 @@ class ImportLeafModel(bpy.types.Operator):
                 # Create new UV map.
                 me.uv_textures.new(MapName)
 
-                # Create a bmesh from mesh data for UV map manipulation.
-                bm = bmesh.new()
-                bm.from_mesh(me)
-
-                # Create UV layer.
-                uv_layer = bm.loops.layers.uv[0]
+                # Index of the vertex of each loop.
+                loop_vert = np.empty(len(me.loops), dtype=np.int32)
+                me.loops.foreach_get('vertex_index', loop_vert)
 
-                # Initialize lookup table.
-                bm.faces.ensure_lookup_table()
-
-                # Number of leaves.
-                NFace = len(bm.faces)
-
-                # Iterate over leaves.
-                for iFace in range(NFace):
-
-                    # Number of vertices in face.
-                    NFaceVert = len(bm.faces[iFace].loops)
-
-                    # Iterate over vertices in leaf.
-                    for iVert in range(NFaceVert):
-
-                        # Index of current vertex modulo set
-                        # number of vertices.
-                        uv_index = bm.faces[iFace].loops[iVert].vert.index \
-                            % NVert
-                        # Set UV map vertex to coordinate given
-                        # by above index.
-                        bm.faces[iFace].loops[iVert][uv_layer].uv = uv_verts[
-                            uv_index
-                        ]
-
-                # Update mesh data.
-                bm.to_mesh(me)
+                # Set UV coordinates of all loops, given by the vertex
+                # index modulo the number of UV vertices.
+                uv = leaf_uv_coordinates(loop_vert, uv_verts)
+                me.uv_layers[MapName].data.foreach_set(
+                    'uv',
+                    uv.astype(np.float32).ravel()
+                )
 
         # Record end time.
         end = datetime.datetime.now()
@@ -1086,31 +803,63 @@ class ImportQSM(bpy.types.Operator):
         # Return parent object.
         return EmptyParent
 
-    # Function to create mesh cylinder by copying the data
-    # of a base object, and then transforming it.
-    def addMeshCylinder(self, baseobj, cp, rot, h, r):
-
-        # Copy base object and data.
-        ob = baseobj.copy()
-        ob.data = baseobj.data.copy()
-
-        # Translate to center point.
-        ob.location = cp
-
-        # Scale to match cylinder radius and length.
-        ob.scale = (r, r, h)
-
-        # Set rotation.
-        ob.rotation_euler = rot
-
-        # Link new object to scene.
-        bpy.context.scene.objects.link(ob)
-
-        # Return new object.
-        return ob
+    # Function to create a mesh from the cylinders with indices
+    # [c0, c1), by slicing the global geometry arrays.
+    def createCylinderMesh(self, meshname, geom, cyl, c0, c1,
+                           colormap, materials, cylMat):
+
+        # Ranges of the cylinders in the global arrays.
+        v0, v1 = geom['vert_start'][c0], geom['vert_start'][c1]
+        l0, l1 = geom['loop_start'][c0], geom['loop_start'][c1]
+        p0, p1 = geom['poly_first'][c0], geom['poly_first'][c1]
+
+        # Create mesh with indices relative to the slice.
+        me = create_mesh(meshname,
+                         geom['co'][v0:v1],
+                         geom['loop_vert'][l0:l1] - v0,
+                         geom['poly_start'][p0:p1] - l0,
+                         geom['poly_size'][p0:p1])
+        me.polygons.foreach_set('use_smooth', geom['poly_smooth'][p0:p1])
+
+        # Store the cylinder index on the model, to allow updating
+        # vertex colours afterwards.
+        layer = me.vertex_layers_int.new(name="CylinderId")
+        layer.data.foreach_set('value',
+                               (geom['vert_cyl'][v0:v1] + 1).astype(np.int32))
+
+        # If vertex colour information is present in the input file
+        # add colour layer and assign colour for each loop. Vertex
+        # colours have no alpha component in this Blender version.
+        if cyl['has_color'][c0:c1].any():
+            colors = me.vertex_colors.new(name=colormap)
+            colors.data.foreach_set(
+                'color',
+                cyl['color'][geom['loop_cyl'][l0:l1], :3]
+                .astype(np.float32).ravel()
+            )
+
+        # Add the materials used by the cylinders, and set the material
+        # index of each polygon.
+        used = [m for m in range(len(materials))
+                if np.any(cylMat[c0:c1] == m)]
+
+        if used:
+            for m in used:
+                me.materials.append(materials[m])
+
+            # Map global material indices to the slots of this mesh.
+            slot = np.zeros(len(materials), dtype=np.int32)
+            slot[used] = np.arange(len(used))
+
+            me.polygons.foreach_set(
+                'material_index',
+                slot[np.maximum(cylMat[geom['poly_cyl'][p0:p1]], 0)]
+            )
+
+        return me
 
     # Function to import a QSM as mesh cylinders.
-    def import_as_mesh_cylinders(self, context, file_path, EmptyParent,
+    def import_as_mesh_cylinders(self, context, cyl, EmptyParent,
                                  fBranchSeparation,
                                  matStem, matBranch):
 
@@ -1126,84 +875,11 @@ class ImportQSM(bpy.types.Operator):
         else:
             colormap = 'Color'
 
-        # Number of imported branches.
-        NBranch = 0
-        # Index of last branch in input file.
-        iLastBranch = 0
-
-        # Flag: should the cylinder index be stored in a vertex layer.
-        # Allows updating vertex colour afterwards.
-        fIdColor = True
-
         # Minimum vertex count in cylinder rings.
         vmin = settings.qsmVertexCountMin
         # Maximum vertex count.
         vmax = settings.qsmVertexCountMax
 
-        # Number of different vertex counts.
-        vcount = vmax - vmin + 1
-
-        # Initialize list of base objects that will be copied for optimization.
-        baseobj = []
-
-        # Generate a base object for each vertex count.
-        for v in range(0, vcount):
-
-            # Number of vertices in the rings of the current
-            # base object cylinder.
-            nvert = vmin + v
-
-            # Add a cylinder primitive with the built-in operator.
-            bpy.ops.mesh.primitive_cylinder_add(vertices=nvert,
-                                                radius=1,
-                                                depth=1,
-                                                end_fill_type='NGON',
-                                                view_align=False,
-                                                enter_editmode=False,
-                                                location=(0.0, 0.0, 0.0),
-                                                rotation=(0.0, 0.0, 0.0))
-
-            # Get newly generated base object.
-            ob = context.selected_objects[0]
-            # Deselect.
-            ob.select = False
-
-            # Get mesh data of base object.
-            me = ob.data
-
-            # Translation vector.
-            point = Vector((0.0, 0.0, -0.5))
-
-            # Move base object so that the starting point is at the origin.
-            mat = Matrix.Translation(ob.matrix_world.translation - point)
-            me.transform(mat)
-
-            # Update mesh data.
-            me.update()
-            # Do opposite transition in object mode to get object
-            # origin corrected.
-            ob.matrix_world.translation = point
-
-            # Create bmesh object to set the shading of the envelope
-            # faces as smooth.
-            bm = bmesh.new()
-            bm.from_mesh(me)
-
-            # Iterate over the faces other than the last two which
-            # are the caps.
-            for f in bm.faces[-(nvert + 2):]:
-                if f.select:
-                    if len(f.verts) == 4:
-                        # Set shading smooth.
-                        f.smooth = True
-
-            # Update mesh data and delete bmesh.
-            bm.to_mesh(me)
-            bm.free()
-
-            # Add base object to list.
-            baseobj.append(ob)
-
         # Minimum vertex count must be at least three.
         if vmin < 3:
             vmin = 3
@@ -1212,256 +888,59 @@ class ImportQSM(bpy.types.Operator):
         if vmax < vmin:
             vmax = vmin
 
-        with open(file_path) as lines:
+        # Number of cylinders.
+        NCyl = len(cyl['radius'])
 
-            # File line count.
-            NLine = 0
+        # Compute geometry of all cylinders in one pass.
+        geom = build_cylinder_geometry(cyl, vmin, vmax)
 
-            # Last displayed percentage.
-            PLast = 0
+        # Materials to use, and the index of the material of each
+        # cylinder in the list, or -1 if no material.
+        materials, cylMat = cylinder_materials(cyl['branch'],
+                                               matStem, matBranch)
 
-            # Iterate through the file rows, recording the count and
-            # minimum and maximum radius values.
-            for line in lines:
-
-                # Increase counter.
-                NLine = NLine + 1
+        # Ranges of cylinders forming separate objects.
+        if fBranchSeparation:
+            bounds = branch_bounds(cyl['branch'], 0, NCyl)
+        else:
+            bounds = np.array([0, NCyl])
 
-                # Split file line into parameter array.
-                params = line.split()
+        # Number of digits to use in object naming.
+        NDigit = len(str(len(bounds) - 1))
 
-                # Ignore rows with too few parameters.
-                if len(params) < 9:
-                    continue
+        # Collect all created objects.
+        allobj = []
 
-                # Get radius parameter of row.
-                r = float(params[8])
+        # Create a mesh and an object for each range.
+        for iBranch in range(len(bounds) - 1):
 
-                # Initialize min and max on first row.
-                if NLine == 1:
-                    rmin = r
-                    rmax = r
-                else:
-                    # Update extremes if necessary.
-                    if r < rmin:
-                        rmin = r
-                    if r > rmax:
-                        rmax = r
-
-            # Number of digits to use in object naming.
-            NDigit = len(str(NLine))
-
-            # Return to file beginning for second iteration.
-            lines.seek(0)
-
-            # List of objects that are later joined to form either
-            # a branch or the full QSM.
-            allobj = []
-
-            # Index of current cylinder.
-            iCyl = 0
-
-            # Iterate over rows in input file.
-            for iLine, line in enumerate(lines):
-
-                # Split row into parameters.
-                params = line.split()
-
-                # Ignore rows with too few parameters.
-                if len(params) < 9:
-                    continue
-
-                # Increase number of cylinders.
-                iCyl += 1
-
-                # Print progress in the console every nth row.
-                PLast = print_progress(NLine, iLine, 10, PLast)
-
-                # Store parameters.
-                iBranch = int(float(params[0]))
-                sp = Vector((float(params[1]),
-                             float(params[2]),
-                             float(params[3])))
-                ax = Vector((float(params[4]),
-                             float(params[5]),
-                             float(params[6])))
-                h = float(params[7])
-                r = float(params[8])
-
-                # Convert axis to Euler rotation.
-                rot = ax.to_track_quat('Z', 'Y').to_euler()
-
-                # Select number of vertices based on linear
-                # interpolation of radius.
-                nvert = vmin + (vmax - vmin) * (r - rmin) / (rmax - rmin)
-                # Convert result to an integer by rounding.
-                nvert = int(round(nvert))
-
-                # Index of base object based on vertex count.
-                iObj = nvert - vmin
-
-                # Flag: file contains an additional row to use as
-                # colourmap values.
-                fVertColor = False
-                fVectorVertColor = False
-
-                # Check if extra column for colourmap exists.
-                if len(params) > 9:
-                    fVertColor = True
-                    if len(params) > 11:
-                        fVectorVertColor = True
-                        VertColor = Vector((float(params[9]),
-                                            float(params[10]),
-                                            float(params[11])))
-                    else:
-                        fVectorVertColor = False
-                        VertColor = float(params[9])
-
-                # If this is the first branch, or the index differs
-                # form the previous row.
-                if NBranch == 0 or iBranch != iLastBranch:
-
-                    # Update index of previous branch.
-                    iLastBranch = iBranch
-                    # Increase branch count.
-                    NBranch += 1
-
-                    # If multiple objects are created, use unique
-                    # object and mesh names by numbering them.
-                    if fBranchSeparation:
-                        meshname = "branch_" + str(NBranch).zfill(NDigit)
-                        objname = "branch_" + str(NBranch).zfill(NDigit)
-                    else:
-                        meshname = "qsm_mesh"
-                        objname = "qsm"
-
-                    # Start a new branch if this is the first one, or
-                    # if the user has selected to separate branches.
-                    if NBranch == 1 or fBranchSeparation:
-
-                        # If separate branches and not the first one.
-                        if NBranch > 1:
-
-                            # Select all objects in last branch.
-                            for ob in allobj:
-                                ob.select = True
-
-                            # Set one of them as active.
-                            scene.objects.active = allobj[0]
-                            # Join the objects.
-                            bpy.ops.object.join()
-                            # Apply object scale.
-                            bpy.ops.object.transform_apply(location=False,
-                                                           rotation=False,
-                                                           scale=True)
-                            # Deselect resulting object.
-                            allobj[0].select = False
-                            # Initialize array for next branch.
-                            allobj = []
-
-                        # Add current cylinder by copying and modifying
-                        # the base object.
-                        ob = self.addMeshCylinder(baseobj[iObj], sp, rot, h, r)
-
-                        # Set name and parent.
-                        ob.name = objname
-                        ob.parent = EmptyParent
-
-                        # Get mesh data.
-                        me = ob.data
-                        # Set mesh name.
-                        me.name = meshname
-
-                        # Add stem material to object if it is the first
-                        # branch, or if branch material is not set (same
-                        # material for all branches), and if stem material
-                        # is set.
-                        if iBranch == 1 or not matBranch:
-                            if matStem:
-                                me.materials.append(matStem)
-
-                        # Add branch material if material is set and it
-                        # is different from the stem material.
-                        if matBranch and (matStem != matBranch):
-                            me.materials.append(matBranch)
-
-                    # No need to change object even though the branch
-                    # index changed.
-                    else:
-                        ob = self.addMeshCylinder(baseobj[iObj], sp, rot, h, r)
-
-                # Still on same branch index.
-                else:
-                    ob = self.addMeshCylinder(baseobj[iObj], sp, rot, h, r)
-
-                # Add new object to list of cylinders in current branch.
-                allobj.append(ob)
-
-                # Get mesh data of new cylinder.
-                me = ob.data
-                # Create a bmesh object for colourmap creation from mesh data.
-                bm = bmesh.new()
-                bm.from_mesh(me)
-
-                # If cylinder ID should be stored on the model.
-                if fIdColor:
-                    # Get or create new layer for index colouring.
-                    layer = bm.verts.layers.int.get("CylinderId")
-                    if not layer:
-                        layer = bm.verts.layers.int.new("CylinderId")
-
-                    # Iterate over mesh vertices and set index colouring
-                    # value to index of the cylinder.
-                    for v in bm.verts:
-                        v[layer] = iCyl
-
-                # If vertex colour information is present in the input file
-                # add colour layer and assign colour for each vertex.
-                if fVertColor:
-                    # Get or create new layer for input colourmap.
-                    colors = bm.loops.layers.color.get(colormap)
-                    if not colors:
-                        colors = bm.loops.layers.color.new(colormap)
-
-                    # Iterate over vertices and set vertex colour by
-                    # repeating the input value three times.
-                    for v in bm.verts:
-                        for loop in v.link_loops:
-                            if fVectorVertColor:
-                                loop[colors] = VertColor
-                            else:
-                                loop[colors] = [VertColor] * 3
-
-                # Update mesh data and delete bmesh.
-                bm.to_mesh(me)
-                bm.free()
-
-            # Select all cylinders of last object.
-            for ob in allobj:
-                ob.select = True
+            # If multiple objects are created, use unique
+            # object and mesh names by numbering them.
+            if fBranchSeparation:
+                meshname = "branch_" + str(iBranch + 1).zfill(NDigit)
+                objname = "branch_" + str(iBranch + 1).zfill(NDigit)
+            else:
+                meshname = "qsm_mesh"
+                objname = "qsm"
 
-            # Set active object.
-            scene.objects.active = allobj[0]
+            me = self.createCylinderMesh(meshname, geom, cyl,
+                                         bounds[iBranch],
+                                         bounds[iBranch + 1],
+                                         colormap, materials, cylMat)
 
-            # Join all cylinders in list.
-            bpy.ops.object.join()
-            # Apply object scale.
-            bpy.ops.object.transform_apply(location=False,
-                                           rotation=False,
-                                           scale=True)
+            # Create object, set parent and link to scene.
+            ob = bpy.data.objects.new(objname, me)
+            ob.parent = EmptyParent
+            scene.objects.link(ob)
 
-        # As clean-up, remove the base objects and
-        # their mesh data.
-        for ob in baseobj:
-            scene.objects.unlink(ob)
-            bpy.data.objects.remove(ob)
+            allobj.append(ob)
 
-        return {'FINISHED'}
+        return allobj
 
     # Function to import a QSM as Bezier cylinders.
     def import_as_bezier_cylinders(self,
                                    context,
-                                   file_path,
+                                   cyl,
                                    EmptyParent,
                                    fBranchSeparation,
                                    matStem,
@@ -1478,235 +957,161 @@ class ImportQSM(bpy.types.Operator):
         # Index of last branch.
         iLastBranch = 0
 
-        # Length of right and left control handles.
-        len_r = 0.45
-        len_l = 0.45
-
-        with open(file_path) as lines:
-
-            # Count number of lines in file.
-            NLine = sum(1 for line in lines)
-
-            # Number of digits to use in object naming.
-            NDigit = len(str(NLine))
-
-            # If file did not have any lines.
-            if NLine <= 0:
-                self.report({'ERROR_INVALID_INPUT'}, 'Selected file is empty.')
-                return {'CANCELLED'}
-
-            # Return to file beginning.
-            lines.seek(0)
-
-            # Last displayed percentage.
-            PLast = 0
-
-            # Iterate over file rows.
-            for iLine, line in enumerate(lines):
-
-                # Split row into parameters.
-                params = line.split()
-
-                # Ignore rows with too few parameters.
-                if len(params) < 9:
-                    continue
-
-                # Print progress in the console every nth row.
-                PLast = print_progress(NLine, iLine, 10, PLast)
-
-                # Get cylinder parameters.
-                iBranch = int(float(params[0]))
-                sp = (float(params[1]), float(params[2]), float(params[3]))
-                ax = (float(params[4]), float(params[5]), float(params[6]))
-                h = float(params[7])
-                r = float(params[8])
-
-                # If the first branch or branch index has changed.
-                if NBranch == 0 or iBranch != iLastBranch:
-
-                    # Update last index.
-                    iLastBranch = iBranch
-                    # Increase branch count.
-                    NBranch += 1
-
-                    # If multiple objects are created, use unique
-                    # object and mesh names by numbering them.
-                    if fBranchSeparation:
-                        curvename = "branch_" + str(NBranch).zfill(NDigit)
-                        objname   = "branch_" + str(NBranch).zfill(NDigit)
-                    else:
-                        curvename = "qsm_curve"
-                        objname   = "qsm"
-
-                    # Start a new branch if this is the first one,
-                    # or if the user has selected to separate branches.
-                    if NBranch == 1 or fBranchSeparation:
-
-                        # Create Bezier curve for new branch.
-                        curvedata = bpy.data.curves.new(name=curvename,
-                                                        type='CURVE')
-                        curvedata.dimensions = '3D'
-                        # Set bevel object.
-                        curvedata.bevel_object = BevelObject
-                        curvedata.use_fill_caps = True
-
-                        # Add stem material to object if it is the
-                        # first branch, or if branch material is not
-                        # set (same material for all branches),
-                        # and if stem material is set.
-                        if iBranch == 1 or not matBranch:
-                            if matStem:
-                                curvedata.materials.append(matStem)
-
-                        # Add branch material if material is set and
-                        # it is different from the stem material.
-                        if matBranch and (matStem != matBranch):
-                            curvedata.materials.append(matBranch)
-
-                        # Create new object with the curve data.
-                        objectdata = bpy.data.objects.new(objname, curvedata)
-                        # Position to origin.
-                        objectdata.location = (0, 0, 0)
-                        # Parent to created empty.
-                        objectdata.parent = EmptyParent
-                        # Link to scene.
-                        scene.objects.link(objectdata)
-                        # Set as selected.
-                        objectdata.select = True
-
-                # For each cylinder add a new Bezier spline into the
-                # curve data.
-                polyline = curvedata.splines.new('BEZIER')
-                # Add an extra point to have two in total.
-                polyline.bezier_points.add(1)
-                # Set order to one as the cylinder axis will be linear.
-                polyline.resolution_u = 1
-
-                # Create the starting (i == 0) and ending (i == 1)
-                # points of the spline.
-                for i in (0, 1):
-
-                    # Position on axis (0 = bottom, 1 = top).
-                    hf = i
-
-                    # Position of curve point.
-                    co    = [sp_i + h * ax_i * hf                    for sp_i,ax_i in zip(sp,ax)]
-                    # Position of left handle.
-                    left  = [sp_i + h * ax_i * hf - len_l * ax_i * h for sp_i,ax_i in zip(sp,ax)]
-                    # Position of right handle.
-                    right = [sp_i + h * ax_i * hf + len_r * ax_i * h for sp_i,ax_i in zip(sp,ax)]
-
-                    # Set Bezier curve point properties.
-                    polyline.bezier_points[i].co = co
-                    polyline.bezier_points[i].handle_left = left
-                    polyline.bezier_points[i].handle_right = right
-
-                    # Set curve point radius.
-                    polyline.bezier_points[i].radius = r
-
-                    # Assign proper materials from the splots.
-                    if iBranch == 1:
+        # Collect all created objects.
+        allobj = []
+
+        # Number of cylinders.
+        NCyl = len(cyl['radius'])
+
+        # Number of digits to use in object naming.
+        NDigit = len(str(NCyl))
+
+        # If file did not have any cylinders.
+        if NCyl <= 0:
+            self.report(
+                {'ERROR_INVALID_INPUT'},
+                'Selected file is empty.'
+            )
+
+            return []
+
+        # Curve points and handles of all cylinders.
+        points = bezier_cylinder_points(cyl['start'], cyl['axis'],
+                                        cyl['length'], cyl['radius'])
+
+        # Last displayed percentage.
+        PLast = 0
+
+        # Iterate over cylinders.
+        for iCyl in range(NCyl):
+
+            # Print progress in the console every nth cylinder.
+            PLast = print_progress(NCyl, iCyl, 10, PLast)
+
+            # Get cylinder parameters.
+            iBranch = int(cyl['branch'][iCyl])
+
+            # If the first branch or branch index has changed.
+            if NBranch == 0 or iBranch != iLastBranch:
+
+                # Update last index.
+                iLastBranch = iBranch
+                # Increase branch count.
+                NBranch += 1
+
+                # If multiple objects are created, use unique
+                # object and mesh names by numbering them.
+                if fBranchSeparation:
+                    curvename = "branch_" + str(NBranch).zfill(NDigit)
+                    objname   = "branch_" + str(NBranch).zfill(NDigit)
+                else:
+                    curvename = "qsm_curve"
+                    objname   = "qsm"
+
+                # Start a new branch if this is the first one,
+                # or if the user has selected to separate branches.
+                if NBranch == 1 or fBranchSeparation:
+
+                    # Create Bezier curve for new branch.
+                    curvedata = bpy.data.curves.new(name=curvename,
+                                                    type='CURVE')
+                    curvedata.dimensions = '3D'
+                    # Set bevel object.
+                    curvedata.bevel_object = BevelObject
+                    curvedata.use_fill_caps = True
+
+                    # Add stem material to object if it is the
+                    # first branch, or if branch material is not
+                    # set (same material for all branches),
+                    # and if stem material is set.
+                    if iBranch == 1 or not matBranch:
                         if matStem:
-                            polyline.material_index = 0
-                    else:
-                        if matBranch or matStem:
-                            polyline.material_index = len(curvedata.materials)
+                            curvedata.materials.append(matStem)
+
+                    # Add branch material if material is set and
+                    # it is different from the stem material.
+                    if matBranch and (matStem != matBranch):
+                        curvedata.materials.append(matBranch)
+
+                    # Create new object with the curve data.
+                    objectdata = bpy.data.objects.new(objname, curvedata)
+
+                    # Position to origin.
+                    objectdata.location = (0, 0, 0)
+
+                    # Parent to created empty.
+                    objectdata.parent = EmptyParent
+
+                    # Link to scene.
+                    scene.objects.link(objectdata)
+
+                    # Set as selected.
+                    objectdata.select = True
+
+                    # Add new object to list.
+                    allobj.append(objectdata)
+
+            # For each cylinder add a new Bezier spline into the
+            # curve data.
+            polyline = curvedata.splines.new('BEZIER')
+            # Add an extra point to have two in total.
+            polyline.bezier_points.add(1)
+
+            # Set the starting and ending points of the spline, and
+            # the curve point radius.
+            for key in ('co', 'handle_left', 'handle_right', 'radius'):
+                polyline.bezier_points.foreach_set(key,
+                                                   points[key][iCyl].ravel())
+
+            # Assign proper materials from the splots.
+            if iBranch == 1:
+                if matStem:
+                    polyline.material_index = 0
+            else:
+                if matBranch or matStem:
+                    polyline.material_index = len(curvedata.materials)
 
-                    # Set curve resolution.
-                    polyline.resolution_u = 1
-                    polyline.use_endpoint_u = True
+            # Set order to one as the cylinder axis will be linear.
+            polyline.resolution_u = 1
+            polyline.use_endpoint_u = True
+
+        return allobj
 
     # Function to add a branch-level Bezier spline to the given
     # curve data, from the given cylinder parameters.
-    def addBezierCurve(self, curvedata, SP, AX, H, R):
+    # If tolerance is positive, the resolution of the spline is set
+    # adaptively from its curvature and radius.
+    def addBezierCurve(self, curvedata, SP, AX, H, R, tolerance=0):
+
+        # Curve points and handles.
+        points = bezier_branch_points(SP, AX, H, R)
 
         # Number of curve points = cylinder count + start point + end point.
-        NPoint = len(R) + 2
+        NPoint = len(points['radius'])
 
         # Create new spline.
         polyline = curvedata.splines.new('BEZIER')
         # Add curve points to get NPoint points.
         polyline.bezier_points.add(NPoint - 1)
 
-        # Iterate over cylinders in the input parameter lists.
-        for i in range(0, NPoint):
-
-            # Base of first cylinder.
-            if i == 0:
-                # Use normal radius.
-                rf = 1  # Radius scaler
-                # Point at the bottom of the cylinder.
-                hf = 0  # Position along cylinder axis.
-                j = 0  # Index of curve point.
-
-                # Shorter handles as there are more than one curve point
-                # "on" the first cylinder.
-                len_r = 0.25  # Length of right handle.
-                len_l = 0.25  # Length of left handle.
-
-            # Tip of last cylinder.
-            elif i == NPoint - 1:
-                # Taper to 10% of radius.
-                rf = 0.1
-                # Point at the end of the cylinder.
-                hf = 1
-                # Last curve point.
-                j = len(SP) - 1
-
-                # Shorter handles as there are more than one curve point
-                # "on" the last cylinder.
-                len_l = 0.25
-                len_r = 0.25
-
-            # Curve points in the middle of the cylinders.
-            else:
-                # Normal radius.
-                rf = 1
-                # Point at the center of cylinder.
-                hf = 0.5
-                j = i - 1
-
-                # Normal handle length, unless its the left handle of the
-                # first cylinder, or the right handle of the last cylinder.
-                len_r = 0.45
-                len_l = 0.45
-
-                # Middle of the first cylinder.
-                if i == 1:
-                    len_l = 0.25
-
-                # Middle of the last cylinder.
-                if i == NPoint - 2:
-                    len_r = 0.25
-
-            # Get parameters of current cylinder.
-            sp = SP[j]  # Start point
-            ax = AX[j]  # Axis
-            h = H[j]   # Length
-            r = R[j]   # Radius
-
-            # Compute curve point location.
-            co    = [sp_i + h * ax_i * hf                    for sp_i,ax_i in zip(sp,ax)]
-            # And handle locations.
-            left  = [sp_i + h * ax_i * hf - len_l * ax_i * h for sp_i,ax_i in zip(sp,ax)]
-            right = [sp_i + h * ax_i * hf + len_r * ax_i * h for sp_i,ax_i in zip(sp,ax)]
-
-            # Set curve point properties and radius.
-            polyline.bezier_points[i].co = co
-            polyline.bezier_points[i].handle_left = left
-            polyline.bezier_points[i].handle_right = right
-            polyline.bezier_points[i].radius = r * rf
-
-        # Set curve resolution based on the number of curve points.
-        # At most the resolution can be 10.
-        polyline.resolution_u = min(NPoint - 2, 10)
+        # Set curve point properties and radius.
+        for key in ('co', 'handle_left', 'handle_right', 'radius'):
+            polyline.bezier_points.foreach_set(key, points[key].ravel())
+
+        # Set curve resolution adaptively so that the tube surface
+        # deviates at most by the tolerance. Otherwise set resolution
+        # based on the number of curve points, at most 10.
+        if tolerance > 0:
+            polyline.resolution_u = bezier_resolution(points, tolerance)
+        else:
+            polyline.resolution_u = min(NPoint - 2, 10)
         polyline.use_endpoint_u = True
 
         # Return new spline.
         return polyline
 
     # Function to import a QSM as branch-level bevelled Bezier curves.
-    def import_as_bezier_curves(self, context, file_path, EmptyParent,
+    def import_as_bezier_curves(self, context, cyl, EmptyParent,
                                 fBranchSeparation,
                                 matStem, matBranch, BevelObject):
 
@@ -1714,6 +1119,14 @@ class ImportQSM(bpy.types.Operator):
 
         # Current scene to read properties.
         scene = context.scene
+        settings = scene.qsmImportSettings
+
+        # Error tolerance of adaptive spline resolution, or zero to
+        # set the resolution based on the number of curve points.
+        if settings.qsmAdaptiveResolution:
+            tolerance = settings.qsmResolutionTolerance
+        else:
+            tolerance = 0
 
         # Number of branches.
         NBranch = 0
@@ -1726,170 +1139,180 @@ class ImportQSM(bpy.types.Operator):
         h = []
         r = []
 
-        with open(file_path) as lines:
+        # Collect all created objects.
+        allobj = []
 
-            # Count number of lines in file.
-            NLine = sum(1 for line in lines)
+        # Number of cylinders.
+        NCyl = len(cyl['radius'])
 
-            # Number of digits to use in object naming.
-            NDigit = len(str(NLine))
+        # Number of digits to use in object naming.
+        NDigit = len(str(NCyl))
 
-            # If file had any rows.
-            if NLine > 0:
+        # If file had any cylinders.
+        if NCyl > 0:
 
-                # If multiple objects are created, use unique
-                # object and mesh names by numbering them.
-                if fBranchSeparation:
-                    curvename = "branch_" + str(1).zfill(NDigit)
-                    objname   = "branch_" + str(1).zfill(NDigit)
-                else:
-                    curvename = "qsm_curve"
-                    objname   = "qsm"
+            # If multiple objects are created, use unique
+            # object and mesh names by numbering them.
+            if fBranchSeparation:
+                curvename = "branch_" + str(1).zfill(NDigit)
+                objname   = "branch_" + str(1).zfill(NDigit)
+            else:
+                curvename = "qsm_curve"
+                objname   = "qsm"
 
-                # Create new curve to hold splines.
-                curvedata = bpy.data.curves.new(name=curvename, type='CURVE')
-                curvedata.dimensions = '3D'
-                # Set bevel object and fill caps.
-                curvedata.bevel_object = BevelObject
-                curvedata.use_fill_caps = True
+            # Create new curve to hold splines.
+            curvedata = bpy.data.curves.new(
+                name=curvename,
+                type='CURVE'
+            )
 
-                # Add stem material to first object.
-                if matStem:
-                    curvedata.materials.append(matStem)
+            curvedata.dimensions = '3D'
+            # Set bevel object and fill caps.
+            curvedata.bevel_object = BevelObject
+            curvedata.use_fill_caps = True
 
-                # Add branch material to first object if present.
-                if matBranch and (matStem != matBranch):
-                    curvedata.materials.append(matBranch)
+            # Add stem material to first object.
+            if matStem:
+                curvedata.materials.append(matStem)
 
-                # Create new object with curve data.
-                objectdata = bpy.data.objects.new(objname, curvedata)
-                # Set position to origin.
-                objectdata.location = (0, 0, 0)
-                # Parent to created empty.
-                objectdata.parent = EmptyParent
-                # Set selected.
-                objectdata.select = True
+            # Add branch material to first object if present.
+            if matBranch and (matStem != matBranch):
+                curvedata.materials.append(matBranch)
 
-                # Link to scene.
-                scene.objects.link(objectdata)
+            # Create new object with curve data.
+            objectdata = bpy.data.objects.new(objname, curvedata)
+            # Set position to origin.
+            objectdata.location = (0, 0, 0)
 
-            # Otherwise the file was empty.
-            else:
-                self.report({'ERROR_INVALID_INPUT'}, 'Selected file is empty.')
-                return {'CANCELLED'}
-
-            # Move back to file beginning.
-            lines.seek(0)
-
-            # Last displayed percentage.
-            PLast = 0
-
-            # Iterate over file rows.
-            for iLine, line in enumerate(lines):
-
-                # Split row into parameters.
-                params = line.split()
-
-                # Ignore rows with too few parameters.
-                if len(params) < 9:
-                    continue
-
-                # Print progress in the console every nth row.
-                PLast = print_progress(NLine, iLine, 10, PLast)
-
-                # Get cylinder parameters.
-                iBranch = int(float(params[0]))
-
-                # On first branch.
-                if NBranch < 1:
-                    # Set count to one.
-                    NBranch = 1
-                    # Set last index to first index.
-                    iLastBranch = iBranch
-
-                # If new branch begins, complete the last branch.
-                if iBranch != iLastBranch:
-
-                    # Add new spline with the cylinder parameter arrays.
-                    polyline = self.addBezierCurve(curvedata, sp, ax, h, r)
-
-                    # If the branch index of the branch to complete is one,
-                    # assign stem material.
-                    if iLastBranch == 1:
-                        polyline.material_index = 0
-                    # Otherwise, assign last material slot, which is stem
-                    # material if its the only material and branch material
-                    # if it is present.
-                    else:
-                        polyline.material_index = len(curvedata.materials)
-
-                    # Update last branch to current value.
-                    iLastBranch = iBranch
-                    # Increase branch count.
-                    ++NBranch
-
-                    # Empty parameter arrays.
-                    sp[:] = []
-                    ax[:] = []
-                    h[:] = []
-                    r[:] = []
-
-                    # If branches are separated, create new object with a
-                    # name based on index.
-                    if fBranchSeparation:
-                        curvename = "branch_" + str(NBranch).zfill(NDigit)
-                        objname   = "branch_" + str(NBranch).zfill(NDigit)
-
-                        # New curve data.
-                        curvedata = bpy.data.curves.new(name=curvename,
-                                                        type='CURVE')
-                        curvedata.dimensions = '3D'
-                        curvedata.bevel_object = BevelObject
-                        curvedata.use_fill_caps = True
-
-                        # Add branch material to rest of the
-                        # objects if present.
-                        if matBranch:
-                            curvedata.materials.append(matBranch)
-                        # Otherwise use stem material if given.
-                        elif matStem:
-                            curvedata.materials.append(matStem)
+            # Parent to created empty.
+            objectdata.parent = EmptyParent
 
-                        # New object with curve data.
-                        objectdata = bpy.data.objects.new(objname, curvedata)
-                        # Position to origin.
-                        objectdata.location = (0, 0, 0)
-                        # Parent to empty.
-                        objectdata.parent = EmptyParent
-                        # Set selected.
-                        objectdata.select = True
-
-                        # Link to current scene.
-                        scene.objects.link(objectdata)
-
-                # Append cylinder parameters from current file
-                # row to parameter arrays.
-                sp.append((float(params[1]),
-                           float(params[2]),
-                           float(params[3])))
-                ax.append((float(params[4]),
-                           float(params[5]),
-                           float(params[6])))
-                h.append(float(params[7]))
-                r.append(float(params[8]))
-
-            # Complete final branch.
-            polyline = self.addBezierCurve(curvedata, sp, ax, h, r)
-
-            # If the branch index of the branch to complete is one,
-            # assign stem material.
-            if iBranch == 1:
-                polyline.material_index = 0
-            # Otherwise, assign last material slot, which is stem
-            # material if its the only material and branch material
-            # if it is present.
-            else:
-                polyline.material_index = len(curvedata.materials)
+            # Set selected.
+            objectdata.select = True
+
+            # Link to scene.
+            scene.objects.link(objectdata)
+
+            # Add new object to list.
+            allobj.append(objectdata)
+
+        # Otherwise the file was empty.
+        else:
+            self.report(
+                {'ERROR_INVALID_INPUT'},
+                'Selected file is empty.'
+            )
+
+            return []
+
+        # Last displayed percentage.
+        PLast = 0
+
+        # Iterate over cylinders.
+        for iCyl in range(NCyl):
+
+            # Print progress in the console every nth cylinder.
+            PLast = print_progress(NCyl, iCyl, 10, PLast)
+
+            # Get cylinder parameters.
+            iBranch = int(cyl['branch'][iCyl])
+
+            # On first branch.
+            if NBranch < 1:
+                # Set count to one.
+                NBranch = 1
+                # Set last index to first index.
+                iLastBranch = iBranch
+
+            # If new branch begins, complete the last branch.
+            if iBranch != iLastBranch:
+
+                # Add new spline with the cylinder parameter arrays.
+                polyline = self.addBezierCurve(curvedata, sp, ax, h, r,
+                                           tolerance)
+
+                # If the branch index of the branch to complete is one,
+                # assign stem material.
+                if iLastBranch == 1:
+                    polyline.material_index = 0
+                # Otherwise, assign last material slot, which is stem
+                # material if its the only material and branch material
+                # if it is present.
+                else:
+                    polyline.material_index = len(curvedata.materials)
+
+                # Update last branch to current value.
+                iLastBranch = iBranch
+                # Increase branch count.
+                ++NBranch
+
+                # Empty parameter arrays.
+                sp[:] = []
+                ax[:] = []
+                h[:] = []
+                r[:] = []
+
+                # If branches are separated, create new object with a
+                # name based on index.
+                if fBranchSeparation:
+                    curvename = "branch_" + str(NBranch).zfill(NDigit)
+                    objname   = "branch_" + str(NBranch).zfill(NDigit)
+
+                    # New curve data.
+                    curvedata = bpy.data.curves.new(name=curvename,
+                                                    type='CURVE')
+                    curvedata.dimensions = '3D'
+                    curvedata.bevel_object = BevelObject
+                    curvedata.use_fill_caps = True
+
+                    # Add branch material to rest of the
+                    # objects if present.
+                    if matBranch:
+                        curvedata.materials.append(matBranch)
+                    # Otherwise use stem material if given.
+                    elif matStem:
+                        curvedata.materials.append(matStem)
+
+                    # New object with curve data.
+                    objectdata = bpy.data.objects.new(objname, curvedata)
+
+                    # Position to origin.
+                    objectdata.location = (0, 0, 0)
+
+                    # Parent to empty.
+                    objectdata.parent = EmptyParent
+
+                    # Set selected.
+                    objectdata.select = True
+
+                    # Link to current scene.
+                    scene.objects.link(objectdata)
+
+                    # Append new object.
+                    allobj.append(objectdata)
+
+            # Append parameters of the current cylinder to
+            # parameter arrays.
+            sp.append(tuple(float(x) for x in cyl['start'][iCyl]))
+            ax.append(tuple(float(x) for x in cyl['axis'][iCyl]))
+            h.append(float(cyl['length'][iCyl]))
+            r.append(float(cyl['radius'][iCyl]))
+
+        # Complete final branch.
+        polyline = self.addBezierCurve(curvedata, sp, ax, h, r,
+                                       tolerance)
+
+        # If the branch index of the branch to complete is one,
+        # assign stem material.
+        if iBranch == 1:
+            polyline.material_index = 0
+        # Otherwise, assign last material slot, which is stem
+        # material if its the only material and branch material
+        # if it is present.
+        else:
+            polyline.material_index = len(curvedata.materials)
+
+        return allobj
 
     # Main function of the QSM import operator.
     def execute(self, context):
@@ -1919,11 +1342,28 @@ class ImportQSM(bpy.types.Operator):
             print('Cancelled.')
             return {'CANCELLED'}
 
+        # Check that compressed file can be read.
+        msg = check_file_support(file_path)
+        if msg:
+            self.report({'ERROR_INVALID_INPUT'}, msg)
+            print('Cancelled.')
+            return {'CANCELLED'}
+
         # Import mode: mesh / bezier
         mode = settings.qsmImportMode
         # Flag: separate objects for each branch.
         fBranchSeparation = settings.qsmSeparation
 
+        # Read cylinder parameters.
+        cyl = read_qsm_file(file_path)
+
+        # Check that cylinders were found.
+        if len(cyl['radius']) == 0:
+            self.report({'ERROR_INVALID_INPUT'},
+                        'Selected file does not contain cylinders.')
+            print('Cancelled.')
+            return {'CANCELLED'}
+
         # Create empty parent for QSM object(s).
         EmptyParent = self.createQSMParent(scene)
 
@@ -2001,29 +1441,35 @@ class ImportQSM(bpy.types.Operator):
 
         # Mesh cylinder.
         if mode == 'mesh_cylinder':
-            self.import_as_mesh_cylinders(context,
-                                          file_path,
-                                          EmptyParent,
-                                          fBranchSeparation,
-                                          matStem,
-                                          matBranch)
+            allobj = self.import_as_mesh_cylinders(context,
+                                                   cyl,
+                                                   EmptyParent,
+                                                   fBranchSeparation,
+                                                   matStem,
+                                                   matBranch)
         # Cylinder-level Bezier curves.
         elif mode == 'bezier_cylinder':
-            self.import_as_bezier_cylinders(context,
-                                            file_path,
-                                            EmptyParent,
-                                            fBranchSeparation,
-                                            matStem, matBranch,
-                                            BevelObject)
+            allobj = self.import_as_bezier_cylinders(context,
+                                                     cyl,
+                                                     EmptyParent,
+                                                     fBranchSeparation,
+                                                     matStem, matBranch,
+                                                     BevelObject)
         # Branch-level Bezier curves.
         elif mode == 'bezier_branch':
-            self.import_as_bezier_curves(context,
-                                         file_path,
-                                         EmptyParent,
-                                         fBranchSeparation,
-                                         matStem,
-                                         matBranch,
-                                         BevelObject)
+            allobj = self.import_as_bezier_curves(context,
+                                                  cyl,
+                                                  EmptyParent,
+                                                  fBranchSeparation,
+                                                  matStem,
+                                                  matBranch,
+                                                  BevelObject)
+
+        # Bake the curves into meshes, which are used instead of the
+        # curves until they are edited.
+        if mode != 'mesh_cylinder' and settings.qsmBakeCurveMesh:
+            for ob in allobj:
+                bake_curve_mesh(context, ob).select = False
 
         # Record end time.
         end = datetime.datetime.now()
@@ -2089,15 +1535,19 @@ class UpdateMeshQSMColorMap(bpy.types.Operator):
             print('Cancelled.')
             return {'CANCELLED'}
 
+        # Check that compressed file can be read.
+        msg = check_file_support(file_path)
+        if msg:
+            self.report({'ERROR_INVALID_INPUT'}, msg)
+            print('Cancelled.')
+            return {'CANCELLED'}
+
         # Mesh data of selected object.
         me = ob.data
-        # Create bmesh object for data modification.
-        bm = bmesh.new()
-        bm.from_mesh(me)
 
         # Get integer layer that contains cylinder ID information,
         # crucial for updating.
-        layer = bm.verts.layers.int.get("CylinderId")
+        layer = me.vertex_layers_int.get("CylinderId")
 
         # If layer does not exist, unable to update.
         if not layer:
@@ -2105,64 +1555,32 @@ class UpdateMeshQSMColorMap(bpy.types.Operator):
                         'Selected object does not contain cylinder id info.')
             return {'CANCELLED'}
 
-        with open(file_path) as lines:
-
-            # Count number of lines in file.
-            NLine = sum(1 for line in lines)
-
-            # Return to file beginning.
-            lines.seek(0)
-
-            # (Vector) array to hold colourmap values of each cylinder.
-            CylinderColors = []
+        # Read colourmap values of each cylinder.
+        CylinderColors = read_qsm_file(file_path)['color'][:, :3]
 
-            # Iterate over file rows.
-            for iLine, line in enumerate(lines):
+        # Cylinder index of each vertex, read from CylinderId layer.
+        vert_cyl = np.empty(len(me.vertices), dtype=np.int32)
+        layer.data.foreach_get('value', vert_cyl)
 
-                # Split cylinder parameter on current row.
-                params = line.split()
+        # Index of the vertex of each loop.
+        loop_vert = np.empty(len(me.loops), dtype=np.int32)
+        me.loops.foreach_get('vertex_index', loop_vert)
 
-                # Ignore rows with too few parameters.
-                if len(params) < 9:
-                    continue
+        # Get colour layer that holds colourmap data.
+        colors = me.vertex_colors.get(colormap)
+        # If layer does not exist, create new.
+        if not colors:
+            colors = me.vertex_colors.new(colormap)
 
-                # Display progress every 100th row.
-                if iLine == 0 or iLine % 100 == 1:
-                    msg = "Processing line %i of %i" % (iLine + 1, NLine)
-                    sys.stdout.write(msg + chr(8) * len(msg))
-                    sys.stdout.flush()
-
-                # Append new colourmap value to array.
-                if len(params) > 11:
-                    CylinderColors.append(Vector((float(params[9]),
-                                                  float(params[10]),
-                                                  float(params[11]))))
-                else:
-                    CylinderColors.append(float(params[9]))
-
-            # Get colour layer that holds colourmap data.
-            colors = bm.loops.layers.color.get(colormap)
-            # If layer does not exist, create new.
-            if not colors:
-                colors = bm.loops.layers.color.new(colormap)
-
-            # Iterate over vertices in mesh.
-            for v in bm.verts:
-
-                # Cylinder index is read from CylinderId layer.
-                iCyl = v[layer]
-
-                # Update colour layer with new colour value.
-                for loop in v.link_loops:
-                    if not isinstance(CylinderColors[iCyl - 1], float):
-                        loop[colors] = CylinderColors[iCyl - 1]
-                    else:
-                        loop[colors] = [CylinderColors[iCyl - 1]] * 3
+        # Update colour layer with the colour value of the cylinder of
+        # each loop.
+        colors.data.foreach_set(
+            'color',
+            CylinderColors[vert_cyl[loop_vert] - 1].astype(np.float32).ravel()
+        )
 
         # Update mesh data.
-        bm.to_mesh(me)
-        # Free bmesh.
-        bm.free()
+        me.update()
 
         # Record end time.
         end = datetime.datetime.now()
@@ -2173,12 +1591,39 @@ class UpdateMeshQSMColorMap(bpy.types.Operator):
 
         # Display import duration in the console.
         sys.stdout.write("Processing finished in " +
-                         timestr + " sec" + " " * len(msg) + "\n")
+                         timestr + " sec" + " " * 100 + "\n")
         sys.stdout.flush()
 
         return {'FINISHED'}
 
 
+# Operator for baking edited curve objects into their mesh objects.
+class BakeCurveMesh(bpy.types.Operator):
+    """Convert the selected curves into mesh objects used instead of the curves"""
+
+    bl_idname = "qsm.bake_curve_mesh"
+    bl_label = "Bake curve mesh"
+
+    # Main function of the bake operator.
+    def execute(self, context):
+
+        # Selected curve objects.
+        curves = [ob for ob in context.selected_objects
+                  if ob.type == 'CURVE']
+
+        if not curves:
+            self.report({'ERROR_INVALID_INPUT'},
+                        'No curve objects selected.')
+            return {'CANCELLED'}
+
+        for ob in curves:
+            bake_curve_mesh(context, ob)
+
+        self.report({'INFO'}, 'Baked ' + str(len(curves)) + ' curve(s).')
+
+        return {'FINISHED'}
+
+
 def min_update(self, context):
     if self.__class__.__name__ == 'QsmImportSettings':
 
@@ -2240,6 +1685,32 @@ class QsmImportSettings(bpy.types.PropertyGroup):
         description="Object that is asigned as the bevel object of each curve",
     )
 
+    # Flag: set the resolution of branch-level curves adaptively.
+    qsmAdaptiveResolution = bpy.props.BoolProperty(
+        name="Adaptive resolution",
+        description="If enabled the resolution of each branch curve is set from its curvature and radius, instead of its point count.",
+        default=False,
+        subtype='NONE',
+    )
+
+    # Error tolerance of adaptive curve resolution.
+    qsmResolutionTolerance = bpy.props.FloatProperty(
+        name="Tolerance",
+        default=0.001,
+        min=0.00001,
+        precision=5,
+        subtype='DISTANCE',
+        description="Maximum deviation of the curve surface from the smooth branch, in scene units",
+    )
+
+    # Flag: bake curves into meshes after import.
+    qsmBakeCurveMesh = bpy.props.BoolProperty(
+        name="Bake curve mesh",
+        description="If enabled the curves are converted into mesh objects used for display and rendering, and the curves are hidden until edited.",
+        default=False,
+        subtype='NONE',
+    )
+
     # Name of the stem material.
     qsmStemMaterial = bpy.props.StringProperty(
         name="Stem material",
@@ -2468,6 +1939,8 @@ def register():
 
     # Update colourmap operator.
     bpy.utils.register_class(UpdateMeshQSMColorMap)
+    # Curve baking operator.
+    bpy.utils.register_class(BakeCurveMesh)
     # QSM import operator.
     bpy.utils.register_class(ImportQSM)
     # Leaf import operator.
@@ -2488,6 +1961,7 @@ def unregister():
     bpy.utils.unregister_class(QSMPanel)
     bpy.utils.unregister_class(ImportQSM)
     bpy.utils.unregister_class(UpdateMeshQSMColorMap)
+    bpy.utils.unregister_class(BakeCurveMesh)
     bpy.utils.unregister_class(ImportLeafModel)
     bpy.utils.unregister_class(QsmImportSettings)
     bpy.utils.unregister_class(LeafModelImportSettings)
@@ -0,0 +1,59 @@
+# This file is part of QSM-blender-addons.
+#
+# QSM-blender-addons is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# QSM-blender-addons is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with QSM-blender-addons.  If not, see <http://www.gnu.org/licenses/>.
+
+# Tests of the Blender-independent qsm_core package, run with pytest
+# from the repository root.
+
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+
+# Random cylinder table with the given number of cylinders, in
+# branches of three cylinders.
+def random_cylinders(NCyl, seed=0):
+
+    rng = np.random.RandomState(seed)
+
+    axis = rng.normal(size=(NCyl, 3))
+    axis /= np.linalg.norm(axis, axis=1)[:, None]
+
+    return {'branch': np.arange(NCyl) // 3 + 1,
+            'start': rng.uniform(-5, 5, (NCyl, 3)),
+            'axis': axis,
+            'length': rng.uniform(0.1, 1.0, NCyl),
+            'radius': rng.uniform(0.01, 0.2, NCyl),
+            'color': np.ones((NCyl, 4)),
+            'has_color': np.zeros(NCyl, dtype=bool),
+            'extra': np.zeros((NCyl, 0))}
+
+
+# Rows of a QSM TXT-file of a cylinder table.
+def cylinder_rows(cyl):
+
+    values = np.column_stack((cyl['start'], cyl['axis'],
+                              cyl['length'], cyl['radius']))
+
+    return ['%d ' % b + ' '.join('%.17g' % x for x in row)
+            for b, row in zip(cyl['branch'], values)]
+
+
+@pytest.fixture
+def cylinders():
+    return random_cylinders
@@ -0,0 +1,138 @@
+# This file is part of QSM-blender-addons.
+#
+# QSM-blender-addons is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# QSM-blender-addons is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with QSM-blender-addons.  If not, see <http://www.gnu.org/licenses/>.
+
+import numpy as np
+
+from qsm_core import (read_qsm_file,
+                      build_cylinder_geometry,
+                      TableCache,
+                      GeometryCache,
+                      geometry_key,
+                      content_key,
+                      source_key)
+
+from conftest import cylinder_rows
+
+
+def test_table_cache_hits_and_invalidation(cylinders, tmp_path):
+
+    path = tmp_path / 'qsm.txt'
+    path.write_text('\n'.join(cylinder_rows(cylinders(10))))
+
+    cache = TableCache()
+
+    first = cache.read(read_qsm_file, str(path))
+    second = cache.read(read_qsm_file, str(path))
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    # Copies share the arrays, but not the dict.
+    second['id'] = np.arange(10)
+    assert 'id' not in cache.read(read_qsm_file, str(path))
+    assert second['radius'] is first['radius']
+
+    # A changed file is read again.
+    path.write_text('\n'.join(cylinder_rows(cylinders(4))))
+    assert len(cache.read(read_qsm_file, str(path))['radius']) == 4
+    assert cache.misses == 2
+
+
+def test_table_cache_evicts_least_recently_used(tmp_path):
+
+    def read(file_path):
+        return {'data': np.zeros(100)}
+
+    paths = []
+    for i in range(3):
+        paths.append(str(tmp_path / ('%d.txt' % i)))
+        open(paths[-1], 'w').close()
+
+    cache = TableCache(capacity=2 * 800)
+
+    cache.read(read, paths[0])
+    cache.read(read, paths[1])
+    cache.read(read, paths[0])
+    cache.read(read, paths[2])
+
+    assert [key[2] for key in cache.tables] == [paths[0], paths[2]]
+    assert cache.nbytes == 1600
+
+    cache.clear()
+    assert cache.nbytes == 0 and not cache.tables
+
+
+def test_geometry_cache_round_trip(cylinders, tmp_path):
+
+    cyl = cylinders(20)
+    cache = GeometryCache(str(tmp_path / 'geometry'))
+
+    built = cache.build(build_cylinder_geometry, cyl, 6, 12)
+    loaded = cache.build(build_cylinder_geometry, cyl, 6, 12)
+
+    assert isinstance(loaded['co'], np.memmap)
+    assert set(built) == set(loaded)
+    for key in built:
+        np.testing.assert_array_equal(built[key], loaded[key])
+        assert built[key].dtype == loaded[key].dtype
+
+    # Different parameters give a different entry.
+    assert geometry_key(build_cylinder_geometry, cyl, 6, 12) != \
+        geometry_key(build_cylinder_geometry, cyl, 6, 13)
+
+    cache.build(build_cylinder_geometry, cyl, 6, 13)
+    assert len(cache.entries()) == 2
+
+    cache.capacity = 1
+    cache.prune()
+    assert cache.entries() == []
+
+
+def test_content_key_ignores_path(tmp_path):
+
+    a = tmp_path / 'a.txt'
+    b = tmp_path / 'b.txt'
+    a.write_text('1 2 3')
+    b.write_text('1 2 3')
+
+    assert content_key([str(a)], {'x': 1}) == content_key([str(b)], {'x': 1})
+    assert content_key([str(a)], {'x': 1}) != content_key([str(a)], {'x': 2})
+
+
+def test_source_key_uses_path_and_modification(tmp_path):
+
+    a = tmp_path / 'a.txt'
+    b = tmp_path / 'b.txt'
+    a.write_text('1 2 3')
+    b.write_text('1 2 3')
+
+    key = source_key(build_cylinder_geometry, [str(a)], {'x': 1})
+
+    assert key == source_key(build_cylinder_geometry, [str(a)], {'x': 1})
+    assert key != source_key(build_cylinder_geometry, [str(b)], {'x': 1})
+    assert key != source_key(build_cylinder_geometry, [str(a)], {'x': 2})
+
+    a.write_text('1 2 3 4')
+    assert key != source_key(build_cylinder_geometry, [str(a)], {'x': 1})
+
+
+def test_geometry_cache_with_given_key(cylinders, tmp_path):
+
+    cyl = cylinders(20)
+    cache = GeometryCache(str(tmp_path / 'cache'))
+
+    built = cache.build(build_cylinder_geometry, cyl, 6, 12, key='source')
+    loaded = cache.load('source')
+
+    assert [key for key, _ in cache.entries()] == ['source']
+    np.testing.assert_array_equal(built['co'], loaded['co'])
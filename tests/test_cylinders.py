@@ -0,0 +1,113 @@
+# This file is part of QSM-blender-addons.
+#
+# QSM-blender-addons is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# QSM-blender-addons is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with QSM-blender-addons.  If not, see <http://www.gnu.org/licenses/>.
+
+import numpy as np
+
+from qsm_core import (take_cylinders,
+                      axis_frames,
+                      branch_hashes,
+                      build_cylinder_geometry,
+                      splice_cylinder_geometry)
+
+
+def test_axis_frames_are_rotations():
+
+    axis = np.array([[0, 0, 1], [0, 0, -1], [1, 0, 0], [0, 2, 0],
+                     [1, 1, 1], [0, 0, 0], [-1e-9, 0, -1]], dtype=float)
+
+    rot = axis_frames(axis)
+
+    for R in rot:
+        np.testing.assert_allclose(R.T @ R, np.eye(3), atol=1e-12)
+        np.testing.assert_allclose(np.linalg.det(R), 1.0)
+
+    # The z-axis is rotated onto the unit axis, zero axes point up.
+    unit = axis.copy()
+    unit[5] = [0, 0, 1]
+    unit /= np.linalg.norm(unit, axis=1)[:, None]
+    np.testing.assert_allclose(rot[:, :, 2], unit)
+
+
+def test_vertices_lie_on_cylinders(cylinders):
+
+    cyl = cylinders(12)
+    geom = build_cylinder_geometry(cyl, 6, 12)
+
+    assert geom['vert_start'][-1] == len(geom['co'])
+    assert geom['loop_start'][-1] == len(geom['loop_vert'])
+    assert geom['poly_first'][-1] == len(geom['poly_start'])
+
+    # Distance of the vertices from the axis and position along it.
+    d = geom['co'] - cyl['start'][geom['vert_cyl']]
+    along = np.einsum('ij,ij->i', d, cyl['axis'][geom['vert_cyl']])
+    across = np.linalg.norm(
+        d - along[:, None] * cyl['axis'][geom['vert_cyl']], axis=1
+    )
+
+    length = cyl['length'][geom['vert_cyl']]
+    radius = cyl['radius'][geom['vert_cyl']]
+
+    assert np.all((along > -1e-5) & (along < length + 1e-5))
+    # Cap centres are on the axis, the other vertices on the surface.
+    assert np.all((across < 1e-5) | (np.abs(across - radius) < 1e-5))
+
+    # Thinnest and thickest cylinders use the vertex count limits.
+    ring = np.diff(geom['poly_first']) - 2
+    assert ring[np.argmin(cyl['radius'])] == 6
+    assert ring[np.argmax(cyl['radius'])] == 12
+
+
+def test_splice_matches_full_build(cylinders):
+
+    cyl = cylinders(8)
+    radius = [[cyl['radius'].min(), cyl['radius'].max()]]
+    mesh = build_cylinder_geometry(cyl, 6, 12)
+
+    # Rebuild cylinders 2 and 5, keeping the others.
+    rebuilt = [2, 5]
+    mesh['vert_cyl'] = np.where(np.isin(mesh['vert_cyl'], rebuilt), -1,
+                                mesh['vert_cyl'])
+
+    geom = build_cylinder_geometry(take_cylinders(cyl, rebuilt), 6, 12,
+                                   treeRadius=radius)
+    spliced = splice_cylinder_geometry(mesh, geom, rebuilt)
+
+    np.testing.assert_array_equal(spliced['index'], [0, 1, 3, 4, 6, 7, 2, 5])
+
+    full = build_cylinder_geometry(take_cylinders(cyl, spliced['index']),
+                                   6, 12, treeRadius=radius)
+
+    for key in full:
+        np.testing.assert_array_equal(spliced[key], full[key], err_msg=key)
+
+
+def test_branch_hashes_find_changed_branches(cylinders):
+
+    cyl = cylinders(20)
+    cyl['branch'] = np.repeat([1, 2, 3, 4], 5)
+
+    hashes = branch_hashes(cyl)
+    assert sorted(hashes) == [1, 2, 3, 4]
+
+    # Interleaving the branches keeps the order within each branch.
+    order = np.argsort(np.tile(np.arange(5), 4), kind='stable')
+    assert branch_hashes(take_cylinders(cyl, order)) == hashes
+
+    # Only the branch of a changed cylinder gets a new hash.
+    changed = dict(cyl, radius=cyl['radius'].copy())
+    changed['radius'][12] *= 2
+    new = branch_hashes(changed)
+
+    assert [b for b in hashes if hashes[b] != new[b]] == [3]
@@ -0,0 +1,97 @@
+# This file is part of QSM-blender-addons.
+#
+# QSM-blender-addons is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# QSM-blender-addons is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with QSM-blender-addons.  If not, see <http://www.gnu.org/licenses/>.
+
+import numpy as np
+
+from qsm_core import read_ext_obj, decimate_leaves, leaf_geometry
+
+
+# Random leaves on the given number of twigs.
+def random_leaves(NLeaf, NTwig, seed=0):
+
+    rng = np.random.RandomState(seed)
+
+    direction = rng.normal(size=(NLeaf, 3))
+    direction /= np.linalg.norm(direction, axis=1)[:, None]
+    normal = np.cross(direction, [0.0, 0.0, 1.0])
+    normal /= np.linalg.norm(normal, axis=1)[:, None]
+
+    return {'twig_start': rng.uniform(-1, 1, (NTwig, 3))[
+                rng.randint(NTwig, size=NLeaf)],
+            'start': rng.uniform(-1, 1, (NLeaf, 3)),
+            'direction': direction,
+            'normal': normal,
+            'scale': rng.uniform(0.05, 0.1, (NLeaf, 3)),
+            'color': np.zeros((NLeaf, 3)),
+            'has_color': np.zeros(NLeaf, dtype=bool)}
+
+
+def test_read_ext_obj(tmp_path):
+
+    path = tmp_path / 'leaves.obj'
+    path.write_text('v 0 0 0\nv 1 0 0\nv 0 1 0\nf 1 2 3\n'
+                    'L 0 0 0 1 2 3 0 1 0 0 0 1 1 1 1\n'
+                    'L 0 0 0 4 5 6 0 1 0 0 0 1 2 2 2 0.1 0.2 0.3\n'
+                    'v 9 9 9\n')
+
+    base, leaves = read_ext_obj(str(path))
+
+    assert base['vert'].shape == (3, 3)
+    np.testing.assert_array_equal(base['face'][0], [0, 1, 2])
+    np.testing.assert_allclose(leaves['start'], [[1, 2, 3], [4, 5, 6]])
+    np.testing.assert_array_equal(leaves['has_color'], [False, True])
+
+
+def test_decimation_preserves_twig_area():
+
+    # Kept leaves are scaled by the leaf count ratio, which preserves
+    # the area exactly for leaves of the same size.
+    leaves = random_leaves(1000, 40)
+    leaves['scale'][:] = 0.1
+
+    sub = decimate_leaves(leaves, 4, seed=3)
+
+    def twig_area(t):
+        _, twig = np.unique(t['twig_start'], axis=0, return_inverse=True)
+        return np.bincount(twig.ravel(),
+                           weights=t['scale'][:, 0] * t['scale'][:, 1])
+
+    np.testing.assert_allclose(twig_area(sub), twig_area(leaves))
+    assert len(sub['start']) < 300
+
+    # Same seed, same leaves. No decimation with a ratio of one.
+    np.testing.assert_array_equal(decimate_leaves(leaves, 4, seed=3)['start'],
+                                  sub['start'])
+    assert decimate_leaves(leaves, 1) is leaves
+
+
+def test_leaf_geometry_transforms_base():
+
+    base = {'vert': np.array([[0.0, 0.0, 0.0], [1.0, 0.0, 0.0],
+                              [0.0, 1.0, 0.0]]),
+            'face': [np.array([0, 1, 2])]}
+    leaves = random_leaves(5, 2)
+
+    geom = leaf_geometry(base, leaves)
+
+    co = geom['co'].reshape(5, 3, 3)
+    np.testing.assert_allclose(co[:, 0], leaves['start'], atol=1e-6)
+
+    # The base y-axis is scaled along the leaf direction.
+    np.testing.assert_allclose(
+        co[:, 2] - co[:, 0],
+        leaves['direction'] * leaves['scale'][:, 1:2], atol=1e-6
+    )
+    np.testing.assert_array_equal(geom['loop_vert'][3:6], [3, 4, 5])
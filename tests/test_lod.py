@@ -0,0 +1,86 @@
+# This file is part of QSM-blender-addons.
+#
+# QSM-blender-addons is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# QSM-blender-addons is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with QSM-blender-addons.  If not, see <http://www.gnu.org/licenses/>.
+
+import numpy as np
+
+from qsm_core import (take_cylinders,
+                      take_ranges,
+                      build_cylinder_geometry,
+                      tree_distances,
+                      lod_factors,
+                      lod_vertex_counts,
+                      lod_select)
+
+
+def test_lod_factors_and_vertex_counts():
+
+    f = lod_factors([0.0, 5.0, 10.0, 20.0], 5.0, 15.0)
+
+    np.testing.assert_allclose(f, [0.0, 0.0, 0.5, 1.0])
+    np.testing.assert_array_equal(lod_vertex_counts(f, 4, 16), [16, 16, 10, 4])
+
+
+def test_lod_select_keeps_stem_and_ranges(cylinders):
+
+    cyl = cylinders(30)
+    cyl['branch'][:] = 2
+    cyl['branch'][[0, 15]] = 1
+    ranges = [(0, 15), (15, 30)]
+
+    index, new = lod_select(cyl, ranges, [0.0, 1.0], 0.15)
+
+    # The near tree is kept, the thin branches of the far tree removed.
+    assert new[0] == (0, 15)
+    far = index[new[1][0]:new[1][1]]
+    assert 15 in far
+    assert np.all((cyl['radius'][far] >= 0.15) | (cyl['branch'][far] == 1))
+
+    dist = tree_distances(cyl, ranges, [100.0, 0.0, 0.0])
+    assert np.all(dist > 90)
+
+
+def test_mesh_trees_after_curve_tree(cylinders):
+
+    # Far tree first, imported as curves, and a near mesh tree. Only the
+    # mesh tree is given to the geometry builder.
+    cyl = cylinders(20)
+    trees = [(0, 10), (10, 20)]
+    modes = ['bezier_branch', 'mesh_cylinder']
+
+    mesh, ranges = take_ranges(cyl, [r for r, m in zip(trees, modes)
+                                     if m == 'mesh_cylinder'])
+    assert ranges == [(0, 10)]
+
+    geom = build_cylinder_geometry(mesh, 4, 8, [c0 for c0, _ in ranges], [6])
+    alone = build_cylinder_geometry(take_cylinders(cyl, slice(10, 20)),
+                                    4, 8, [0], [6])
+
+    for key in alone:
+        np.testing.assert_array_equal(geom[key], alone[key], err_msg=key)
+
+
+def test_take_ranges_of_several_trees(cylinders):
+
+    cyl = cylinders(30)
+
+    sub, ranges = take_ranges(cyl, [(5, 10), (20, 30)])
+
+    assert ranges == [(0, 5), (5, 15)]
+    np.testing.assert_array_equal(sub['radius'],
+                                  np.concatenate((cyl['radius'][5:10],
+                                                  cyl['radius'][20:30])))
+
+    empty, ranges = take_ranges(cyl, [])
+    assert len(empty['radius']) == 0 and ranges == []
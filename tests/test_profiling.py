@@ -0,0 +1,39 @@
+# This file is part of QSM-blender-addons.
+#
+# QSM-blender-addons is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# QSM-blender-addons is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with QSM-blender-addons.  If not, see <http://www.gnu.org/licenses/>.
+
+import tracemalloc
+
+from qsm_core import ImportProfiler
+
+
+def test_profiler_stops_tracing_after_failed_import():
+
+    assert not tracemalloc.is_tracing()
+
+    profiler = ImportProfiler(fMemory=True)
+    try:
+        profiler.phase('read')
+        raise ValueError('Malformed row.')
+    except ValueError:
+        pass
+    finally:
+        profiler.stop()
+
+    assert not tracemalloc.is_tracing()
+
+    # The report after stopping keeps the recorded phase.
+    report = profiler.report()
+    assert report['phases']['read']['count'] == 1
+    assert 'memory' in report['phases']['read']
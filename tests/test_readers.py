@@ -0,0 +1,251 @@
+# This file is part of QSM-blender-addons.
+#
+# QSM-blender-addons is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# QSM-blender-addons is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with QSM-blender-addons.  If not, see <http://www.gnu.org/licenses/>.
+
+import gzip
+
+import numpy as np
+import pytest
+
+from qsm_core import readers
+from qsm_core import (read_cylinder_file,
+                      read_appended_cylinders,
+                      cylinders_from_lines,
+                      write_cylinder_binary,
+                      is_binary_qsm_file,
+                      mat_file_version,
+                      read_qsm_file,
+                      partition_trees)
+
+from conftest import random_cylinders, cylinder_rows
+
+
+def assert_tables_equal(a, b):
+    assert set(a) == set(b)
+    for key in a:
+        np.testing.assert_array_equal(a[key], b[key])
+
+
+def test_txt_columns(tmp_path):
+
+    cyl = random_cylinders(10)
+    path = tmp_path / 'qsm.txt'
+    path.write_text('\n'.join(cylinder_rows(cyl)) + '\n')
+
+    read = read_cylinder_file(str(path))
+
+    np.testing.assert_array_equal(read['branch'], cyl['branch'])
+    np.testing.assert_allclose(read['start'], cyl['start'])
+    np.testing.assert_allclose(read['axis'], cyl['axis'])
+    np.testing.assert_allclose(read['radius'], cyl['radius'])
+    assert not read['has_color'].any()
+
+
+def test_rows_of_different_lengths():
+
+    lines = ['1 0 0 0 0 0 1 1 0.1',
+             '1 0 0 1 0 0 1 1 0.1 0.5',
+             '',
+             '2 0 0 2 0 0 1 1 0.1 0.1 0.2 0.3 7 8',
+             'too short']
+
+    cyl = cylinders_from_lines(lines)
+
+    assert len(cyl['radius']) == 3
+    np.testing.assert_array_equal(cyl['has_color'], [False, True, True])
+    np.testing.assert_allclose(cyl['color'][1], [0.5] * 4)
+    np.testing.assert_allclose(cyl['color'][2], [0.1, 0.2, 0.3, 1.0])
+    assert cyl['extra'].shape == (3, 2)
+    assert np.isnan(cyl['extra'][0]).all()
+    np.testing.assert_allclose(cyl['extra'][2], [7, 8])
+
+
+def test_streamed_chunks_match_whole_file(tmp_path, monkeypatch):
+
+    lines = cylinder_rows(random_cylinders(50))
+    # Colour and attribute columns in some chunks only.
+    lines[7] += ' 0.5 0.5 0.5 1 2 3'
+    lines[31] += ' 0.5'
+    path = tmp_path / 'qsm.txt'
+    path.write_text('\n'.join(lines) + '\n')
+
+    whole = cylinders_from_lines(lines)
+
+    monkeypatch.setattr(readers, 'READ_CHUNK_LINES', 8)
+    chunked = read_cylinder_file(str(path))
+
+    assert set(whole) == set(chunked)
+    for key in whole:
+        np.testing.assert_array_equal(whole[key], chunked[key])
+
+
+def test_compressed_file_matches_plain(tmp_path):
+
+    text = '\n'.join(cylinder_rows(random_cylinders(20))) + '\n'
+    plain = tmp_path / 'qsm.txt'
+    plain.write_text(text)
+    packed = tmp_path / 'qsm.txt.gz'
+    with gzip.open(str(packed), 'wt') as f:
+        f.write(text)
+
+    assert_tables_equal(read_qsm_file(str(plain)), read_qsm_file(str(packed)))
+
+
+def test_binary_round_trip(tmp_path):
+
+    text = '\n'.join(cylinder_rows(random_cylinders(20))) + '\n'
+    plain = tmp_path / 'qsm.txt'
+    plain.write_text(text)
+    cyl = read_qsm_file(str(plain))
+
+    binary = tmp_path / 'qsm.qsmb'
+    write_cylinder_binary(cyl, str(binary))
+
+    assert is_binary_qsm_file(str(binary))
+
+    # Floating-point columns are stored in single precision.
+    read = read_qsm_file(str(binary))
+    assert set(cyl) == set(read)
+    for key in cyl:
+        np.testing.assert_allclose(read[key], cyl[key], rtol=1e-6)
+
+
+def test_tree_column_and_partition(tmp_path):
+
+    rows = cylinder_rows(random_cylinders(6))
+    trees = [2, 1, 2, 1, 1, 2]
+    path = tmp_path / 'forest.txt'
+    path.write_text('\n'.join('%d %s' % (t, r) for t, r in zip(trees, rows)))
+
+    cyl = read_qsm_file(str(path), True)
+    np.testing.assert_array_equal(cyl['tree'], trees)
+
+    cyl, ranges = partition_trees(cyl)
+    assert ranges == [(1, 0, 3), (2, 3, 6)]
+    np.testing.assert_array_equal(cyl['tree'], [1, 1, 1, 2, 2, 2])
+
+
+def test_empty_file(tmp_path):
+
+    path = tmp_path / 'empty.txt'
+    path.write_text('')
+
+    cyl = read_qsm_file(str(path), True)
+
+    assert len(cyl['radius']) == 0
+    assert partition_trees(cyl)[1] == []
+
+
+def test_appended_rows_skip_partial_line(tmp_path):
+
+    rows = cylinder_rows(random_cylinders(3))
+    path = tmp_path / 'growing.txt'
+    path.write_text(rows[0] + '\n' + rows[1][:10])
+
+    cyl, offset = read_appended_cylinders(str(path))
+    assert len(cyl['radius']) == 1
+    assert offset == len(rows[0]) + 1
+
+    path.write_text(rows[0] + '\n' + rows[1] + '\n' + rows[2] + '\n')
+
+    cyl, offset = read_appended_cylinders(str(path), offset)
+    assert len(cyl['radius']) == 2
+    assert offset == path.stat().st_size
+
+
+def test_appended_rows_stop_before_malformed_row(tmp_path):
+
+    rows = cylinder_rows(random_cylinders(3))
+    path = tmp_path / 'growing.txt'
+    path.write_text(rows[0] + '\n' + 'x' + rows[1][1:] + '\n' + rows[2] + '\n')
+
+    # The rows before the malformed row are read.
+    cyl, offset = read_appended_cylinders(str(path))
+    assert len(cyl['radius']) == 1
+    assert offset == len(rows[0]) + 1
+
+    # Reading from the malformed row fails without moving the offset.
+    with pytest.raises(ValueError):
+        read_appended_cylinders(str(path), offset)
+
+    # The row is read after it is rewritten.
+    path.write_text(rows[0] + '\n' + rows[1] + '\n' + rows[2] + '\n')
+    cyl, offset = read_appended_cylinders(str(path), offset)
+    assert len(cyl['radius']) == 2
+    assert offset == path.stat().st_size
+
+
+def treeqsm_cylinder(NCyl=5):
+
+    cyl = random_cylinders(NCyl, seed=3)
+
+    return {'start': cyl['start'],
+            'axis': cyl['axis'],
+            'length': cyl['length'],
+            'radius': cyl['radius'],
+            'branch': np.arange(NCyl) // 2 + 1.0,
+            'parent': np.arange(NCyl, dtype=float),
+            'extension': np.append(np.arange(2, NCyl + 1), 0.0),
+            'BranchOrder': np.minimum(np.arange(NCyl) // 2, 1.0)}
+
+
+def test_compressed_mat_file_to_binary(tmp_path):
+
+    scipy_io = pytest.importorskip('scipy.io')
+
+    fields = treeqsm_cylinder()
+    plain = tmp_path / 'qsm.mat'
+    scipy_io.savemat(str(plain), {'cylinder': fields})
+    packed = tmp_path / 'qsm.mat.gz'
+    with gzip.open(str(packed), 'wb') as f:
+        f.write(plain.read_bytes())
+
+    assert mat_file_version(str(packed)) == '5.0'
+
+    cyl = read_qsm_file(str(packed))
+    assert_tables_equal(cyl, read_qsm_file(str(plain)))
+
+    # Topology columns are kept in the binary format.
+    binary = tmp_path / 'qsm.qsmb'
+    write_cylinder_binary(cyl, str(binary))
+    read = read_qsm_file(str(binary))
+
+    for key in ('parent', 'extension', 'branch_order'):
+        np.testing.assert_array_equal(read[key], cyl[key])
+
+
+def test_mat_file_qsm_struct_ordered_by_branch(tmp_path):
+
+    scipy_io = pytest.importorskip('scipy.io')
+
+    # Cylinders of two branches, interleaved in the file, with 1-based
+    # parent indices.
+    fields = treeqsm_cylinder(4)
+    fields['branch'] = np.array([1.0, 2.0, 1.0, 2.0])
+    fields['parent'] = np.array([0.0, 1.0, 1.0, 2.0])
+    del fields['extension']
+
+    path = tmp_path / 'qsm.mat'
+    scipy_io.savemat(str(path), {'QSM': {'cylinder': fields}})
+
+    cyl = read_qsm_file(str(path))
+
+    order = [0, 2, 1, 3]
+    np.testing.assert_array_equal(cyl['branch'], [1, 1, 2, 2])
+    np.testing.assert_allclose(cyl['start'], fields['start'][order])
+    np.testing.assert_array_equal(cyl['parent'], [0, 1, 1, 3])
+    np.testing.assert_array_equal(cyl['branch_order'],
+                                  fields['BranchOrder'][order])
+    assert 'extension' not in cyl
+    assert not cyl['has_color'].any()
@@ -0,0 +1,138 @@
+# This file is part of QSM-blender-addons.
+#
+# QSM-blender-addons is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# QSM-blender-addons is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with QSM-blender-addons.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+
+import numpy as np
+
+from qsm_core import (cylinder_spheres,
+                      box_region,
+                      sphere_region,
+                      frustum_region,
+                      region_mask,
+                      grid_index_path,
+                      is_grid_index,
+                      select_cylinders,
+                      cell_chunks,
+                      morton_order)
+
+
+def test_box_selection_matches_sphere_test(cylinders):
+
+    cyl = cylinders(500)
+    region = box_region(np.array([-2.0, -2.0, -2.0]),
+                        np.array([1.0, 2.0, 3.0]))
+
+    center, rad = cylinder_spheres(cyl)
+    expected = np.flatnonzero(region_mask(center, rad, region))
+
+    np.testing.assert_array_equal(select_cylinders(cyl, region), expected)
+    assert 0 < len(expected) < 500
+
+
+def test_grid_index_gives_same_selection(cylinders, tmp_path):
+
+    cyl = cylinders(500, seed=1)
+    file_path = str(tmp_path / 'qsm.txt')
+    open(file_path, 'w').close()
+
+    region = sphere_region(np.array([1.0, 0.0, -1.0]), 2.5)
+    expected = select_cylinders(cyl, region)
+
+    # The index is written on the first use and read on the second.
+    first = select_cylinders(cyl, region, file_path)
+    assert os.path.isfile(grid_index_path(file_path))
+    second = select_cylinders(cyl, region, file_path)
+
+    np.testing.assert_array_equal(first, expected)
+    np.testing.assert_array_equal(second, expected)
+
+
+def test_region_outside_selects_nothing(cylinders):
+
+    cyl = cylinders(100)
+    region = sphere_region(np.array([100.0, 100.0, 100.0]), 1.0)
+
+    assert len(select_cylinders(cyl, region)) == 0
+
+
+def test_chunks_and_morton_order_are_permutations():
+
+    points = np.random.RandomState(0).uniform(0, 10, (300, 3))
+
+    order, bounds = cell_chunks(points, 2.5)
+
+    np.testing.assert_array_equal(np.sort(order), np.arange(300))
+    assert bounds[0] == 0 and bounds[-1] == 300
+
+    # Each chunk holds the points of one cell.
+    cells = np.floor(points[order] / 2.5)
+    for c0, c1 in zip(bounds[:-1], bounds[1:]):
+        assert (cells[c0:c1] == cells[c0]).all()
+
+    # Morton order only reorders within the chunks.
+    morton = morton_order(points, order.copy(), bounds)
+    for c0, c1 in zip(bounds[:-1], bounds[1:]):
+        assert set(morton[c0:c1]) == set(order[c0:c1])
+
+
+def test_grid_index_skipped_when_not_writable(cylinders, tmp_path,
+                                              monkeypatch):
+
+    cyl = cylinders(200, seed=2)
+    file_path = str(tmp_path / 'qsm.txt')
+    open(file_path, 'w').close()
+
+    def read_only(path, mode='r', *args, **kwargs):
+        if 'w' in mode:
+            raise PermissionError(13, 'Permission denied', path)
+        return open(path, mode, *args, **kwargs)
+
+    import qsm_core.region
+    monkeypatch.setattr(qsm_core.region, 'open', read_only, raising=False)
+
+    region = sphere_region(np.array([0.0, 0.0, 0.0]), 2.0)
+    selected = select_cylinders(cyl, region, file_path)
+
+    np.testing.assert_array_equal(selected, select_cylinders(cyl, region))
+    assert not os.path.isfile(grid_index_path(file_path))
+    assert is_grid_index(grid_index_path(file_path))
+    assert not is_grid_index(file_path)
+
+
+def test_frustum_region_of_perspective_and_orthographic_camera():
+
+    # Camera at the origin looking along the x-axis, with the view frame
+    # at unit distance.
+    eye = [0.0, 0.0, 0.0]
+    corners = [[1.0, -1.0, -1.0], [1.0, 1.0, -1.0],
+               [1.0, 1.0, 1.0], [1.0, -1.0, 1.0]]
+
+    center = np.array([[5.0, 0.0, 0.0],    # in view
+                       [5.0, 6.0, 0.0],    # beside the view
+                       [5.0, 5.5, 0.0],    # crossing the side plane
+                       [-2.0, 0.0, 0.0],   # behind the camera
+                       [0.2, 0.0, 0.0],    # before the near plane
+                       [20.0, 0.0, 0.0]])  # beyond the far plane
+    rad = np.array([0.1, 0.1, 1.0, 0.1, 0.1, 0.1])
+
+    region = frustum_region(eye, corners, 0.5, 10.0)
+    np.testing.assert_array_equal(region_mask(center, rad, region),
+                                  [True, False, True, False, False, False])
+
+    # The orthographic view is as wide as the frame at all distances.
+    region = frustum_region(eye, corners, 0.5, 10.0, fOrtho=True)
+    np.testing.assert_array_equal(region_mask(center, rad, region),
+                                  [True, False, False, False, False, False])